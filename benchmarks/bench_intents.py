@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Intent-routing benchmark: questions/sec for the Latin-script intent router.
+
+Compares the compiled router against the old cascade (one re.search per
+pattern, rule after rule, first match wins) on COUNT generated questions,
+and checks that both pick the same intent and slots for every one.
+
+USAGE:
+    python benchmarks/bench_intents.py               # 100k questions
+    python benchmarks/bench_intents.py --count 10000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from marco_deps import INTENT_RULES, pattern_pack  # noqa: E402
+
+MODULES = ["numpy", "pandas", "scipy", "sklearn", "torch", "keras", "flask",
+           "django", "requests", "pillow", "opencv", "tensorflow", "pytest"]
+
+TEMPLATES = [
+    "what is {a}", "what's {a}", "tell me about {a}",
+    "what does {a} depend on", "{a} depends on what", "dependencies of {a}",
+    "who uses {a}", "what requires {a}",
+    "why does {a} crash", "{a} is crashing", "{a} doesn't work",
+    "what crashes when {a} is too old", "search {a} gpu conflict",
+    "are {a} and {b} compatible?", "can i use {a} with {b}", "{a} works with {b}?",
+    "install {a}", "how do i install {a}", "i want to install {a}",
+    # No intent, or several at once (the first rule must win)
+    "hello there", "{a} {b}", "what is {a} and does it work with {b}?",
+    "why does {a} crash with {b}?", "install {a} with {b}?",
+]
+
+
+def generate(count, seed=42):
+    """count lowercased questions from TEMPLATES and MODULES."""
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(a=rng.choice(MODULES), b=rng.choice(MODULES))
+            for _ in range(count)]
+
+
+def cascade_route(question):
+    """The pre-router behaviour: every pattern of every rule, in order."""
+    for intent, _triggers, patterns in INTENT_RULES:
+        for pattern in patterns:
+            match = re.search(pattern, question)
+            if match:
+                return intent, match.groupdict()
+    return None, {}
+
+
+def run(route, questions):
+    start = time.perf_counter()
+    results = [route(q) for q in questions]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=100000,
+                        help="questions generated (default: 100000)")
+    count = parser.parse_args().count
+    
+    questions = generate(count)
+    before, expected = run(cascade_route, questions)
+    after, routed = run(pattern_pack("latin").route, questions)
+    mismatches = sum(1 for a, b in zip(expected, routed) if a != b)
+    
+    print(f"{count} questions, {mismatches} routed differently")
+    print(f"before (regex cascade):   {count / before:>12,.0f} questions/sec")
+    print(f"after  (compiled router): {count / after:>12,.0f} questions/sec")
+    print(f"speedup:                  {before / after:>12.2f}x")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Beacon memory benchmark: bytes per beacon, dict beacons vs. Beacon objects.
+
+Learns a synthetic corpus over a VOCAB-word vocabulary (every word used
+PASSES times, 6 words per sentence) and measures the deep size of the
+beacon store (__slots__ Beacons plus the interned lexicon) against the
+former layout (one dict per beacon, string-keyed links, seven
+pre-created tag lists) built from the same sentences.
+
+"total" is the result: everything a beacon costs, including what maps
+its word to it (the lexicon, or the dict keys and slots of the former
+layout). "records" leaves that mapping out. The goal was 5x less in
+total; at 1M words it is 3.8x (1283 -> 340 bytes), the lexicon's string,
+int ID and dict slot (about 125 bytes per word) being most of the rest.
+
+USAGE:
+    python benchmarks/bench_memory.py                 # 1M-word vocabulary
+    python benchmarks/bench_memory.py --vocab 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from marco_deps import MarcoMini, WORD_RE  # noqa: E402
+
+
+def synthetic_sentences(vocab, passes, seed=42):
+    rng = random.Random(seed)
+    words = [f"mod{i}" for i in range(vocab)]
+    for _ in range(passes):
+        rng.shuffle(words)
+        for i in range(0, len(words) - 5, 6):
+            yield ' '.join(words[i:i + 6])
+
+
+def dict_learn(beacons, tags, sentence):
+    """Beacon updates of the former dict layout (learn_sentence, minus patterns)."""
+    words = WORD_RE.findall(sentence.lower())
+    context = sentence[:100]
+    for i, word in enumerate(words):
+        beacon = beacons.get(word)
+        if beacon is None:
+            beacon = beacons[word] = {
+                "word": word, "links": {}, "tags": {tag: [] for tag in tags},
+                "activations": 0, "contexts": []
+            }
+        beacon['activations'] += 1
+        beacon['contexts'].append(context)
+        for j in range(max(0, i-3), min(len(words), i+4)):
+            if i != j:
+                other = words[j]
+                beacon['links'][other] = beacon['links'].get(other, 0) + 1
+
+
+def deep_size(obj, seen):
+    """Size of obj and everything it references, each object counted once."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(x, seen) for x in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_size(getattr(obj, s, None), seen) for s in obj.__slots__)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vocab', type=int, default=1000000,
+                        help="distinct words in the corpus (default: 1000000)")
+    parser.add_argument('--passes', type=int, default=1,
+                        help="times every word is used (default: 1)")
+    options = parser.parse_args()
+    vocab, passes = options.vocab, options.passes
+    
+    marco = MarcoMini()
+    start = time.perf_counter()
+    for sentence in synthetic_sentences(vocab, passes):
+        marco.learn_sentence(sentence)
+    learn_time = time.perf_counter() - start
+    count = len(marco.beacons)
+    # Sequences are not part of the beacon store
+    marco._sequences.clear()
+    seen = set()
+    after_index = deep_size(marco.lexicon, seen)
+    after = after_index + deep_size(marco.beacons, seen)
+    del marco, seen
+    
+    beacons = {}
+    tags = MarcoMini().TAGS
+    for sentence in synthetic_sentences(vocab, passes):
+        dict_learn(beacons, tags, sentence)
+    before_index = sys.getsizeof(beacons) + sum(sys.getsizeof(word) for word in beacons)
+    before = deep_size(beacons, set())
+    
+    print(f"{count} beacons ({vocab} words x {passes} passes), learned in {learn_time:.1f}s")
+    print(f"bytes/beacon      {'total':>10} {'records':>10}")
+    print(f"dict beacons      {before / count:>10.0f} {(before - before_index) / count:>10.0f}")
+    print(f"Beacon objects    {after / count:>10.0f} {(after - after_index) / count:>10.0f}")
+    print(f"reduction         {before / after:>9.1f}x "
+          f"{(before - before_index) / (after - after_index):>9.1f}x")
+    print(f"5x target (total) {'met' if before >= 5 * after else 'missed':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Relation-extraction benchmark: sentences/sec for MarcoMini._detect_patterns.
+
+Compares the compiled, prefiltered engine against the old cascade
+(one uncompiled re.search per pattern, every pattern of every family,
+only the first match of each)
+on the bundled knowledge/DEPS_*.txt files repeated SCALE times.
+
+USAGE:
+    python benchmarks/bench_patterns.py             # scale 1000
+    python benchmarks/bench_patterns.py --scale 100
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from marco_deps import MarcoMini, RELATION_RULES, iter_sentences, open_text  # noqa: E402
+
+
+def load_sentences():
+    """The sentences of the bundled knowledge files, as learn_file sees them."""
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'knowledge', 'DEPS_*.txt'))):
+        with open_text(path) as f:
+            sentences.extend(iter_sentences(f))
+    return sentences
+
+
+def cascade_detect(marco, sentence):
+    """
+    The pre-compiled-engine behaviour: every pattern of every family is
+    tried, and each one that matches applies its first match (re.search),
+    where the engine applies every match (finditer).
+    """
+    s = sentence.lower()
+    for family, _triggers, action, inverse, patterns in RELATION_RULES:
+        for pattern in patterns:
+            match = re.search(pattern, s)
+            if match:
+                subject, obj = match.groups()
+                marco._apply_relation(family, action, inverse, subject, obj)
+
+
+def run(detect, sentences, scale):
+    marco = MarcoMini()
+    start = time.perf_counter()
+    for _ in range(scale):
+        for sentence in sentences:
+            detect(marco, sentence)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1000,
+                        help="times the knowledge files are repeated (default: 1000)")
+    scale = parser.parse_args().scale
+    
+    sentences = load_sentences()
+    total = len(sentences) * scale
+    print(f"{len(sentences)} sentences x {scale} = {total} sentences")
+    
+    before = run(cascade_detect, sentences, scale)
+    after = run(MarcoMini._detect_patterns, sentences, scale)
+    
+    print(f"before (regex cascade):   {total / before:>12,.0f} sentences/sec")
+    print(f"after  (compiled engine): {total / after:>12,.0f} sentences/sec")
+    print(f"speedup:                  {before / after:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
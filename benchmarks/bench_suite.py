@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression benchmark suite: learning, saving, loading and every answer path.
+
+Generates a synthetic corpus of SENTENCES sentences from the sentence
+templates of knowledge/DEPS_EN.txt (module names and versions become
+slots, filled from a generated module list with Zipf-like popularity),
+then measures:
+
+    learn_file      sentences/sec
+    save_matrix     milliseconds for a full binary save
+    load_matrix     milliseconds to map it back
+    answer/INTENT   latency per question, for every intent in
+                    MarcoMini.INTENT_HANDLERS, on the loaded matrix
+                    (answer cache emptied before each question)
+    answer/cached   latency of the same questions answered again
+    memory/*        bytes per structure after learning (memory_usage)
+
+Everything is seeded, so two runs on the same code measure the same work.
+Results are printed and, with --output, written as JSON; --compare reads
+two such files and flags every metric that got worse by more than the
+threshold (exit code 1 if any did).
+
+USAGE:
+    python benchmarks/bench_suite.py                        # 10k sentences
+    python benchmarks/bench_suite.py --sentences 1M --output after.json
+    python benchmarks/bench_suite.py --corpus /tmp/10m.txt --sentences 10M
+    python benchmarks/bench_suite.py --compare before.json after.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from marco_deps import VERSION, MarcoMini, pattern_pack  # noqa: E402
+
+TEMPLATE_FILE = os.path.join(ROOT, 'knowledge', 'DEPS_EN.txt')
+
+# One question per intent; {a} and {b} are modules
+QUESTIONS = {
+    "what-is": "what is {a}",
+    "dependencies": "what does {a} depend on",
+    "required-by": "who uses {a}",
+    "crash": "why does {a} crash",
+    "crash-search": "what crashes when {a} is too old",
+    "search": "search {a} conflict",
+    "compatibility": "are {a} and {b} compatible?",
+    "install": "install {a}",
+    "related": "what is similar to {a}",
+}
+
+VERSION_RE = re.compile(r'\b\d+(?:\.\d+)+\b')
+
+
+def parse_count(text):
+    """'10k', '1M', '250000' -> int."""
+    text = text.strip().lower()
+    factor = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def load_templates(path=TEMPLATE_FILE):
+    """
+    The sentences of path as templates: module names (subjects of "X is a
+    ... module." and both sides of "X depends on Y.") become {0}, {1}...
+    in order of appearance, versions {v}. Sentences naming no module stay
+    as they are, so the corpus keeps the file's mix of sentence kinds.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        sentences = [line.strip() for line in f
+                     if line.strip() and not line.lstrip().startswith('#')]
+    modules = set()
+    for sentence in sentences:
+        match = re.match(r'(\S+) is an? (?:.+ )?module\.$', sentence)
+        if match:
+            modules.add(match.group(1).lower())
+        match = re.match(r'(\S+) depends on (\S+)\.$', sentence)
+        if match:
+            modules.update(name.lower() for name in match.groups())
+    names = re.compile(r'(?<![\w-])(%s)(?![\w-])' % '|'.join(
+        re.escape(m) for m in sorted(modules, key=len, reverse=True)), re.IGNORECASE)
+    
+    templates = []
+    for sentence in sentences:
+        slots = []
+        
+        def slot(match):
+            slots.append(match.group(0))
+            return '{%d}' % (len(slots) - 1)
+        
+        template = names.sub(slot, sentence.replace('{', '{{').replace('}', '}}'))
+        templates.append((VERSION_RE.sub('{v}', template), len(slots)))
+    return templates
+
+
+def generate_corpus(path, count, seed=42):
+    """Writes count synthetic sentences to path (one per line, header comment first)."""
+    rng = random.Random(seed)
+    templates = load_templates()
+    modules = [f"pkg{i}" for i in range(max(50, count // 25))]
+    # Zipf-like popularity: module i is picked in proportion to 1 / (i + 1)
+    cumulative = list(accumulate(1 / (i + 1) for i in range(len(modules))))
+    total = cumulative[-1]
+    
+    def popular():
+        return modules[min(bisect_left(cumulative, rng.random() * total), len(modules) - 1)]
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# synthetic corpus: {count} sentences, seed {seed}\n")
+        for _ in range(count):
+            template, slots = rng.choice(templates)
+            # The subject is any module, what it names is a popular one
+            names = [rng.choice(modules)] + [popular() for _ in range(slots - 1)]
+            version = f"{rng.randint(0, 9)}.{rng.randint(0, 30)}"
+            f.write(template.format(*names[:slots], v=version) + '\n')
+
+
+def ensure_corpus(path, count, seed):
+    """Generates the corpus at path unless it already holds these parameters."""
+    header = f"# synthetic corpus: {count} sentences, seed {seed}\n"
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.readline() == header:
+                return
+    generate_corpus(path, count, seed)
+
+
+def metric(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def latencies(marco, questions, cached=False):
+    """Per-question latencies (seconds), sorted; uncached unless cached."""
+    clock = time.perf_counter
+    samples = []
+    for question in questions:
+        if not cached:
+            marco.answers.clear()
+        start = clock()
+        marco.answer(question)
+        samples.append(clock() - start)
+    return sorted(samples)
+
+
+def record_latencies(results, name, samples):
+    results[name + "/mean"] = metric(sum(samples) / len(samples) * 1e6, "us", "lower")
+    results[name + "/p95"] = metric(samples[int(0.95 * (len(samples) - 1))] * 1e6, "us", "lower")
+
+
+def run(count, questions, seed, corpus=None):
+    missing = set(MarcoMini.INTENT_HANDLERS) - set(QUESTIONS)
+    if missing:
+        sys.exit(f"no benchmark question for intent(s): {', '.join(sorted(missing))}")
+    route = pattern_pack("latin").route
+    for intent, template in QUESTIONS.items():
+        routed = route(template.format(a="numpy", b="scipy"))[0]
+        if routed != intent:
+            sys.exit(f"benchmark question for {intent} routes to {routed}")
+    
+    workdir = tempfile.mkdtemp(prefix='marco-bench-')
+    try:
+        corpus = corpus or os.path.join(workdir, 'corpus.txt')
+        ensure_corpus(corpus, count, seed)
+        matrix_file = os.path.join(workdir, 'matrix.mbin')
+        results = {}
+        
+        marco = MarcoMini()
+        start = time.perf_counter()
+        learned = marco.learn_file(corpus)
+        seconds = time.perf_counter() - start
+        results["learn_file"] = metric(learned / seconds, "sentences/s", "higher")
+        
+        usage = marco.memory_usage()
+        for name, size in usage.items():
+            results["memory/" + name] = metric(size or 0, "bytes", "lower")
+        
+        start = time.perf_counter()
+        marco.save_matrix(matrix_file, full=True)
+        results["save_matrix"] = metric((time.perf_counter() - start) * 1e3, "ms", "lower")
+        results["matrix_size"] = metric(os.path.getsize(matrix_file), "bytes", "lower")
+        del marco
+        
+        marco = MarcoMini()
+        start = time.perf_counter()
+        marco.load_matrix(matrix_file)
+        results["load_matrix"] = metric((time.perf_counter() - start) * 1e3, "ms", "lower")
+        
+        modules = [word for word in marco.beacons if word.startswith('pkg')]
+        rng = random.Random(seed)
+        asked = []
+        for intent, template in QUESTIONS.items():
+            batch = [template.format(a=rng.choice(modules), b=rng.choice(modules))
+                     for _ in range(questions)]
+            record_latencies(results, f"answer/{intent}", latencies(marco, batch))
+            asked.extend(batch)
+        # Everything asked, answered once more to fill the cache, then timed
+        marco.answers.size = len(asked)
+        latencies(marco, asked, cached=True)
+        record_latencies(results, "answer/cached", latencies(marco, asked, cached=True))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return {
+        "meta": {
+            "sentences": count, "questions": questions, "seed": seed,
+            "marco": VERSION, "python": platform.python_version(),
+            "platform": platform.platform(), "date": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "results": results,
+    }
+
+
+def print_results(report):
+    meta = report["meta"]
+    print(f"{meta['sentences']} sentences, {meta['questions']} questions per intent, "
+          f"seed {meta['seed']} (Python {meta['python']})")
+    for name, entry in report["results"].items():
+        print(f"{name:<32}{entry['value']:>16,.1f} {entry['unit']}")
+
+
+def compare(before_path, after_path, threshold):
+    """Prints every metric of two runs; returns the names of the regressed ones."""
+    with open(before_path, 'r', encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, 'r', encoding='utf-8') as f:
+        after = json.load(f)
+    if before["meta"]["sentences"] != after["meta"]["sentences"]:
+        print("warning: the runs used corpora of different sizes")
+    
+    regressed = []
+    print(f"{'metric':<32}{'before':>14}{'after':>14}{'change':>9}")
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if old is None or not old["value"]:
+            print(f"{name:<32}{'-':>14}{new['value']:>14,.1f}")
+            continue
+        change = new["value"] / old["value"] - 1
+        worse = change > threshold if new["better"] == "lower" else change < -threshold
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:<32}{old['value']:>14,.1f}{new['value']:>14,.1f}{change:>+8.1%}{flag}")
+        if worse:
+            regressed.append(name)
+    print(f"{len(regressed)} regression(s) beyond {threshold:.0%}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sentences', type=parse_count, default='10k',
+                        help="corpus size, e.g. 250000, 10k, 1M (default: 10k)")
+    parser.add_argument('--questions', type=parse_count, default='1000',
+                        help="questions timed per intent (default: 1000)")
+    parser.add_argument('--seed', type=int, default=42, help="corpus and question seed (default: 42)")
+    parser.add_argument('--corpus', help="corpus file to use (generated there if it is missing)")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help="compare two JSON results instead of running")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative change counted as a regression (default: 0.10)")
+    options = parser.parse_args()
+    
+    if options.compare:
+        sys.exit(1 if compare(*options.compare, options.threshold) else 0)
+    
+    report = run(options.sentences, options.questions, options.seed, options.corpus)
+    print_results(report)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
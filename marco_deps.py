@@ -18,8 +18,18 @@
 
 USAGE:
     python marco_deps.py                    # Interactive mode
-    python marco_deps.py --learn FILE       # Learn from a file
+    python marco_deps.py --learn FILE       # Learn from a file (.gz/.bz2/.xz, - = stdin)
+    python marco_deps.py --learn DIR FILE.. # Learn from many files, in parallel
     python marco_deps.py --query "question" # Direct question
+    python marco_deps.py --serve            # Query daemon (--query uses it)
+    python marco_deps.py --complete "what is nu"  # Completions (daemon too)
+    python marco_deps.py --query-file FILE  # Many questions (- = stdin), JSON lines
+    python marco_deps.py --check FILE       # Check requirements.txt / pyproject.toml
+    python marco_deps.py --check-env        # Check the installed packages
+    python marco_deps.py --convert SRC DST  # Matrix JSON <-> binary
+    python marco_deps.py --compact          # Prune stopwords, rare words, weak links
+    python marco_deps.py --startup-bench    # Import, load and first-answer times
+    python marco_deps.py --profile ...      # Timings and memory report (stderr)
 
 EXAMPLES:
     > what is numpy
@@ -30,18 +40,104 @@ EXAMPLES:
 
 """
 
+from __future__ import annotations
+
 import re
+import heapq
 import json
+import math
+import mmap
 import os
-from collections import defaultdict
-from typing import Dict, List, Optional, Tuple
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Mapping
+
+# Annotations are not evaluated at run time, so typing is only imported
+# by type checkers (startup time: see --startup-bench). Modules only some
+# commands need (socket, importlib.metadata...) are imported where used.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
 VERSION = "1.0.0"
-MATRIX_FILE = "marco_deps_matrix.json"
+MATRIX_FILE = "marco_deps_matrix.mbin"          # Binary, memory-mapped
+LEGACY_MATRIX_FILE = "marco_deps_matrix.json"   # Read when MATRIX_FILE is missing
+
+# Query daemon (--serve): a Unix socket next to the matrix, else localhost TCP
+SERVE_PORT = 7455
+SERVE_TIMEOUT = 10.0            # Seconds a client waits for the daemon
+
+# Answers by question, least recently used dropped first; the most
+# recent ANSWER_CACHE_HOT are saved next to the matrix (MATRIX.answers)
+ANSWER_CACHE_SIZE = 1024
+ANSWER_CACHE_HOT = 256
+
+# Startup benchmark (--startup-bench): fresh processes timed per stage
+STARTUP_RUNS = 5
+
+# Installed environment (--check-env)
+ENV_SCAN_JOBS = 8               # Threads reading distribution metadata
+
+# Streaming ingestion
+CHUNK_SIZE = 1 << 20            # Characters per read in learn_file
+MAX_SENTENCE_LENGTH = 10000     # A sentence longer than this is cut
+MAX_CONTEXTS = None             # Contexts kept per beacon (None = unbounded)
+INDEX_TRIM_MIN = 4096           # In-memory index documents before trimming it (with MAX_CONTEXTS)
+MAX_LINKS = None                # Links kept per beacon, the most frequent (None = unbounded)
+LINK_BATCH = 64                 # Link IDs a beacon queues before merging them
+TAG_SET_SIZE = 16               # Values a tag keeps in a list; an ordered set beyond
+
+# Compaction (--compact): beacons of stopwords and of words seen fewer than
+# COMPACT_MIN_ACTIVATIONS times are dropped unless they hold knowledge
+# (tags, crash reasons); the others keep their COMPACT_MAX_LINKS most
+# frequent links
+COMPACT_MIN_ACTIVATIONS = 2
+COMPACT_MAX_LINKS = 256
+COMPACT_STOPWORDS = (
+    "a", "an", "and", "are", "as", "at", "be", "been", "but", "by", "can", "do",
+    "does", "for", "from", "has", "have", "if", "in", "into", "is", "it", "its",
+    "no", "not", "of", "on", "or", "so", "than", "that", "the", "then", "there",
+    "this", "to", "too", "very", "was", "when", "which", "while", "with",
+    "au", "aux", "ce", "dans", "de", "des", "du", "elle", "en", "est", "et", "il",
+    "la", "le", "les", "mais", "ne", "ou", "par", "pas", "pour", "que", "qui",
+    "se", "si", "sur", "un", "une",
+)
+
+# Context search (BM25 ranking)
+SEARCH_RESULTS = 10             # Contexts returned by a search or crash answer
+BM25_K1 = 1.2
+BM25_B = 0.75
+CRASH_TERMS = ('crash', 'crashes', 'crashed', 'crashing')
+
+# Module names with typos: up to FUZZY_DISTANCE edits for names of
+# FUZZY_LONG_NAME letters or more, one edit below; shorter names must match
+FUZZY_DISTANCE = 2
+FUZZY_LONG_NAME = 8
+FUZZY_MIN_LENGTH = 4
+
+# Completion: suggestions kept per word and per prefix; names are ranked
+# ahead of time for prefixes up to COMPLETE_PREFIX letters
+COMPLETE_TOP_K = 8
+COMPLETE_PREFIX = 4
+
+# Related modules: links weighted by PPMI and cut to the RELATED_FEATURES
+# strongest per module; each feature lists its RELATED_POSTINGS strongest
+# modules, and binary matrices save the RELATED_TOP_K nearest of each
+RELATED_FEATURES = 32
+RELATED_POSTINGS = 64
+RELATED_TOP_K = 10
+
+# Files picked up when learning from a directory
+LEARN_EXTENSIONS = ('.txt', '.md', '.rst', '.gz', '.bz2', '.xz')
 
 # Terminal colors (ANSI)
 class Colors:
@@ -54,53 +150,3872 @@ class Colors:
     BOLD = '\033[1m'
     END = '\033[0m'
 
+# Whether stdout is a terminal, checked once (see use_color)
+_color: Optional[bool] = None
+
+def use_color() -> bool:
+    """True if stdout is a terminal (detected on first call)."""
+    global _color
+    if _color is None:
+        try:
+            _color = os.isatty(1)
+        except:
+            _color = False
+    return _color
+
 def colored(text, color):
     """Returns colored text (if terminal supports it)."""
-    try:
-        if os.isatty(1):
-            return f"{color}{text}{Colors.END}"
-    except:
-        pass
+    if use_color():
+        return f"{color}{text}{Colors.END}"
     return text
 
 # ============================================================================
-# MARCO MINI - Lightweight version for demo
+# LAZY REGEXES
 # ============================================================================
 
-class MarcoMini:
+class LazyRegex:
+    """
+    A regex compiled on first use, so that importing this module (which
+    every --query does) compiles none of the module-level ones. What the
+    compiled regex offers (search, sub...) is looked up once, then kept
+    as a plain attribute.
     """
-    Minimalist version of Marco for demo.
     
-    No letter neurons, just:
-    - Beacons (concepts)
-    - Links (cooccurrences)
-    - Tags (IS-A, DEPENDS-ON, etc.)
-    - Sequences (word order)
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+    
+    def __getattr__(self, name: str):
+        attr = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, attr)
+        return attr
+
+
+# ============================================================================
+# RELATION RULES
+# ============================================================================
+
+# Declarative relation-extraction table for English; the rules of every
+# language are compiled once per script (see LANGUAGE PACKS).
+#
+#   family    tag written on the subject beacon (CRASH goes to contexts)
+#   triggers  keywords, one of which must appear in the sentence before
+#             any of the family's regexes is tried
+#   action    "tag" (append once), "replace" (keep only the latest value)
+#             or "context" (store as a crash context)
+#   inverse   tag written back on the object beacon, if any
+#   patterns  regexes capturing (subject, object); package names are
+#             captured whole ([\w.-]+: "scikit-learn", "zope.interface")
+#             and stored normalized (see module_name)
+RELATION_RULES = [
+    # IS-A: "X is a Y", "X are Ys"
+    ("IS-A", ("is", "are"), "tag", None, (
+        r"([\w.-]+)\s+is\s+(?:a|an)\s+(\w+)",
+        r"([\w.-]+)\s+are\s+(\w+)s?",
+    )),
+    # ALIAS: "X is an alias of Y", "X = Y"
+    ("ALIAS-OF", ("alias", "="), "tag", None, (
+        r"([\w.-]+)\s+is\s+(?:an\s+)?alias\s+(?:of|for)\s+([\w.-]+)",
+        r"([\w.-]+)\s*=\s*([\w.-]+)",
+    )),
+    # DEPENDS-ON: "X depends on Y", "X requires Y"
+    ("DEPENDS-ON", ("depend", "require", "need"), "tag", "REQUIRED-BY", (
+        r"([\w.-]+)\s+depends?\s+on\s+([\w.-]+)",
+        r"([\w.-]+)\s+requires?\s+([\w.-]+)",
+        r"([\w.-]+)\s+needs?\s+([\w.-]+)",
+    )),
+    # CONFLICTS: "X and Y conflict", "X conflicts with Y"
+    ("CONFLICTS-WITH", ("conflict", "incompatible"), "tag", "CONFLICTS-WITH", (
+        r"([\w.-]+)\s+and\s+([\w.-]+)\s+(?:have\s+a\s+)?conflict",
+        r"([\w.-]+)\s+conflicts?\s+with\s+([\w.-]+)",
+        r"([\w.-]+)\s+(?:is\s+)?incompatible\s+with\s+([\w.-]+)",
+    )),
+    # VERSION: "X stable version is Y"
+    ("STABLE-VERSION", ("version",), "replace", None, (
+        r"([\w.-]+)\s+stable\s+version\s+(?:is\s+)?(\d+[\d\.]*)",
+        r"([\w.-]+)\s+version\s+(\d+[\d\.]*)\s+(?:is\s+)?stable",
+    )),
+    # SOLUTION: "to fix X you need Y", "solution for X is Y"
+    ("SOLUTION-FOR", ("fix", "solution", "crash"), "tag", None, (
+        r"to\s+fix\s+([\w.-]+).*?(?:you\s+need|install|use)\s+(\w+)",
+        r"solution\s+for\s+([\w.-]+).*?(?:is|:)\s+(\w+)",
+        r"if\s+([\w.-]+)\s+crashes?.*?(?:upgrade|update|install)\s+(\w+)",
+    )),
+    # CRASH: "X crashes if Y"
+    ("CRASH", ("crash",), "context", None, (
+        r"([\w.-]+)\s+crashes?\s+(?:if|when|because)\s+(.+)",
+    )),
+]
+
+
+# Families whose object is a package name too (normalized like the subject)
+MODULE_RELATIONS = ("ALIAS-OF", "DEPENDS-ON", "CONFLICTS-WITH")
+
+
+def compile_relation_rules(rules) -> List[Tuple]:
+    """Compiles a RELATION_RULES-style table into ready-to-run tuples."""
+    return [
+        (family, tuple(triggers), action, inverse,
+         tuple(re.compile(p) for p in patterns))
+        for family, triggers, action, inverse, patterns in rules
+    ]
+
+
+class TriggerSet:
+    """
+    Which rules a text may match, from the trigger keywords of each rule.
+    
+    One regex scan replaces testing `trigger in text` for every trigger
+    of every rule. The scan finds non-overlapping triggers, so a trigger
+    found also selects the rules of every trigger it contains or that
+    could start inside it: the result may hold a few extra rules, never
+    fewer than the per-trigger tests.
+    """
+    
+    def __init__(self, triggers_by_rule):
+        masks: Dict[str, int] = defaultdict(int)
+        for i, triggers in enumerate(triggers_by_rule):
+            for trigger in triggers:
+                masks[trigger] |= 1 << i
+        self._masks = {}
+        for trigger in masks:
+            mask = 0
+            for other, bits in masks.items():
+                if other in trigger or any(other.startswith(trigger[k:])
+                                           for k in range(1, len(trigger))):
+                    mask |= bits
+            self._masks[trigger] = mask
+        alternatives = '|'.join(re.escape(t) for t in sorted(masks, key=len, reverse=True))
+        self._regex = re.compile(alternatives) if masks else None
+    
+    def match(self, text: str) -> int:
+        """Bit mask of the rules (bit i = rule i) with a trigger in text."""
+        if self._regex is None:
+            return 0
+        mask = 0
+        masks = self._masks
+        for trigger in set(self._regex.findall(text)):
+            mask |= masks[trigger]
+        return mask
+
+
+def _count_dict():
+    """Row factory for count tables (module-level so MarcoMini pickles)."""
+    return defaultdict(int)
+
+
+# ============================================================================
+# INTENT RULES
+# ============================================================================
+
+# Question intents, in priority order: when a question matches several,
+# the first rule wins. Each rule is (intent, trigger keywords, patterns);
+# every pattern contains one of its triggers, and its named groups are
+# the slots passed to the intent's handler (see MarcoMini.INTENT_HANDLERS).
+INTENT_RULES = [
+    ("related", ("similar", "related", "with", "like", "alternative"), (
+        r"(?:similar|related)\s+to\s+(?P<module>[\w.-]+)",
+        r"(?:goes|go|used)\s+with\s+(?P<module>[\w.-]+)",
+        r"(?:modules?|packages?|libraries|alternatives?)\s+(?:like|to)\s+(?P<module>[\w.-]+)",
+    )),
+    ("what-is", ("what", "tell"), (
+        r"what\s+is\s+(?P<module>[\w.-]+)",
+        r"what'?s\s+(?P<module>[\w.-]+)",
+        r"tell\s+me\s+about\s+(?P<module>[\w.-]+)",
+    )),
+    ("dependencies", ("depend",), (
+        r"what\s+does\s+(?P<module>[\w.-]+)\s+depend\s+on",
+        r"(?P<module>[\w.-]+)\s+depends?\s+on\s+what",
+        r"dependencies\s+(?:of|for)\s+(?P<module>[\w.-]+)",
+    )),
+    ("required-by", ("use", "require"), (
+        r"who\s+uses?\s+(?P<module>[\w.-]+)",
+        r"what\s+uses?\s+(?P<module>[\w.-]+)",
+        r"what\s+requires?\s+(?P<module>[\w.-]+)",
+    )),
+    ("crash", ("crash", "work"), (
+        r"why\s+(?:does\s+)?(?P<module>[\w.-]+)\s+crash",
+        r"(?P<module>[\w.-]+)\s+(?:is\s+)?crashing",
+        r"(?P<module>[\w.-]+)\s+doesn'?t?\s+work",
+    )),
+    ("crash-search", ("crash", "break", "fail"), (
+        r"what\s+(?:crash(?:es)?|breaks|fails)\s+(?P<text>.+)",
+    )),
+    ("search", ("search", "find"), (
+        r"(?:search|find)\s+(?P<text>.+)",
+    )),
+    ("compatibility", ("compatible", "with"), (
+        r"(?:are\s+)?(?P<mod1>[\w.-]+)\s+and\s+(?P<mod2>[\w.-]+)\s+compatible",
+        r"can\s+(?:i\s+)?use\s+(?P<mod1>[\w.-]+)\s+with\s+(?P<mod2>[\w.-]+)",
+        r"(?P<mod1>[\w.-]+)\s+(?:works?\s+)?with\s+(?P<mod2>[\w.-]+)\s*\?",
+    )),
+    ("install", ("install",), (
+        r"(?:how\s+(?:do\s+i\s+)?)?install\s+(?P<module>[\w.-]+)",
+        r"i\s+want\s+(?:to\s+)?install\s+(?P<module>[\w.-]+)",
+    )),
+]
+
+_SLOT_RE = LazyRegex(r'\(\?P<(\w+)>')
+
+
+class IntentRouter:
+    """
+    Picks the intent of a question in one regex pass.
+    
+    One scan for trigger keywords selects the candidate rules, then a
+    single regex made of one lookahead per candidate pattern, tried in
+    priority order at the start of the question, finds the winner and its
+    slots. The regex of each candidate set is compiled once.
+    """
+    
+    def __init__(self, rules):
+        self.rules = [(intent, tuple(triggers), tuple(patterns))
+                      for intent, triggers, patterns in rules]
+        self._triggers = TriggerSet([triggers for _intent, triggers, _patterns in self.rules])
+        self._compiled: Dict[int, Tuple] = {}
+    
+    def _compile(self, candidates: int):
+        """(regex, [(intent, slot group names)] by alternative) for a rule mask."""
+        alternatives = []
+        slots = []
+        for i in range(len(self.rules)):
+            if not candidates >> i & 1:
+                continue
+            intent, _triggers, patterns = self.rules[i]
+            for pattern in patterns:
+                n = len(slots)
+                names = _SLOT_RE.findall(pattern)
+                renamed = _SLOT_RE.sub(lambda m: f'(?P<a{n}_{m.group(1)}>', pattern)
+                alternatives.append(f'(?P<a{n}>(?=[\\s\\S]*?(?:{renamed})))')
+                slots.append((intent, [(name, f'a{n}_{name}') for name in names]))
+        compiled = (re.compile('|'.join(alternatives)), slots)
+        self._compiled[candidates] = compiled
+        return compiled
+    
+    def route(self, question: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """(intent, slots) of a lowercased question; (None, {}) if none matches."""
+        candidates = self._triggers.match(question)
+        if not candidates:
+            return None, {}
+        regex, slots = self._compiled.get(candidates) or self._compile(candidates)
+        match = regex.match(question)
+        if not match:
+            return None, {}
+        intent, groups = slots[int(match.lastgroup[1:])]
+        return intent, {name: match.group(group) for name, group in groups}
+
+
+# ============================================================================
+# LANGUAGE PACKS
+# ============================================================================
+
+# French: same families and intents as the English tables
+FR_RELATION_RULES = [
+    ("IS-A", (" est ",), "tag", None, (
+        r"([\w.-]+)\s+est\s+une?\s+(\w+)",
+        r"([\w.-]+)\s+est\s+une?\s+module\s+(?:de\s+|d')?(\w+)",
+    )),
+    ("ALIAS-OF", ("alias",), "tag", None, (
+        r"([\w.-]+)\s+est\s+(?:un\s+)?alias\s+(?:de\s+|d'|pour\s+)([\w.-]+)",
+    )),
+    ("DEPENDS-ON", ("dépend", "nécessite", "besoin"), "tag", "REQUIRED-BY", (
+        r"([\w.-]+)\s+dépend\s+de\s+([\w.-]+)",
+        r"([\w.-]+)\s+nécessite\s+([\w.-]+)",
+        r"([\w.-]+)\s+a\s+besoin\s+de\s+([\w.-]+)",
+    )),
+    ("CONFLICTS-WITH", ("conflit", "incompatible"), "tag", "CONFLICTS-WITH", (
+        r"([\w.-]+)\s+et\s+([\w.-]+)\s+ont\s+un\s+conflit",
+        r"([\w.-]+)\s+(?:est\s+)?en\s+conflit\s+avec\s+([\w.-]+)",
+        r"([\w.-]+)\s+est\s+incompatible\s+avec\s+([\w.-]+)",
+    )),
+    ("STABLE-VERSION", ("version",), "replace", None, (
+        r"([\w.-]+)\s+version\s+stable\s+(?:est\s+)?(\d+[\d\.]*)",
+        r"version\s+stable\s+de\s+([\w.-]+)\s+(?:est\s+)?(\d+[\d\.]*)",
+    )),
+    ("SOLUTION-FOR", ("plante", "corriger", "solution"), "tag", None, (
+        r"pour\s+([\w.-]+)\s+qui\s+plante.*?(?:mettre\s+à\s+jour|installer|downgrader|utiliser)\s+(\w+)",
+        r"pour\s+corriger\s+([\w.-]+).*?(?:mettre\s+à\s+jour|installer|utiliser)\s+(\w+)",
+        r"solution\s+pour\s+([\w.-]+).*?(?:est|:)\s+(\w+)",
+    )),
+    ("CRASH", (" plante",), "context", None, (
+        r"([\w.-]+)\s+plante\s+(?:si|quand|lorsque|parce\s+que)\s+(.+)",
+        r"([\w.-]+)\s+plante\s+(sans\s+.+)",
+    )),
+]
+
+FR_INTENT_RULES = [
+    ("related", ("similaire", "proche", "comme", "avec"), (
+        r"similaires?\s+à\s+(?P<module>[\w.-]+)",
+        r"proches?\s+de\s+(?P<module>[\w.-]+)",
+        r"(?:modules?|paquets?)\s+comme\s+(?P<module>[\w.-]+)",
+        r"va\s+avec\s+(?P<module>[\w.-]+)",
+    )),
+    ("what-is", ("quoi", "qu'est"), (
+        r"c'?est\s+quoi\s+(?P<module>[\w.-]+)",
+        r"qu'?est-ce\s+que\s+(?P<module>[\w.-]+)",
+    )),
+    ("dependencies", ("dépend",), (
+        r"(?P<module>[\w.-]+)\s+dépend\s+de\s+quoi",
+        r"dépendances\s+de\s+(?P<module>[\w.-]+)",
+    )),
+    ("required-by", ("utilise", "dépend"), (
+        r"qui\s+utilise\s+(?P<module>[\w.-]+)",
+        r"qui\s+dépend\s+de\s+(?P<module>[\w.-]+)",
+    )),
+    ("crash", ("plante", "marche"), (
+        r"pourquoi\s+(?P<module>[\w.-]+)\s+plante",
+        r"(?P<module>[\w.-]+)\s+ne\s+marche\s+pas",
+    )),
+    ("crash-search", ("plante",), (
+        r"qu'?est-ce\s+qui\s+plante\s+(?P<text>.+)",
+    )),
+    ("search", ("cherche",), (
+        r"(?:re)?cherche[rz]?\s+(?P<text>.+)",
+    )),
+    ("compatibility", ("compatible", "avec"), (
+        r"(?P<mod1>[\w.-]+)\s+et\s+(?P<mod2>[\w.-]+)\s+(?:sont\s+)?compatibles?",
+        r"(?P<mod1>[\w.-]+)\s+(?:marche|fonctionne)\s+avec\s+(?P<mod2>[\w.-]+)",
+    )),
+    ("install", ("installer",), (
+        r"(?:comment\s+)?installer\s+(?P<module>[\w.-]+)",
+    )),
+]
+
+# CJK: module names are the ASCII runs ([a-z0-9_]+, like \w+ in English:
+# "scikit-learn" gives "learn"); the rest is matched literally.
+JA_RELATION_RULES = [
+    ("IS-A", ("モジュール",), "tag", None, (
+        r"([a-z0-9_]+)\s*は(モジュール)です",
+        r"([a-z0-9_]+)\s*は(\S+?)モジュールです",
+    )),
+    ("ALIAS-OF", ("エイリアス",), "tag", None, (
+        r"([a-z0-9_]+)\s*は([a-z0-9_]+)[a-z0-9_.-]*のエイリアス",
+    )),
+    ("DEPENDS-ON", ("依存",), "tag", "REQUIRED-BY", (
+        r"([a-z0-9_]+)\s*は([a-z0-9_]+)[a-z0-9_.-]*に依存",
+    )),
+    ("CONFLICTS-WITH", ("コンフリクト",), "tag", "CONFLICTS-WITH", (
+        r"([a-z0-9_]+)\s*と([a-z0-9_]+)\s*は\S*?コンフリクト",
+    )),
+    ("STABLE-VERSION", ("安定版",), "replace", None, (
+        r"([a-z0-9_]+)\s*安定版は([0-9]+[0-9.]*)",
+    )),
+    ("SOLUTION-FOR", ("修正",), "tag", None, (
+        r"([a-z0-9_]+)\s*を修正するには([a-z0-9_]+)",
+    )),
+    ("CRASH", ("クラッシュ",), "context", None, (
+        r"([a-z0-9_]+)\s*は(.+?)クラッシュ",
+    )),
+]
+
+JA_INTENT_RULES = [
+    ("related", ("似", "関連"), (
+        r"(?P<module>[a-z0-9_]+)\s*に似",
+        r"(?P<module>[a-z0-9_]+)\s*(?:に|と)関連",
+    )),
+    ("what-is", ("何", "とは"), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:は|って)何(?:です|\s*[?？]|$)",
+        r"(?P<module>[a-z0-9_]+)\s*とは",
+    )),
+    ("dependencies", ("依存",), (
+        r"(?P<module>[a-z0-9_]+)\s*は何に依存",
+        r"(?P<module>[a-z0-9_]+)\s*の依存関係",
+    )),
+    ("required-by", ("依存", "使"), (
+        r"何が(?P<module>[a-z0-9_]+)\s*に依存",
+        r"誰が(?P<module>[a-z0-9_]+)\s*を使",
+    )),
+    ("crash", ("クラッシュ",), (
+        r"なぜ(?P<module>[a-z0-9_]+)\s*(?:は|が)クラッシュ",
+        r"(?P<module>[a-z0-9_]+)\s*(?:は|が)なぜクラッシュ",
+    )),
+    ("compatibility", ("互換",), (
+        r"(?P<mod1>[a-z0-9_]+)\s*と(?P<mod2>[a-z0-9_]+)\s*は?互換",
+    )),
+    ("install", ("インストール",), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:を|の)インストール",
+    )),
+]
+
+ZH_RELATION_RULES = [
+    ("IS-A", ("模块",), "tag", None, (
+        r"([a-z0-9_]+)\s*是一个(模块)",
+        r"([a-z0-9_]+)\s*是一个(\S+?)模块",
+    )),
+    ("ALIAS-OF", ("别名",), "tag", None, (
+        r"([a-z0-9_]+)\s*是([a-z0-9_]+)[a-z0-9_.-]*的别名",
+    )),
+    ("DEPENDS-ON", ("依赖",), "tag", "REQUIRED-BY", (
+        r"([a-z0-9_]+)\s*依赖([a-z0-9_]+)",
+    )),
+    ("CONFLICTS-WITH", ("冲突",), "tag", "CONFLICTS-WITH", (
+        r"([a-z0-9_]+)\s*和([a-z0-9_]+)\s*有\S*?冲突",
+    )),
+    ("STABLE-VERSION", ("稳定版本",), "replace", None, (
+        r"([a-z0-9_]+)\s*稳定版本是([0-9]+[0-9.]*)",
+    )),
+    ("SOLUTION-FOR", ("修复",), "tag", None, (
+        r"修复([a-z0-9_]+)\s*需要\S*?(?:升级|降级|安装)([a-z0-9_]+)",
+    )),
+    ("CRASH", ("崩溃",), "context", None, (
+        r"([a-z0-9_]+)\s*崩溃(.+)",
+    )),
+]
+
+ZH_INTENT_RULES = [
+    ("related", ("类似", "相似", "相关"), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:类似|相似|相关)",
+        r"类似\s*(?P<module>[a-z0-9_]+)",
+    )),
+    ("what-is", ("什么",), (
+        r"(?P<module>[a-z0-9_]+)\s*是什么",
+        r"什么是\s*(?P<module>[a-z0-9_]+)",
+    )),
+    ("dependencies", ("依赖",), (
+        r"(?P<module>[a-z0-9_]+)\s*依赖什么",
+        r"(?P<module>[a-z0-9_]+)\s*的依赖",
+    )),
+    ("required-by", ("谁",), (
+        r"谁(?:依赖|使用|用)\s*(?P<module>[a-z0-9_]+)",
+    )),
+    ("crash", ("崩溃",), (
+        r"为什么\s*(?P<module>[a-z0-9_]+)\s*会?崩溃",
+        r"(?P<module>[a-z0-9_]+)\s*为什么会?崩溃",
+    )),
+    ("compatibility", ("兼容",), (
+        r"(?P<mod1>[a-z0-9_]+)\s*和\s*(?P<mod2>[a-z0-9_]+)\s*兼容",
+    )),
+    ("install", ("安装",), (
+        r"安装\s*(?P<module>[a-z0-9_]+)",
+    )),
+]
+
+KO_RELATION_RULES = [
+    ("IS-A", ("모듈",), "tag", None, (
+        r"([a-z0-9_]+)\s*(?:는|은)\s+(모듈)입니다",
+        r"([a-z0-9_]+)\s*(?:는|은)\s+(.+?)\s+모듈입니다",
+    )),
+    ("ALIAS-OF", ("별칭",), "tag", None, (
+        r"([a-z0-9_]+)\s*(?:는|은)\s+([a-z0-9_]+)[a-z0-9_.-]*의\s+별칭",
+    )),
+    ("DEPENDS-ON", ("의존",), "tag", "REQUIRED-BY", (
+        r"([a-z0-9_]+)\s*(?:는|은)\s+([a-z0-9_]+)[a-z0-9_.-]*에\s+의존",
+    )),
+    ("CONFLICTS-WITH", ("충돌이",), "tag", "CONFLICTS-WITH", (
+        r"([a-z0-9_]+)\s*(?:와|과)\s+([a-z0-9_]+)\s*(?:는|은)\s+.*?충돌이\s+있",
+    )),
+    ("STABLE-VERSION", ("버전",), "replace", None, (
+        r"([a-z0-9_]+)\s+안정\s+버전은\s+([0-9]+[0-9.]*)",
+    )),
+    ("SOLUTION-FOR", ("수정",), "tag", None, (
+        r"([a-z0-9_]+)\s*(?:를|을)\s+수정하려면\s+([a-z0-9_]+)",
+    )),
+    ("CRASH", ("충돌합",), "context", None, (
+        r"([a-z0-9_]+)\s*(?:는|은)\s+(.+?)\s*충돌합니다",
+    )),
+]
+
+KO_INTENT_RULES = [
+    ("related", ("비슷", "관련"), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:와|과)\s*비슷",
+        r"(?P<module>[a-z0-9_]+)\s*(?:와|과)?\s*관련",
+    )),
+    ("what-is", ("무엇", "뭐"), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:는|은|이|가)\s*(?:무엇|뭐)(?:입니까|인가요|예요|야|\s*[?？]|$)",
+    )),
+    ("dependencies", ("의존",), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:는|은)\s*무엇에\s*의존",
+        r"(?P<module>[a-z0-9_]+)\s*의\s*의존성",
+    )),
+    ("required-by", ("사용", "의존"), (
+        r"누가\s*(?P<module>[a-z0-9_]+)\s*(?:를|을)\s*사용",
+        r"무엇이\s*(?P<module>[a-z0-9_]+)\s*에\s*의존",
+    )),
+    ("crash", ("충돌",), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:는|은|이|가)\s*왜\s*충돌",
+        r"왜\s*(?P<module>[a-z0-9_]+)\s*(?:는|은|이|가)\s*충돌",
+    )),
+    ("compatibility", ("호환",), (
+        r"(?P<mod1>[a-z0-9_]+)\s*(?:와|과)\s*(?P<mod2>[a-z0-9_]+)\s*(?:는|은)?\s*호환",
+    )),
+    ("install", ("설치",), (
+        r"(?P<module>[a-z0-9_]+)\s*(?:를|을)?\s*설치",
+    )),
+]
+
+# Scripts, told apart per sentence by the first of them it contains.
+# Sentences in none of them (ASCII, accented Latin...) are "latin".
+#   name, characters, written without spaces (tokens found by longest match)
+SCRIPTS = [
+    ("kana", LazyRegex(r'[\u3040-\u30ff]'), True),                     # Japanese
+    ("hangul", LazyRegex(r'[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]'), False),
+    ("han", LazyRegex(r'[\u3400-\u4dbf\u4e00-\u9fff]'), True),          # Chinese
+]
+
+# Language packs, tried in this order within a script. Each has its
+# script, relation rules (RELATION_RULES format), intent rules
+# (INTENT_RULES format) and, for scripts without spaces, the words the
+# tokenizer keeps whole. Add languages with register_language().
+LANGUAGE_PACKS = {
+    "en": {"script": "latin", "relations": RELATION_RULES, "intents": INTENT_RULES},
+    "fr": {"script": "latin", "relations": FR_RELATION_RULES, "intents": FR_INTENT_RULES},
+    "ja": {"script": "kana", "relations": JA_RELATION_RULES, "intents": JA_INTENT_RULES,
+           "vocabulary": (
+               "モジュール", "依存", "依存関係", "エイリアス", "安定版", "計算", "科学",
+               "可視化", "機械学習", "名前空間", "共有", "修正", "環境", "分離", "管理",
+               "作成", "削除", "表示", "使用", "必要", "推奨", "非推奨", "併用", "各",
+               "古い", "新しすぎる", "なし", "です", "します", "するには", "あります",
+               "ですか", "何", "なぜ", "互換", "互換性", "とは",
+           )},
+    "zh": {"script": "han", "relations": ZH_RELATION_RULES, "intents": ZH_INTENT_RULES,
+           "vocabulary": (
+               "模块", "一个", "计算", "科学", "可视化", "数据", "深度学习", "机器学习",
+               "网络", "网页", "依赖", "别名", "冲突", "命名", "共享", "稳定", "版本",
+               "稳定版本", "崩溃", "如果", "太旧", "太新", "没有", "修复", "需要", "升级",
+               "降级", "安装", "卸载", "隔离", "管理", "环境", "列出", "显示", "创建",
+               "使用", "用于", "必需", "推荐", "不推荐", "一起", "每个", "项目", "什么",
+               "为什么", "兼容", "相关",
+           )},
+    "ko": {"script": "hangul", "relations": KO_RELATION_RULES, "intents": KO_INTENT_RULES},
+}
+
+# ASCII runs and runs of other word characters, in lowercased CJK text
+TOKEN_RUN_RE = LazyRegex(r'[a-z0-9_]+|[^\W_a-z0-9]+')
+KATAKANA_RUN_RE = LazyRegex(r'[\u30a0-\u30ff]+')
+
+
+def detect_script(text: str) -> str:
+    """The SCRIPTS name of a sentence, "latin" if none."""
+    if not text.isascii():
+        for script, characters, _unspaced in SCRIPTS:
+            if characters.search(text):
+                return script
+    return "latin"
+
+
+class PatternPack:
+    """
+    The compiled rules of every language written in one script.
+    
+    Relation rules sit behind one TriggerSet, compiled when a first
+    sentence is learned (answering never needs them); each language keeps
+    its own IntentRouter, tried in LANGUAGE_PACKS order, so a question in
+    the first language never pays for the others. tokenize() splits text
+    into words: WORD_RE for Latin, ASCII and non-ASCII runs otherwise,
+    with runs of unspaced scripts cut by longest match on the packs'
+    vocabulary (an unknown katakana run stays whole, other unknown
+    characters stand alone).
+    """
+    
+    def __init__(self, script: str, packs: List[dict]):
+        self.script = script
+        self._rules = [rule for pack in packs for rule in pack.get('relations', ())]
+        self.relations = self.triggers = None
+        self.routers = [IntentRouter(pack['intents']) for pack in packs if pack.get('intents')]
+        self.vocabulary = {word for pack in packs for word in pack.get('vocabulary', ())}
+        self.longest = max(map(len, self.vocabulary), default=1)
+        self.unspaced = any(unspaced for name, _chars, unspaced in SCRIPTS if name == script)
+    
+    def relations_in(self, text: str):
+        """Yields the relation rules whose triggers appear in lowercased text."""
+        if self.relations is None:
+            self.relations = compile_relation_rules(self._rules)
+            self.triggers = TriggerSet([rule[1] for rule in self._rules])
+        relations = self.relations
+        candidates = self.triggers.match(text)
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            yield relations[low.bit_length() - 1]
+    
+    def route(self, question: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """(intent, slots) of a lowercased question, from the first language matching it."""
+        for router in self.routers:
+            intent, slots = router.route(question)
+            if intent is not None:
+                return intent, slots
+        return None, {}
+    
+    def _starts_word(self, run: str, i: int) -> bool:
+        vocabulary = self.vocabulary
+        return any(run[i:i + n] in vocabulary for n in range(2, self.longest + 1))
+    
+    def tokenize(self, text: str) -> List[str]:
+        """The word tokens of lowercased text."""
+        if self.script == "latin":
+            return WORD_RE.findall(text)
+        runs = TOKEN_RUN_RE.findall(text)
+        if not self.unspaced:
+            return runs
+        tokens = []
+        vocabulary, longest = self.vocabulary, self.longest
+        for run in runs:
+            if run.isascii():
+                tokens.append(run)
+                continue
+            i, end = 0, len(run)
+            while i < end:
+                for n in range(min(longest, end - i), 1, -1):
+                    if run[i:i + n] in vocabulary:
+                        j = i + n
+                        break
+                else:
+                    katakana = KATAKANA_RUN_RE.match(run, i)
+                    j = katakana.end() if katakana else i + 1
+                    # ...up to the next known word inside it
+                    j = next((k for k in range(i + 1, j) if self._starts_word(run, k)), j)
+                tokens.append(run[i:j])
+                i = j
+        return tokens
+
+
+# Compiled PatternPack by script, built on first use
+_PATTERN_PACKS: Dict[str, PatternPack] = {}
+
+
+def pattern_pack(script: str) -> PatternPack:
+    """The PatternPack of a script (compiled once)."""
+    pack = _PATTERN_PACKS.get(script)
+    if pack is None:
+        packs = [p for p in LANGUAGE_PACKS.values() if p['script'] == script]
+        pack = _PATTERN_PACKS[script] = PatternPack(script, packs)
+    return pack
+
+
+def register_language(code: str, script: str, relations=(), intents=(), vocabulary=()):
+    """Adds (or replaces) a language pack; its script is recompiled on next use."""
+    LANGUAGE_PACKS[code] = {"script": script, "relations": relations,
+                            "intents": intents, "vocabulary": vocabulary}
+    _PATTERN_PACKS.pop(script, None)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of text, split the way its script needs."""
+    text = text.lower()
+    return pattern_pack(detect_script(text)).tokenize(text)
+
+
+# ============================================================================
+# STREAMING INPUT
+# ============================================================================
+
+# Word tokens
+WORD_RE = LazyRegex(r'\b\w+\b')
+
+# Sentence ends: . ! ? followed by whitespace (so "1.24" and
+# "requirements.txt" stay whole), or a CJK full stop / mark.
+SENTENCE_END = LazyRegex(r'[.!?](?=\s|$)|[。！？]')
+
+
+def open_text(filepath: str):
+    """Opens a text input: '-' is stdin, .gz/.bz2/.xz are decompressed."""
+    if filepath == '-':
+        import io
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+    
+    lower = filepath.lower()
+    if lower.endswith('.gz'):
+        import gzip
+        return gzip.open(filepath, 'rt', encoding='utf-8', errors='replace')
+    if lower.endswith('.bz2'):
+        import bz2
+        return bz2.open(filepath, 'rt', encoding='utf-8', errors='replace')
+    if lower.endswith(('.xz', '.lzma')):
+        import lzma
+        return lzma.open(filepath, 'rt', encoding='utf-8', errors='replace')
+    return open(filepath, 'r', encoding='utf-8', errors='replace')
+
+
+class SentenceSplitter:
+    """
+    Incremental sentence segmentation.
+    
+    A single line break is just whitespace, so sentences may span lines.
+    Sentences end at SENTENCE_END, at blank lines and at comment lines
+    (starting with '#', which are dropped). Nothing longer than
+    max_length is ever buffered.
+    """
+    
+    def __init__(self, max_length: int = MAX_SENTENCE_LENGTH):
+        self.max_length = max_length
+        self._parts: List[str] = []
+        self._size = 0
+        self._line_start = True
+        self._comment = False
+    
+    def feed(self, text: str, line_end: bool = True) -> List[str]:
+        """Feeds a line (or a piece of an over-long line, cut at whitespace)."""
+        sentences = []
+        
+        if self._line_start:
+            stripped = text.strip()
+            if not stripped:
+                if line_end:
+                    sentences = self.flush()
+                return sentences
+            self._line_start = False
+            self._comment = stripped.startswith('#')
+            if self._comment:
+                sentences = self.flush()
+        
+        if not self._comment:
+            pieces = SENTENCE_END.split(text)
+            for piece in pieces[:-1]:
+                self._add(piece)
+                sentences.extend(self.flush())
+            self._add(pieces[-1])
+            if self._size > self.max_length:
+                sentences.extend(self.flush())
+        
+        if line_end:
+            self._line_start = True
+        return sentences
+    
+    def flush(self) -> List[str]:
+        """Returns the pending sentence, if any."""
+        if not self._parts:
+            return []
+        sentence = ' '.join(self._parts)[:self.max_length]
+        self._parts = []
+        self._size = 0
+        return [sentence]
+    
+    def _add(self, piece: str):
+        piece = piece.strip()
+        if piece:
+            self._parts.append(piece)
+            self._size += len(piece) + 1
+
+
+def iter_sentences(stream, chunk_size: int = CHUNK_SIZE):
+    """Yields the sentences of a text stream, reading it chunk by chunk."""
+    splitter = SentenceSplitter()
+    tail = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield from splitter.feed(line)
+        
+        # Over-long line: hand over everything up to its last whitespace
+        if len(tail) > chunk_size:
+            cut = max(tail.rfind(' '), tail.rfind('\t'))
+            if cut > 0:
+                yield from splitter.feed(tail[:cut], line_end=False)
+                tail = tail[cut:]
+            elif len(tail) > splitter.max_length:
+                yield from splitter.feed(tail, line_end=False)
+                tail = ''
+    
+    if tail:
+        yield from splitter.feed(tail)
+    yield from splitter.flush()
+
+
+# ============================================================================
+# BEACON STORE
+# ============================================================================
+
+LINK_SHIFT = 32                         # Link entry: word ID << 32 | count
+LINK_COUNT_MASK = (1 << LINK_SHIFT) - 1
+
+
+class Lexicon:
+    """Interns strings (words, tag values) to dense integer IDs."""
+    
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.words: List[str] = []
+    
+    def intern(self, word: str) -> int:
+        """Returns the ID of word, giving it the next free one if new."""
+        wid = self.ids.get(word)
+        if wid is None:
+            wid = self.ids[word] = len(self.words)
+            self.words.append(word)
+        return wid
+    
+    def get(self, word: str) -> Optional[int]:
+        """Returns the ID of word, or None."""
+        return self.ids.get(word)
+    
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+class Beacon:
     """
+    A concept.
+    
+    Words are lexicon IDs. links is an array of (word ID << 32 | count)
+    sorted by ID; learning queues link IDs in unmerged, folded into links
+    in batches and whenever links is read. tags ({tag: [IDs]}, a tag with
+    more than TAG_SET_SIZE values holding them as an ordered set {ID: None})
+    and contexts stay None until first needed, and a lone context is kept
+    as a bare string.
+    """
+    
+    __slots__ = ('activations', '_links', 'unmerged', 'tags', 'contexts')
     
     def __init__(self):
-        self.beacons: Dict[str, dict] = {}
-        self.sequences: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-        self.cooccurrences: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.activations = 0
+        self._links = None
+        self.unmerged = None
+        self.tags = None
+        self.contexts = None
+    
+    # --- Links ---
+    
+    @property
+    def links(self) -> Optional[array]:
+        if self.unmerged is not None:
+            self.merge_links()
+        return self._links
+    
+    @links.setter
+    def links(self, links: Optional[array]):
+        self._links = links
+    
+    def queue_links(self, wids: List[int], keep: Optional[int] = None):
+        """
+        Counts one link towards each word ID of wids, merged later in one
+        go. With keep, merging prunes links past keep (see prune_links).
+        """
+        unmerged = self.unmerged
+        if unmerged is None:
+            self.unmerged = unmerged = array('Q', wids)
+        else:
+            unmerged.extend(wids)
+        links = self._links
+        if len(unmerged) >= (LINK_BATCH if links is None else max(LINK_BATCH, len(links))):
+            self.merge_links()
+            if keep is not None and len(self._links) > keep:
+                # Down to 3/4 of keep, so pruning is not redone every batch
+                self.prune_links(keep * 3 // 4)
+    
+    def merge_links(self):
+        """Folds the queued link IDs into links."""
+        unmerged, self.unmerged = self.unmerged, None
+        if unmerged is not None:
+            self.add_links(Counter(unmerged))
+    
+    def add_link(self, wid: int, n: int = 1):
+        """Adds n to the link count towards word ID wid."""
+        links = self.links
+        key = wid << LINK_SHIFT
+        if links is None:
+            self.links = array('Q', (key | n,))
+            return
+        i = bisect_left(links, key)
+        if i < len(links) and links[i] >> LINK_SHIFT == wid:
+            links[i] += n
+        else:
+            links.insert(i, key | n)
+    
+    def add_links(self, counts: Dict[int, int]):
+        """Adds many {word ID: count} at once, in one pass."""
+        links = self.links
+        if links is not None and len(counts) < len(links):
+            # Fewer links than the array holds: insert in place
+            add = self.add_link
+            for wid, n in counts.items():
+                add(wid, n)
+            return
+        if links is not None:
+            merged = dict(self.link_items())
+            for wid, n in counts.items():
+                merged[wid] = merged.get(wid, 0) + n
+            counts = merged
+        if counts:
+            self.links = array('Q', sorted((wid << LINK_SHIFT) | n for wid, n in counts.items()))
+    
+    def prune_links(self, keep: int):
+        """Keeps only the keep most frequent links (the lowest IDs on ties)."""
+        links = self.links
+        if links is None or len(links) <= keep:
+            return
+        top = sorted(links, key=lambda entry: -(entry & LINK_COUNT_MASK))[:keep]
+        self.links = array('Q', sorted(top))
+    
+    def link_items(self):
+        """Yields (word ID, count) pairs, by ID."""
+        for entry in self.links or ():
+            yield entry >> LINK_SHIFT, entry & LINK_COUNT_MASK
+    
+    def link_count(self) -> int:
+        return len(self.links) if self.links is not None else 0
+    
+    # --- Tags ---
+    
+    def tag_ids(self, tag: str) -> List[int]:
+        """Returns the value IDs of tag (empty if none)."""
+        if self.tags is None:
+            return []
+        values = self.tags.get(tag)
+        if values.__class__ is dict:
+            return list(values)
+        return values or []
+    
+    def add_tag(self, tag: str, vid: int):
+        """Appends value ID vid to tag, once."""
+        if self.tags is None:
+            self.tags = {}
+        values = self.tags.get(tag)
+        if values is None:
+            self.tags[tag] = [vid]
+        elif values.__class__ is dict:
+            values[vid] = None
+        elif vid not in values:
+            values.append(vid)
+            if len(values) > TAG_SET_SIZE:
+                # Long lists (REQUIRED-BY of popular modules) stop being scanned
+                self.tags[tag] = dict.fromkeys(values)
+    
+    def set_tag(self, tag: str, vids: List[int]):
+        """Replaces the values of tag."""
+        if self.tags is None:
+            self.tags = {}
+        self.tags[tag] = list(vids)
+    
+    def tag_count(self) -> int:
+        return sum(len(v) for v in self.tags.values()) if self.tags else 0
+    
+    # --- Contexts ---
+    
+    def add_context(self, context: str, limit: Optional[int] = None):
+        """Appends a context, keeping only the most recent limit ones."""
+        contexts = self.contexts
+        if limit == 0:
+            return
+        if contexts is None or limit == 1:
+            self.contexts = context
+        elif contexts.__class__ is str:
+            self.contexts = [contexts, context]
+        else:
+            contexts.append(context)
+            if limit is not None and len(contexts) > limit:
+                del contexts[:len(contexts) - limit]
+    
+    def context_list(self) -> List[str]:
+        contexts = self.contexts
+        if contexts is None:
+            return []
+        if contexts.__class__ is str:
+            return [contexts]
+        return list(contexts)
+    
+    # --- Compaction ---
+    
+    def compact(self, dropped, keep: Optional[int] = None):
+        """
+        Drops links towards the word IDs in dropped and all but the keep
+        most frequent (None = all), repeated contexts (the latest copy
+        stays), and turns tag lists past TAG_SET_SIZE values into sets.
+        """
+        links = self.links
+        if links is not None and dropped:
+            kept = array('Q', (e for e in links if e >> LINK_SHIFT not in dropped))
+            self.links = kept or None
+        if keep is not None:
+            self.prune_links(keep)
+        
+        contexts = self.contexts
+        if contexts is not None and contexts.__class__ is not str:
+            unique = list(dict.fromkeys(reversed(contexts)))[::-1]
+            self.contexts = unique[0] if len(unique) == 1 else unique
+        
+        for tag, values in (self.tags or {}).items():
+            if values.__class__ is not dict and len(values) > TAG_SET_SIZE:
+                self.tags[tag] = dict.fromkeys(values)
+
+
+def beacon_to_dict(word: str, beacon: Beacon, lexicon: Lexicon,
+                   tag_names: List[str]) -> dict:
+    """Expands a beacon into the JSON/export dict form."""
+    words = lexicon.words
+    return {
+        "word": word,
+        "links": {words[wid]: n for wid, n in beacon.link_items()},
+        "tags": {tag: [words[v] for v in beacon.tag_ids(tag)] for tag in tag_names},
+        "activations": beacon.activations,
+        "contexts": beacon.context_list()
+    }
+
+
+def beacon_from_dict(data: dict, lexicon: Lexicon) -> Beacon:
+    """Builds a beacon from its dict form, interning its words into lexicon."""
+    intern = lexicon.intern
+    beacon = Beacon()
+    beacon.activations = data.get('activations', 0)
+    links = data.get('links')
+    if links:
+        beacon.links = array('Q', sorted((intern(w) << LINK_SHIFT) | n for w, n in links.items()))
+    tags = {tag: [intern(v) for v in values]
+            for tag, values in data.get('tags', {}).items() if values}
+    if tags:
+        beacon.tags = tags
+    contexts = data.get('contexts')
+    if contexts:
+        beacon.contexts = contexts[0] if len(contexts) == 1 else list(contexts)
+    return beacon
+
+
+class BeaconTable(Mapping):
+    """Beacons by word, stored by lexicon ID and iterated in creation order."""
+    
+    def __init__(self, lexicon: Lexicon):
+        self.lexicon = lexicon
+        self._beacons: List[Optional[Beacon]] = []
+        self._order = array('I')
+    
+    def by_id(self, wid: int) -> Optional[Beacon]:
+        """Returns the in-memory beacon of word ID wid, or None."""
+        return self._beacons[wid] if wid < len(self._beacons) else None
+    
+    def _place(self, wid: int, beacon: Beacon):
+        beacons = self._beacons
+        if wid >= len(beacons):
+            beacons.extend([None] * (wid + 1 - len(beacons)))
+        beacons[wid] = beacon
+    
+    def add(self, wid: int, beacon: Beacon) -> Beacon:
+        """Stores a new beacon for word ID wid."""
+        self._place(wid, beacon)
+        self._order.append(wid)
+        return beacon
+    
+    def ensure(self, wid: int) -> Beacon:
+        """Returns the beacon of word ID wid, creating it if needed."""
+        beacon = self.by_id(wid)
+        if beacon is None:
+            beacon = self.add(wid, Beacon())
+        return beacon
+    
+    def ids(self):
+        """Yields word IDs in creation order."""
+        return iter(self._order)
+    
+    def tag_ids(self, wid: int, tag: str) -> List[int]:
+        """The tag values of word ID wid (empty if it has no beacon)."""
+        beacon = self.by_id(wid)
+        return beacon.tag_ids(tag) if beacon is not None else []
+    
+    def tagged(self, tag: str):
+        """Yields (word ID, value IDs) of every beacon with tag."""
+        for wid in self.ids():
+            values = self._beacons[wid].tag_ids(tag)
+            if values:
+                yield wid, values
+    
+    def get(self, word: str, default=None):
+        wid = self.lexicon.ids.get(word)
+        beacon = self.by_id(wid) if wid is not None else None
+        return default if beacon is None else beacon
+    
+    def __getitem__(self, word: str) -> Beacon:
+        beacon = self.get(word)
+        if beacon is None:
+            raise KeyError(word)
+        return beacon
+    
+    def __contains__(self, word) -> bool:
+        return self.get(word) is not None
+    
+    def __iter__(self):
+        words = self.lexicon.words
+        for wid in self.ids():
+            yield words[wid]
+    
+    def __len__(self) -> int:
+        return len(self._order)
+    
+    def values(self):
+        for wid in self.ids():
+            yield self._beacons[wid]
+    
+    def items(self):
+        words = self.lexicon.words
+        for wid in self.ids():
+            yield words[wid], self._beacons[wid]
+    
+    def loaded(self):
+        """Yields the beacons held in memory (created or decoded)."""
+        for beacon in self._beacons:
+            if beacon is not None:
+                yield beacon
+    
+    def added(self, start: int = 0):
+        """Yields the words of beacons created in memory, from the start-th on."""
+        words = self.lexicon.words
+        for wid in self._order[start:]:
+            yield words[wid]
+
+
+# ============================================================================
+# BINARY MATRIX FORMAT
+# ============================================================================
+#
+# A matrix file is a header followed by named sections (little-endian):
+#
+#   header   MAGIC | format version u32 | section count u32
+#            then per section: name (4 bytes) | offset u64 | length u64
+#   META     JSON: Marco version, tag names, stats
+#   STRS     interned strings: count u32 | offsets u64[count + 1] | UTF-8 blob
+#   BIDX     beacon count u32 | record offsets u64[count] (into BEAC)
+#   HASH     slot count u32 | beacon number + 1 u32[slots] (0 = empty),
+#            open addressing on crc32(word), linear probing
+#   BEAC     beacon records: word, activations, link count, context count,
+#            one count per tag (u32 each), then u32 arrays of string IDs:
+#            links as (word, count) pairs, tag values, contexts
+#   COOC     cooccurrence table (formats 2-4, now ignored: the BEAC links
+#            hold the same counts), layout as SEQS
+#   SEQS     sequence table (format 2+): row count u32, then zlib of u32
+#            rows: word, n, n column words, n counts
+#   CIDX     context index (format 3+): doc count u32 | term slot count
+#            u32 | term count u32 | doc slot count u32 | total doc length
+#            u64, then per doc (text, owner + 1, length) u32, term slots
+#            u32 (term number + 1, on crc32 of the term), per term (term,
+#            posting count) u32 and first posting u64, doc slots u32 (doc
+#            + 1, on crc32 of doc_key) and postings (doc << 8 | tf) u64.
+#            Formats 3-4 store first posting and postings as u32 (at most
+#            2^24 documents)
+#   RELS     related modules (format 4+): beacon count u32 | first u32
+#            [count + 1], then the beacons' nearest modules (beacon number
+#            u32, nearest first) and their cosines (f32), first[i] to
+#            first[i + 1] for beacon i
+#
+# The file is opened with mmap, so a query only touches the pages of the
+# beacons it looks up. SEQS is only decoded when learning needs it,
+# and a search only reads the postings of its terms.
+#
+# Changes learned after a save are appended to a delta log next to the
+# matrix (FILE.delta): records of DELTA_MAGIC | length u32 | crc32 u32 |
+# zlib(JSON state), each tagged with the META id of the matrix it extends.
+
+MATRIX_MAGIC = b'MARCOMX\x00'
+MATRIX_FORMAT = 5
+DELTA_MAGIC = b'MXDL'
+DELTA_COMPACT_RATIO = 0.25      # Rewrite the matrix when its delta log gets this big
+
+
+def _u32_array(values) -> bytes:
+    """Packs ints as little-endian u32."""
+    data = array('I', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _u32_unpack(buffer) -> List[int]:
+    """Unpacks little-endian u32 bytes."""
+    data = array('I')
+    data.frombytes(buffer)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tolist()
+
+
+def _u64_array(values) -> bytes:
+    """Packs ints as little-endian u64."""
+    data = array('Q', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _u64_unpack(buffer) -> List[int]:
+    """Unpacks little-endian u64 bytes."""
+    data = array('Q')
+    data.frombytes(buffer)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tolist()
+
+
+def _hash_slots(keys) -> List[int]:
+    """Open addressing table of key number + 1 on crc32(key), linear probing."""
+    keys = list(keys)
+    slots = 8
+    while slots < 2 * len(keys):
+        slots *= 2
+    table = [0] * slots
+    for number, key in enumerate(keys):
+        slot = zlib.crc32(key.encode('utf-8')) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = number + 1
+    return table
+
+
+def write_binary_matrix(filepath: str, beacons, tag_names: List[str], meta: dict,
+                        tables: Optional[Dict[bytes, object]] = None, docs=None,
+                        related: Optional[Dict[str, List[Tuple[str, float]]]] = None):
+    """
+    Writes a matrix to filepath, atomically.
+    
+    beacons yields beacon dicts (see beacon_to_dict); tables maps a section
+    name (SEQS) to (word, {other: count}) rows; docs yields the
+    (text, owner) documents of the context index; related maps words to
+    their nearest modules, as (word, cosine).
+    """
+    strings: Dict[str, int] = {}
+    
+    def intern(s: str) -> int:
+        sid = strings.get(s)
+        if sid is None:
+            sid = strings[s] = len(strings)
+        return sid
+    
+    # Beacon records
+    records = bytearray()
+    offsets = []
+    words = []
+    record_header = struct.Struct('<%dI' % (4 + len(tag_names)))
+    for beacon in beacons:
+        word = beacon['word']
+        words.append(word)
+        offsets.append(len(records))
+        links = beacon.get('links', {})
+        tags = beacon.get('tags', {})
+        contexts = beacon.get('contexts', [])
+        tag_values = [tags.get(tag, []) for tag in tag_names]
+        
+        records += record_header.pack(
+            intern(word), beacon.get('activations', 0), len(links), len(contexts),
+            *[len(values) for values in tag_values]
+        )
+        pairs = []
+        for other, n in links.items():
+            pairs.append(intern(other))
+            pairs.append(n)
+        records += _u32_array(pairs)
+        for values in tag_values:
+            records += _u32_array(intern(v) for v in values)
+        records += _u32_array(intern(c) for c in contexts)
+    
+    # Count tables, sparse rows
+    table_sections = []
+    for name, rows in (tables or {}).items():
+        flat = []
+        count = 0
+        for word, row in rows:
+            flat.append(intern(word))
+            flat.append(len(row))
+            flat.extend(intern(other) for other in row)
+            flat.extend(row.values())
+            count += 1
+        table_sections.append(
+            (name, struct.pack('<I', count) + zlib.compress(_u32_array(flat)))
+        )
+    
+    # Context index
+    if docs is not None:
+        doc_table = []
+        doc_keys = []
+        postings: Dict[str, List[int]] = {}
+        total_length = 0
+        for doc, (text, owner) in enumerate(docs):
+            doc_keys.append(doc_key(text, owner))
+            counts = doc_term_counts(text, owner)
+            length = sum(counts.values())
+            total_length += length
+            doc_table += (intern(text), intern(owner) + 1 if owner else 0, length)
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append(doc << 8 | min(tf, 255))
+        
+        entries = bytearray()
+        flat = []
+        term_entry = struct.Struct('<IIQ')
+        for term, entry in postings.items():
+            entries += term_entry.pack(intern(term), len(entry), len(flat))
+            flat.extend(entry)
+        term_slots = _hash_slots(postings)
+        doc_slots = _hash_slots(doc_keys)
+        table_sections.append((b'CIDX', struct.pack('<IIIIQ', len(doc_keys), len(term_slots),
+                                                    len(postings), len(doc_slots), total_length)
+                               + _u32_array(doc_table) + _u32_array(term_slots)
+                               + bytes(entries) + _u32_array(doc_slots) + _u64_array(flat)))
+    
+    # Related modules, by beacon number
+    if related is not None:
+        numbers = {word: number for number, word in enumerate(words)}
+        first = [0]
+        others, scores = [], []
+        for word in words:
+            for other, score in related.get(word, ()):
+                if other in numbers:
+                    others.append(numbers[other])
+                    scores.append(score)
+            first.append(len(others))
+        table_sections.append((b'RELS', struct.pack('<I', len(words)) + _u32_array(first)
+                               + _u32_array(others) + struct.pack('<%df' % len(scores), *scores)))
+    
+    # Word lookup table
+    table = _hash_slots(words)
+    slots = len(table)
+    
+    # String table
+    blob = bytearray()
+    string_offsets = [0]
+    for s in strings:
+        blob += s.encode('utf-8')
+        string_offsets.append(len(blob))
+    
+    sections = [
+        (b'META', json.dumps(dict(meta, tags=tag_names), ensure_ascii=False).encode('utf-8')),
+        (b'STRS', struct.pack('<I', len(strings))
+                  + struct.pack('<%dQ' % len(string_offsets), *string_offsets) + bytes(blob)),
+        (b'BIDX', struct.pack('<I', len(offsets)) + struct.pack('<%dQ' % len(offsets), *offsets)),
+        (b'HASH', struct.pack('<I', slots) + _u32_array(table)),
+        (b'BEAC', bytes(records)),
+    ] + table_sections
+    
+    header_size = len(MATRIX_MAGIC) + 8 + 20 * len(sections)
+    directory = bytearray()
+    position = header_size
+    for name, payload in sections:
+        directory += struct.pack('<4sQQ', name, position, len(payload))
+        position += len(payload)
+    
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MATRIX_MAGIC)
+        f.write(struct.pack('<II', MATRIX_FORMAT, len(sections)))
+        f.write(directory)
+        for _name, payload in sections:
+            f.write(payload)
+    os.replace(tmp_path, filepath)
+
+
+def matrix_path(filepath: Optional[str] = None) -> str:
+    """filepath, or the default matrix (the legacy JSON one if only it exists)."""
+    if filepath is None:
+        return MATRIX_FILE if os.path.exists(MATRIX_FILE) else LEGACY_MATRIX_FILE
+    return filepath
+
+
+def is_binary_matrix(filepath: str) -> bool:
+    """True if filepath starts with the binary matrix magic."""
+    with open(filepath, 'rb') as f:
+        return f.read(len(MATRIX_MAGIC)) == MATRIX_MAGIC
+
+
+class MatrixFile:
+    """Read-only, memory-mapped view of a binary matrix file."""
+    
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        
+        if mm[:len(MATRIX_MAGIC)] != MATRIX_MAGIC:
+            raise ValueError(f"{filepath}: not a Marco matrix file")
+        position = len(MATRIX_MAGIC)
+        version, count = struct.unpack_from('<II', mm, position)
+        if version > MATRIX_FORMAT:
+            raise ValueError(f"{filepath}: matrix format {version} is newer than this Marco")
+        self.format = version
+        position += 8
+        
+        self.sections: Dict[str, Tuple[int, int]] = {}
+        for _ in range(count):
+            name, offset, length = struct.unpack_from('<4sQQ', mm, position)
+            self.sections[name.decode('ascii')] = (offset, length)
+            position += 20
+        
+        offset, length = self.sections['META']
+        self.meta = json.loads(mm[offset:offset + length].decode('utf-8'))
+        self.tag_names: List[str] = self.meta['tags']
+        self._record = struct.Struct('<%dI' % (4 + len(self.tag_names)))
+        
+        self._strs = self.sections['STRS'][0]
+        string_count = struct.unpack_from('<I', mm, self._strs)[0]
+        self._blob = self._strs + 4 + 8 * (string_count + 1)
+        self._bidx = self.sections['BIDX'][0]
+        self._beac = self.sections['BEAC'][0]
+        self._hash = self.sections['HASH'][0]
+        self.count = struct.unpack_from('<I', mm, self._bidx)[0]
+        self._slots = struct.unpack_from('<I', mm, self._hash)[0]
+        self._strings: Dict[int, str] = {}
+        
+        # Context index (format 3+)
+        self.doc_count = self.index_length = 0
+        if 'CIDX' in self.sections:
+            position = self.sections['CIDX'][0]
+            self.doc_count, self._term_slots, terms, self._doc_slots, self.index_length = \
+                struct.unpack_from('<IIIIQ', mm, position)
+            # Postings and each term's first posting are u64 from format 5 on
+            wide = version >= 5
+            self._term_entry = struct.Struct('<IIQ' if wide else '<III')
+            self._posting_size = 8 if wide else 4
+            self._docs = position + 24
+            self._term_table = self._docs + 12 * self.doc_count
+            self._terms = self._term_table + 4 * self._term_slots
+            self._doc_table = self._terms + self._term_entry.size * terms
+            self._postings = self._doc_table + 4 * self._doc_slots
+        self._doc_lengths: Optional[List[int]] = None
+    
+    def close(self):
+        self._mm.close()
+    
+    def string(self, sid: int) -> str:
+        """Returns interned string number sid."""
+        s = self._strings.get(sid)
+        if s is None:
+            start, end = struct.unpack_from('<QQ', self._mm, self._strs + 4 + 8 * sid)
+            s = self._strings[sid] = self._mm[self._blob + start:self._blob + end].decode('utf-8')
+        return s
+    
+    def _record_offset(self, number: int) -> int:
+        return self._beac + struct.unpack_from('<Q', self._mm, self._bidx + 4 + 8 * number)[0]
+    
+    def word(self, number: int) -> str:
+        """Returns the word of beacon number."""
+        return self.string(self._record.unpack_from(self._mm, self._record_offset(number))[0])
+    
+    def find(self, word: str) -> Optional[int]:
+        """Returns the beacon number of word, or None."""
+        mask = self._slots - 1
+        slot = zlib.crc32(word.encode('utf-8')) & mask
+        while True:
+            entry = struct.unpack_from('<I', self._mm, self._hash + 4 + 4 * slot)[0]
+            if not entry:
+                return None
+            if self.word(entry - 1) == word:
+                return entry - 1
+            slot = (slot + 1) & mask
+    
+    def beacon(self, number: int) -> dict:
+        """Decodes beacon number into the in-memory beacon dict."""
+        position = self._record_offset(number)
+        header = self._record.unpack_from(self._mm, position)
+        word_id, activations, n_links, n_contexts = header[:4]
+        tag_counts = header[4:]
+        
+        total = 2 * n_links + sum(tag_counts) + n_contexts
+        position += self._record.size
+        ids = _u32_unpack(self._mm[position:position + 4 * total])
+        string = self.string
+        
+        links = {}
+        for i in range(0, 2 * n_links, 2):
+            links[string(ids[i])] = ids[i + 1]
+        cursor = 2 * n_links
+        tags = {}
+        for tag, n in zip(self.tag_names, tag_counts):
+            tags[tag] = [string(sid) for sid in ids[cursor:cursor + n]]
+            cursor += n
+        contexts = [string(sid) for sid in ids[cursor:cursor + n_contexts]]
+        
+        return {
+            "word": string(word_id),
+            "links": links,
+            "tags": tags,
+            "activations": activations,
+            "contexts": contexts
+        }
+    
+    def tag(self, number: int, tag: str) -> List[str]:
+        """Decodes only one tag of beacon number."""
+        position = self._record_offset(number)
+        header = self._record.unpack_from(self._mm, position)
+        tag_counts = header[4:]
+        i = self.tag_names.index(tag) if tag in self.tag_names else -1
+        if i < 0 or not tag_counts[i]:
+            return []
+        start = position + self._record.size + 4 * (2 * header[2] + sum(tag_counts[:i]))
+        return [self.string(sid) for sid in _u32_unpack(self._mm[start:start + 4 * tag_counts[i]])]
+    
+    def doc(self, number: int) -> Tuple[str, Optional[str]]:
+        """(text, owner) of context index document number."""
+        text, owner, _length = struct.unpack_from('<III', self._mm, self._docs + 12 * number)
+        return self.string(text), self.string(owner - 1) if owner else None
+    
+    def find_doc(self, text: str, owner: Optional[str]) -> Optional[int]:
+        """Number of the index document (text, owner), or None."""
+        if not self.doc_count:
+            return None
+        mask = self._doc_slots - 1
+        slot = zlib.crc32(doc_key(text, owner).encode('utf-8')) & mask
+        while True:
+            entry = struct.unpack_from('<I', self._mm, self._doc_table + 4 * slot)[0]
+            if not entry:
+                return None
+            if self.doc(entry - 1) == (text, owner):
+                return entry - 1
+            slot = (slot + 1) & mask
+    
+    def doc_lengths(self) -> List[int]:
+        """Lengths of all index documents (read once)."""
+        if self._doc_lengths is None:
+            table = _u32_unpack(self._mm[self._docs:self._docs + 12 * self.doc_count])
+            self._doc_lengths = table[2::3]
+        return self._doc_lengths
+    
+    def postings(self, term: str) -> List[int]:
+        """(doc << 8 | tf) postings of term in the context index."""
+        if not self.doc_count:
+            return []
+        mask = self._term_slots - 1
+        slot = zlib.crc32(term.encode('utf-8')) & mask
+        while True:
+            entry = struct.unpack_from('<I', self._mm, self._term_table + 4 * slot)[0]
+            if not entry:
+                return []
+            sid, n, first = self._term_entry.unpack_from(
+                self._mm, self._terms + self._term_entry.size * (entry - 1))
+            if self.string(sid) == term:
+                size = self._posting_size
+                start = self._postings + size * first
+                unpack = _u64_unpack if size == 8 else _u32_unpack
+                return unpack(self._mm[start:start + size * n])
+            slot = (slot + 1) & mask
+    
+    def related(self, number: int) -> List[Tuple[int, float]]:
+        """(beacon number, cosine) of the saved nearest modules of beacon number."""
+        if 'RELS' not in self.sections:
+            return []
+        offset = self.sections['RELS'][0]
+        count = struct.unpack_from('<I', self._mm, offset)[0]
+        start, end = struct.unpack_from('<II', self._mm, offset + 4 + 4 * number)
+        total = struct.unpack_from('<I', self._mm, offset + 4 + 4 * count)[0]
+        numbers = offset + 4 + 4 * (count + 1)
+        others = _u32_unpack(self._mm[numbers + 4 * start:numbers + 4 * end])
+        scores = struct.unpack_from('<%df' % (end - start), self._mm, numbers + 4 * (total + start))
+        return list(zip(others, scores))
+    
+    def table(self, name: str):
+        """Yields (word, {other: count}) rows of count table name, if saved."""
+        if name not in self.sections:
+            return
+        offset, length = self.sections[name]
+        rows = struct.unpack_from('<I', self._mm, offset)[0]
+        flat = _u32_unpack(zlib.decompress(self._mm[offset + 4:offset + length]))
+        string = self.string
+        cursor = 0
+        for _ in range(rows):
+            word, n = flat[cursor], flat[cursor + 1]
+            cursor += 2
+            others = flat[cursor:cursor + n]
+            counts = flat[cursor + n:cursor + 2 * n]
+            cursor += 2 * n
+            yield string(word), {string(o): c for o, c in zip(others, counts)}
+
+
+def append_delta(filepath: str, base_id: str, state: dict):
+    """Appends one learned-state delta for matrix base_id to a delta log."""
+    payload = zlib.compress(
+        json.dumps(dict(state, base=base_id), ensure_ascii=False).encode('utf-8')
+    )
+    with open(filepath, 'ab') as f:
+        f.write(DELTA_MAGIC + struct.pack('<II', len(payload), zlib.crc32(payload)))
+        f.write(payload)
+
+
+def read_deltas(filepath: str, base_id: str):
+    """Yields the states of a delta log that extend matrix base_id, in order."""
+    if not os.path.exists(filepath):
+        return
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    position = 0
+    while position + 12 <= len(data):
+        magic, length, crc = struct.unpack_from('<4sII', data, position)
+        payload = data[position + 12:position + 12 + length]
+        # A torn or corrupt tail (interrupted save) ends the log
+        if magic != DELTA_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        position += 12 + length
+        state = json.loads(zlib.decompress(payload).decode('utf-8'))
+        if state.get('base') == base_id:
+            yield state
+
+
+class MappedBeacons(BeaconTable):
+    """
+    Beacons backed by a MatrixFile, decoded into memory on first access.
+    
+    Decoded and new beacons live in memory, so changes stick; new beacons
+    come after the saved ones. materialize() decodes the rest into a
+    plain BeaconTable and unmaps the file.
+    """
+    
+    def __init__(self, matrix: MatrixFile, lexicon: Lexicon):
+        super().__init__(lexicon)
+        self.matrix = matrix
+    
+    def _decode(self, number: int) -> Tuple[int, Beacon]:
+        """Returns (word ID, beacon) of saved beacon number, decoding it once."""
+        wid = self.lexicon.intern(self.matrix.word(number))
+        beacon = self.by_id(wid)
+        if beacon is None:
+            beacon = beacon_from_dict(self.matrix.beacon(number), self.lexicon)
+            self._place(wid, beacon)
+        return wid, beacon
+    
+    def ensure(self, wid: int) -> Beacon:
+        beacon = self.by_id(wid)
+        if beacon is None:
+            number = self.matrix.find(self.lexicon.words[wid])
+            if number is None:
+                beacon = self.add(wid, Beacon())
+            else:
+                beacon = self._decode(number)[1]
+        return beacon
+    
+    def get(self, word: str, default=None):
+        beacon = super().get(word)
+        if beacon is None:
+            number = self.matrix.find(word)
+            if number is None:
+                return default
+            beacon = self._decode(number)[1]
+        return beacon
+    
+    def __contains__(self, word) -> bool:
+        return super().get(word) is not None or self.matrix.find(word) is not None
+    
+    def ids(self):
+        for number in range(self.matrix.count):
+            yield self._decode(number)[0]
+        yield from self._order
+    
+    def tag_ids(self, wid: int, tag: str) -> List[int]:
+        # Read straight from the file, without decoding the whole beacon
+        beacon = self.by_id(wid)
+        if beacon is None:
+            number = self.matrix.find(self.lexicon.words[wid])
+            if number is None:
+                return []
+            return [self.lexicon.intern(v) for v in self.matrix.tag(number, tag)]
+        return beacon.tag_ids(tag)
+    
+    def tagged(self, tag: str):
+        intern = self.lexicon.intern
+        for number in range(self.matrix.count):
+            wid = intern(self.matrix.word(number))
+            beacon = self.by_id(wid)
+            if beacon is None:
+                values = [intern(v) for v in self.matrix.tag(number, tag)]
+            else:
+                values = beacon.tag_ids(tag)
+            if values:
+                yield wid, values
+        for wid in self._order:
+            values = self._beacons[wid].tag_ids(tag)
+            if values:
+                yield wid, values
+    
+    def __iter__(self):
+        for number in range(self.matrix.count):
+            yield self.matrix.word(number)
+        words = self.lexicon.words
+        for wid in self._order:
+            yield words[wid]
+    
+    def __len__(self) -> int:
+        return self.matrix.count + len(self._order)
+    
+    def materialize(self) -> BeaconTable:
+        """Decodes every beacon into a plain BeaconTable and unmaps the file."""
+        table = BeaconTable(self.lexicon)
+        for wid in self.ids():
+            table.add(wid, self._beacons[wid])
+        self.matrix.close()
+        return table
+
+
+# ============================================================================
+# CONTEXT INDEX
+# ============================================================================
+
+def doc_key(text: str, owner: Optional[str] = None) -> str:
+    """Identity of an index document: its text, and owner if any."""
+    return f"{text}\x00{owner}" if owner else text
+
+
+def doc_term_counts(text: str, owner: Optional[str] = None) -> Dict[str, int]:
+    """Term frequencies of an index document: its words, plus its owner."""
+    counts: Dict[str, int] = {}
+    for term in tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    if owner and owner not in counts:
+        counts[owner] = 1
+    return counts
+
+
+class ContextIndex:
+    """
+    Inverted index over contexts, ranked with BM25.
+    
+    A document is a context string, with an owner for crash reasons
+    ("crashes: ..." is about the module that crashes). Documents saved in
+    a matrix are searched in the mapped file; newer ones live in memory,
+    with postings (doc << 8 | tf) keyed by lexicon ID. With max_contexts,
+    the owner trims the in-memory documents to the contexts its beacons
+    still hold whenever they double (see retain), so the index is capped
+    along with the beacons.
+    """
+    
+    def __init__(self, lexicon: Lexicon, matrix: Optional[MatrixFile] = None):
+        self.lexicon = lexicon
+        self.matrix = matrix
+        self.base = matrix.doc_count if matrix else 0
+        self.total_length = matrix.index_length if matrix else 0
+        self._keys: Dict[object, int] = {}      # text, or (text, owner)
+        self._texts: List[str] = []
+        self._owners: Dict[int, str] = {}
+        self._lengths = array('I')
+        self._postings: Dict[int, array] = {}
+        self._retained = 0      # In-memory documents kept by the last retain()
+        
+        # Callable yielding (text, owner) documents still to add
+        self.pending = None
+    
+    def _load_pending(self):
+        pending, self.pending = self.pending, None
+        for text, owner in pending():
+            self.add(text, owner)
+    
+    def add(self, text: str, owner: Optional[str] = None):
+        """Indexes a document, once."""
+        if self.pending is not None:
+            self._load_pending()
+        key = (text, owner) if owner else text
+        if key in self._keys or (self.base and self.matrix.find_doc(text, owner) is not None):
+            return
+        doc = self.base + len(self._texts)
+        self._keys[key] = doc
+        self._texts.append(text)
+        if owner:
+            self._owners[doc] = owner
+        
+        counts = doc_term_counts(text, owner)
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self.total_length += length
+        intern = self.lexicon.intern
+        postings = self._postings
+        for term, tf in counts.items():
+            tid = intern(term)
+            entries = postings.get(tid)
+            if entries is None:
+                entries = postings[tid] = array('Q')
+            entries.append(doc << 8 | min(tf, 255))
+    
+    def crowded(self) -> bool:
+        """Whether the in-memory documents doubled since the last retain()."""
+        return len(self._texts) >= 2 * max(self._retained, INDEX_TRIM_MIN)
+    
+    def retain(self, held: set):
+        """
+        Keeps only the in-memory documents whose text is in held, in
+        order. Saved ones stay in the file until the next full save.
+        """
+        if self.pending is not None:
+            self._load_pending()
+        owners = self._owners
+        docs = [(text, owners.get(self.base + i)) for i, text in enumerate(self._texts)]
+        self.total_length -= sum(self._lengths)
+        self._keys = {}
+        self._texts = []
+        self._owners = {}
+        self._lengths = array('I')
+        self._postings = {}
+        for text, owner in docs:
+            if text in held:
+                self.add(text, owner)
+        self._retained = len(self._texts)
+    
+    def __len__(self) -> int:
+        if self.pending is not None:
+            self._load_pending()
+        return self.base + len(self._texts)
+    
+    def docs(self):
+        """Yields every (text, owner) document, in index order."""
+        if self.pending is not None:
+            self._load_pending()
+        for number in range(self.base):
+            yield self.matrix.doc(number)
+        for i, text in enumerate(self._texts):
+            yield text, self._owners.get(self.base + i)
+    
+    def _text(self, doc: int) -> str:
+        if doc < self.base:
+            return self.matrix.doc(doc)[0]
+        return self._texts[doc - self.base]
+    
+    def _term_postings(self, term: str) -> List[int]:
+        postings = self.matrix.postings(term) if self.base else []
+        tid = self.lexicon.get(term)
+        if tid is not None and tid in self._postings:
+            postings = postings + self._postings[tid].tolist()
+        return postings
+    
+    def search(self, terms: List[str], limit: int = SEARCH_RESULTS,
+               require: List[Tuple[str, ...]] = ()) -> List[str]:
+        """
+        The texts of the best documents for terms (BM25, earlier ones
+        first on ties). With require, a document must contain at least
+        one term of each group.
+        """
+        n = len(self)
+        if not n:
+            return []
+        
+        allowed = None
+        for group in require:
+            docs = {entry >> 8 for term in group for entry in self._term_postings(term)}
+            allowed = docs if allowed is None else allowed & docs
+            if not allowed:
+                return []
+        
+        average = self.total_length / n
+        base = self.base
+        mapped_lengths = self.matrix.doc_lengths() if base else []
+        lengths = self._lengths
+        scores: Dict[int, float] = {}
+        for term in dict.fromkeys(terms):
+            postings = self._term_postings(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for entry in postings:
+                doc = entry >> 8
+                if allowed is not None and doc not in allowed:
+                    continue
+                tf = entry & 255
+                length = mapped_lengths[doc] if doc < base else lengths[doc - base]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        
+        # A crash reason owned by two modules has the same text twice
+        results = []
+        for doc in heapq.nsmallest(2 * limit, scores, key=lambda d: (-scores[d], d)):
+            text = self._text(doc)
+            if text not in results:
+                results.append(text)
+                if len(results) == limit:
+                    break
+        return results
+    
+    def materialize(self) -> 'ContextIndex':
+        """Copies every document into a memory-only index."""
+        index = ContextIndex(self.lexicon)
+        for text, owner in self.docs():
+            index.add(text, owner)
+        return index
+
+
+# ============================================================================
+# DEPENDENCY GRAPH
+# ============================================================================
+
+class DependencyGraph:
+    """
+    Transitive DEPENDS-ON closures and CONFLICTS-WITH checks over word IDs.
+    
+    Edges are read from the owner's beacon tags. Closures are computed
+    once per strongly connected component (Tarjan) and cached; a node is
+    only cached together with everything it reaches, so a new edge u -> v
+    only needs to drop u and its cached ancestors (invalidate). Conflicts
+    of large install sets go through an index kept up to date by add_conflict.
+    
+    The version ranges a conflict holds for (VERSION-CONFLICTS values,
+    "OTHER RANGE OTHER_RANGE") are parsed once per module, by partner.
+    """
+    
+    def __init__(self, owner: 'MarcoMini'):
+        self.owner = owner
+        self._closures: Dict[int, Tuple[int, ...]] = {}
+        self._cycles: Dict[int, Tuple[int, ...]] = {}
+        self._parents: Dict[int, set] = defaultdict(set)
+        self._conflicts: Optional[Dict[int, List[int]]] = None
+        self._scopes: Dict[int, Dict[int, List[Tuple['VersionRange', 'VersionRange']]]] = {}
+    
+    def clear(self):
+        """Drops every cached closure (the beacons were replaced)."""
+        self._closures.clear()
+        self._cycles.clear()
+        self._parents.clear()
+        self._conflicts = None
+        self._scopes.clear()
+    
+    def add_conflict(self, wid: int, other: int):
+        """Records a new CONFLICTS-WITH edge in the conflict index."""
+        self._scopes.pop(wid, None)
+        if self._conflicts is not None:
+            others = self._conflicts.setdefault(wid, [])
+            if other not in others:
+                others.append(other)
+    
+    def conflict_scopes(self, wid: int, other: int, mine: 'VersionRange',
+                        theirs: 'VersionRange') -> Optional[List[Tuple['VersionRange', 'VersionRange']]]:
+        """
+        Whether the conflict of wid with other holds for versions mine of
+        wid and theirs of other: None if not, else the (wid range, other
+        range) scopes it holds in; [] for a conflict stored without any
+        (matrices saved before conflicts had versions).
+        """
+        scopes = self._scopes.get(wid)
+        if scopes is None:
+            scopes = self._scopes[wid] = {}
+            lexicon = self.owner.lexicon
+            for vid in self._tag_ids(wid, 'VERSION-CONFLICTS'):
+                name, low, high = lexicon.words[vid].split(' ')
+                scopes.setdefault(lexicon.intern(name), []).append(
+                    (VersionRange.parse(low), VersionRange.parse(high)))
+        ranges = scopes.get(other)
+        if not ranges:
+            return []
+        found = [(a, b) for a, b in ranges if a.overlaps(mine) and b.overlaps(theirs)]
+        return found or None
+    
+    def invalidate(self, wid: int):
+        """Forgets what a new edge out of wid may have changed."""
+        closures = self._closures
+        if wid not in closures:
+            return
+        stack = [wid]
+        while stack:
+            node = stack.pop()
+            if closures.pop(node, None) is None:
+                continue
+            self._cycles.pop(node, None)
+            stack.extend(self._parents.get(node, ()))
+    
+    def _tag_ids(self, wid: int, tag: str) -> List[int]:
+        return self.owner.beacons.tag_ids(wid, tag)
+    
+    def closure(self, wid: int) -> Tuple[int, ...]:
+        """Everything wid depends on, directly or not: direct ones first."""
+        closure = self._closures.get(wid)
+        if closure is None:
+            self._compute(wid)
+            closure = self._closures[wid]
+        return closure
+    
+    def cycle(self, wid: int) -> Optional[Tuple[int, ...]]:
+        """The dependency cycle wid belongs to, or None."""
+        self.closure(wid)
+        return self._cycles.get(wid)
+    
+    def _compute(self, root: int):
+        """Caches the closures of root and of everything it reaches."""
+        closures, parents = self._closures, self._parents
+        edges = {root: self._tag_ids(root, 'DEPENDS-ON')}
+        index = {root: 0}
+        low = {root: 0}
+        stack = [root]
+        on_stack = {root}
+        work = [(root, iter(edges[root]))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                parents[child].add(node)
+                if child in closures:
+                    continue
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    edges[child] = self._tag_ids(child, 'DEPENDS-ON')
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges[child])))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] != index[node]:
+                    continue
+                
+                # node is the root of a component: pop and close it
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    members.append(member)
+                    if member == node:
+                        break
+                members.reverse()
+                inside = set(members)
+                reach = {}
+                for member in members:
+                    reach.update(dict.fromkeys(edges[member]))
+                for dep in list(reach):
+                    if dep not in inside:
+                        reach.update(dict.fromkeys(closures[dep]))
+                closure = tuple(reach)
+                # One tuple shared by the whole component, however big
+                cycle = tuple(members) if len(members) > 1 or node in reach else None
+                for member in members:
+                    closures[member] = closure
+                    if cycle:
+                        self._cycles[member] = cycle
+    
+    def install_set(self, wids: List[int]) -> List[int]:
+        """wids followed by everything they pull in, without duplicates."""
+        pulled = dict.fromkeys(wids)
+        for wid in wids:
+            pulled.update(dict.fromkeys(self.closure(wid)))
+        return list(pulled)
+    
+    def conflicts(self, wids: List[int]) -> List[Tuple[int, int]]:
+        """Conflicting (a, b) pairs anywhere in the install set of wids."""
+        present = set(wids)
+        for closure in {id(c): c for c in map(self.closure, wids)}.values():
+            present.update(closure)
+        
+        # Small install sets are checked directly; large ones build the
+        # index once (a full pass over the beacons)
+        index = self._conflicts
+        if index is None and len(present) * 8 >= len(self.owner.beacons):
+            index = self._conflicts = {wid: list(others) for wid, others
+                                       in self.owner.beacons.tagged('CONFLICTS-WITH')}
+        # Word order, so the result does not depend on how IDs were given
+        by_word = self.owner.lexicon.words.__getitem__
+        if index is None:
+            conflicting = [(wid, self._tag_ids(wid, 'CONFLICTS-WITH'))
+                           for wid in sorted(present, key=by_word)]
+        else:
+            conflicting = [(wid, index[wid])
+                           for wid in sorted(present.intersection(index), key=by_word)]
+        
+        pairs = []
+        seen = set()
+        for wid, others in conflicting:
+            for other in others:
+                if other in present and (other, wid) not in seen:
+                    seen.add((wid, other))
+                    pairs.append((wid, other))
+        return pairs
+
+
+# ============================================================================
+# NAME RESOLUTION
+# ============================================================================
+
+def fuzzy_distance(length: int) -> int:
+    """Edits tolerated in a name of length letters."""
+    if length < FUZZY_MIN_LENGTH:
+        return 0
+    return FUZZY_DISTANCE if length >= FUZZY_LONG_NAME else 1
+
+
+def deletions(word: str, distance: int) -> set:
+    """word and every string made by deleting up to distance of its letters."""
+    variants = frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i+1:] for w in frontier for i in range(len(w))}
+        variants = variants | frontier
+    return variants
+
+
+def joined_name(word: str) -> str:
+    """word without its separators ("scikit-learn" -> "scikitlearn")."""
+    return re.sub(r'[-_.]+', '', word)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Insertions, deletions, substitutions and swaps of neighbours from a to b."""
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            d = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, before[j - 2] + 1)
+            current.append(d)
+        before, previous = previous, current
+    return previous[-1]
+
+
+class NameIndex:
+    """
+    Typo-tolerant lookup of beacon words (symmetric delete).
+    
+    Each word is filed under every string left by deleting up to
+    fuzzy_distance() of its letters, so the deletions of a misspelled name
+    reach every word within that many edits in a few dict lookups, and
+    only those candidates are measured. Multi-part names are filed under
+    their joined form too ("scikit-learn" as "scikitlearn"), which counts
+    as the same name. The owner's beacons are indexed on first use; after
+    that each lookup only adds the beacons created since.
+    """
+    
+    def __init__(self, owner: 'MarcoMini'):
+        self.owner = owner
+        self.clear()
+    
+    def clear(self):
+        """Forgets every word (the beacons were replaced)."""
+        self._variants: Dict[str, List[str]] = {}
+        self._words = set()
+        self._added: Optional[int] = None    # Created beacons indexed so far
+    
+    def add(self, word: str):
+        """Indexes a word, once."""
+        distance = fuzzy_distance(len(word))
+        if not distance or word in self._words:
+            return
+        self._words.add(word)
+        variants = self._variants
+        joined = joined_name(word)
+        spellings = deletions(word, distance)
+        if joined != word:
+            spellings |= deletions(joined, fuzzy_distance(len(joined)))
+        for variant in spellings:
+            words = variants.get(variant)
+            if words is None:
+                variants[variant] = [word]
+            else:
+                words.append(word)
+    
+    def _update(self):
+        beacons = self.owner.beacons
+        start = self._added
+        if start is None:
+            # Everything once; the created ones come again below and are skipped
+            for word in beacons:
+                self.add(word)
+            start = 0
+        for word in beacons.added(start):
+            self.add(word)
+            start += 1
+        self._added = start
+    
+    def lookup(self, name: str) -> List[Tuple[int, str]]:
+        """(edits, word) of the indexed words close enough to name, closest first."""
+        distance = fuzzy_distance(len(name))
+        if not distance:
+            return []
+        self._update()
+        variants = self._variants
+        found = {word for variant in deletions(name, distance)
+                 for word in variants.get(variant, ())}
+        matches = []
+        for word in found:
+            joined = joined_name(word)
+            edits = edit_distance(name, word)
+            if joined != word:
+                edits = min(edits, edit_distance(name, joined))
+            if edits <= min(distance, fuzzy_distance(len(word))):
+                matches.append((edits, word))
+        return sorted(matches)
+
+
+# ============================================================================
+# COMPLETION
+# ============================================================================
+
+def _rerank(ranked: list, entry: tuple, item: int, k: int):
+    """Puts (score, item) entry into a best-first list of at most k, replacing item's."""
+    for i, old in enumerate(ranked):
+        if old[1] == item:
+            del ranked[i]
+            break
+    else:
+        if len(ranked) >= k and entry <= ranked[-1]:
+            return
+    ranked.append(entry)
+    ranked.sort(reverse=True)
+    del ranked[k:]
+
+
+class Completer:
+    """
+    Top-k completions of a prefix, for the prompt and the daemon.
+    
+    Each word keeps its COMPLETE_TOP_K most frequent next words (from the
+    sequence counts), and each prefix of up to COMPLETE_PREFIX letters the
+    most active beacon names under it, modules first: a prefix trie stored
+    flat, one entry per node. Longer prefixes rank the few names sharing
+    their first COMPLETE_PREFIX letters. Counts and activations only grow,
+    so after learning only the words and pairs seen are re-ranked. Built
+    on first use.
+    """
+    
+    def __init__(self, owner: 'MarcoMini'):
+        self.owner = owner
+        self.clear()
+    
+    def clear(self):
+        """Forgets everything (the beacons were replaced)."""
+        self._next: Optional[Dict[int, list]] = None    # Word ID -> [(count, next ID)]
+        self._best: Dict[str, list] = {}                # Short prefix -> [(score, word ID)]
+        self._buckets: Dict[str, List[int]] = {}        # COMPLETE_PREFIX letters -> word IDs
+        self._words = set()     # Word IDs learned since the last update
+        self._pairs = set()     # (word ID, next word ID) counted since then
+    
+    def learned(self, ids: List[int]):
+        """Notes the word IDs of a sentence just learned."""
+        if self._next is not None:
+            self._words.update(ids)
+            self._pairs.update(zip(ids, ids[1:]))
+    
+    def merged(self, other: 'MarcoMini', remap: List[int]):
+        """Notes the words and pairs of a MarcoMini just merged (IDs mapped by remap)."""
+        if self._next is not None:
+            self._words.update(remap[oid] for oid in other.beacons.ids())
+            self._pairs.update((remap[wid], remap[other_id])
+                               for wid, row in other.sequences.items() for other_id in row)
+    
+    def _score(self, wid: int) -> tuple:
+        beacon = self.owner.beacons.by_id(wid)
+        return (beacon.tag_count() > 0, beacon.activations)
+    
+    def _build(self):
+        owner = self.owner
+        k = COMPLETE_TOP_K
+        self._next = {wid: heapq.nlargest(k, ((n, other) for other, n in row.items()))
+                      for wid, row in owner.sequences.items()}
+        words = owner.lexicon.words
+        candidates = defaultdict(list)
+        for wid in owner.beacons.ids():
+            word = words[wid]
+            entry = (self._score(wid), wid)
+            self._buckets.setdefault(word[:COMPLETE_PREFIX], []).append(wid)
+            for end in range(min(len(word), COMPLETE_PREFIX) + 1):
+                candidates[word[:end]].append(entry)
+        self._best = {prefix: heapq.nlargest(k, entries)
+                      for prefix, entries in candidates.items()}
+    
+    def _update(self):
+        if self._next is None:
+            self._build()
+            self._words.clear()
+            self._pairs.clear()
+            return
+        k = COMPLETE_TOP_K
+        if self._pairs:
+            sequences = self.owner.sequences
+            for wid, other in self._pairs:
+                _rerank(self._next.setdefault(wid, []), (sequences[wid][other], other), other, k)
+            self._pairs.clear()
+        if self._words:
+            words = self.owner.lexicon.words
+            best, buckets = self._best, self._buckets
+            for wid in self._words:
+                word = words[wid]
+                bucket = buckets.setdefault(word[:COMPLETE_PREFIX], [])
+                if wid not in bucket:
+                    bucket.append(wid)
+                entry = (self._score(wid), wid)
+                for end in range(min(len(word), COMPLETE_PREFIX) + 1):
+                    _rerank(best.setdefault(word[:end], []), entry, wid, k)
+            self._words.clear()
+    
+    def names(self, prefix: str, k: int = COMPLETE_TOP_K) -> List[str]:
+        """The k best beacon names starting with prefix."""
+        self._update()
+        words = self.owner.lexicon.words
+        if len(prefix) <= COMPLETE_PREFIX:
+            return [words[wid] for _, wid in self._best.get(prefix, ())[:k]]
+        matches = [wid for wid in self._buckets.get(prefix[:COMPLETE_PREFIX], ())
+                   if words[wid].startswith(prefix)]
+        return [words[wid] for _, wid in
+                heapq.nlargest(k, ((self._score(wid), wid) for wid in matches))]
+    
+    def next_words(self, word: str, k: int = COMPLETE_TOP_K) -> List[str]:
+        """The k words most often seen right after word."""
+        self._update()
+        wid = self.owner.lexicon.get(word)
+        if wid is None:
+            return []
+        words = self.owner.lexicon.words
+        return [words[other] for _, other in self._next.get(wid, ())[:k]]
+    
+    def complete(self, text: str, k: int = COMPLETE_TOP_K) -> List[str]:
+        """
+        Up to k words for the end of text: when it ends inside a word,
+        the words that finish it (those that usually follow the word
+        before first); otherwise the words that usually come next.
+        """
+        text = text.lower()
+        tokens = tokenize(text)
+        partial = ''
+        if tokens and text.endswith(tokens[-1]):
+            partial = tokens.pop()
+        found = []
+        if tokens:
+            found = [w for w in self.next_words(tokens[-1]) if w.startswith(partial)]
+        if partial or not found:
+            found.extend(self.names(partial, k))
+        return list(dict.fromkeys(found))[:k]
+
+
+# ============================================================================
+# RELATED MODULES
+# ============================================================================
+
+def _numpy():
+    """NumPy if it is installed (optional: vectorizes the math), else None."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def ppmi_vectors(beacons: BeaconTable, wids, features: int = RELATED_FEATURES,
+                 np=None) -> Dict[int, Tuple[List[int], List[float]]]:
+    """
+    Unit PPMI vectors of the links of word IDs wids: (feature IDs,
+    weights), strongest first, cut to features. A link w -> c weighs
+    max(0, log(n(w, c) * N / (n(w) * n(c)))), where n(w) sums w's link
+    counts and N those of every beacon. With np (NumPy), vectorized.
+    """
+    if np is not None:
+        return _ppmi_vectors_numpy(np, beacons, wids, features)
+    sums = {}
+    for wid in beacons.ids():
+        links = beacons.by_id(wid).links
+        if links:
+            sums[wid] = sum(entry & LINK_COUNT_MASK for entry in links)
+    total = sum(sums.values())
+    vectors = {}
+    for wid in wids:
+        n_w = sums.get(wid)
+        if not n_w:
+            continue
+        weighted = []
+        for other, n in beacons.by_id(wid).link_items():
+            n_other = sums.get(other)
+            if n_other:
+                pmi = math.log(n * total / (n_w * n_other))
+                if pmi > 0:
+                    weighted.append((pmi, other))
+        if weighted:
+            top = heapq.nlargest(features, weighted)
+            norm = math.sqrt(sum(pmi * pmi for pmi, _ in top))
+            vectors[wid] = ([other for _, other in top], [pmi / norm for pmi, _ in top])
+    return vectors
+
+
+def _ppmi_vectors_numpy(np, beacons: BeaconTable, wids,
+                        features: int) -> Dict[int, Tuple[List[int], List[float]]]:
+    owners, lengths, flat = [], [], array('Q')
+    for wid in beacons.ids():
+        links = beacons.by_id(wid).links
+        if links:
+            owners.append(wid)
+            lengths.append(len(links))
+            flat.extend(links)
+    if not owners:
+        return {}
+    entries = np.frombuffer(flat, dtype=np.uint64)
+    rows = np.repeat(np.array(owners, dtype=np.int64), lengths)
+    cols = (entries >> LINK_SHIFT).astype(np.int64)
+    counts = (entries & LINK_COUNT_MASK).astype(np.float64)
+    size = int(max(rows.max(), cols.max())) + 1
+    sums = np.bincount(rows, weights=counts, minlength=size)
+    
+    # Links of wids towards words with links of their own, then PPMI
+    wanted = np.zeros(size, dtype=bool)
+    wanted[[wid for wid in wids if wid < size]] = True
+    keep = wanted[rows] & (sums[cols] > 0)
+    rows, cols, counts = rows[keep], cols[keep], counts[keep]
+    pmi = np.log(counts * sums.sum() / (sums[rows] * sums[cols]))
+    keep = pmi > 0
+    rows, cols, pmi = rows[keep], cols[keep], pmi[keep]
+    if not len(rows):
+        return {}
+    
+    # Strongest features first within each row (ties: higher ID first, as
+    # heapq.nlargest does), cut to features, normalized
+    order = np.lexsort((-cols, -pmi, rows))
+    rows, cols, pmi = rows[order], cols[order], pmi[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keep = rank < features
+    rows, cols, pmi = rows[keep], cols[keep], pmi[keep]
+    norms = np.sqrt(np.bincount(rows, weights=pmi * pmi, minlength=size))
+    weights = (pmi / norms[rows]).tolist()
+    
+    bounds = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1], True]).tolist()
+    rows, cols = rows.tolist(), cols.tolist()
+    return {rows[a]: (cols[a:b], weights[a:b]) for a, b in zip(bounds, bounds[1:])}
+
+
+class RelatedIndex:
+    """
+    Modules related to a module: the cosine of their PPMI link vectors.
+    
+    Vectors only keep their strongest features (see ppmi_vectors), and an
+    inverted index lists each feature's strongest modules, so a query only
+    scores the modules sharing a feature with it: approximate, but it
+    never compares against every beacon. Built on first use, dropped when
+    links change. A binary matrix saved with a RELS section already holds
+    the nearest modules of each, read as long as nothing was learned since.
+    """
+    
+    def __init__(self, owner: 'MarcoMini'):
+        self.owner = owner
+        self.clear()
+    
+    def clear(self, matrix: Optional['MatrixFile'] = None):
+        """Forgets the vectors (links changed); matrix: a file whose RELS are current."""
+        self._matrix = matrix if matrix is not None and 'RELS' in matrix.sections else None
+        self._vectors: Optional[Dict[int, Tuple[List[int], List[float]]]] = None
+        self._postings: Dict[int, tuple] = {}
+        self._np = None
+    
+    def _build(self):
+        owner = self.owner
+        beacons = owner.beacons
+        modules = [wid for wid in beacons.ids() if beacons.by_id(wid).tag_count()]
+        np = self._np = _numpy()
+        self._vectors = ppmi_vectors(beacons, modules, np=np)
+        postings = defaultdict(list)
+        for wid, (features, weights) in self._vectors.items():
+            for feature, weight in zip(features, weights):
+                postings[feature].append((weight, wid))
+        for feature, entries in postings.items():
+            top = heapq.nlargest(RELATED_POSTINGS, entries)
+            wids = [wid for _, wid in top]
+            weights = [weight for weight, _ in top]
+            if np is not None:
+                wids, weights = np.array(wids, dtype=np.int64), np.array(weights)
+            self._postings[feature] = (wids, weights)
+    
+    def _nearest(self, wid: int, k: int) -> List[Tuple[float, int]]:
+        """(cosine, word ID) of the k modules nearest to word ID wid, nearest first."""
+        vector = self._vectors.get(wid)
+        if vector is None:
+            return []
+        postings = self._postings
+        np = self._np
+        if np is not None:
+            found = [(postings[f], w) for f, w in zip(*vector) if f in postings]
+            if not found:
+                return []
+            others = np.concatenate([wids for (wids, _), _ in found])
+            products = np.concatenate([weights * w for (_, weights), w in found])
+            candidates, inverse = np.unique(others, return_inverse=True)
+            scores = np.bincount(inverse, weights=products)
+            scores[candidates == wid] = 0
+            if len(scores) > k:
+                best = np.argpartition(-scores, k)[:k]
+                candidates, scores = candidates[best], scores[best]
+            ranked = zip(scores.tolist(), candidates.tolist())
+        else:
+            totals = defaultdict(float)
+            for feature, weight in zip(*vector):
+                entry = postings.get(feature)
+                if entry is not None:
+                    for other, w in zip(*entry):
+                        totals[other] += weight * w
+            totals.pop(wid, None)
+            ranked = ((score, other) for other, score in totals.items())
+        return [(score, other) for score, other in heapq.nlargest(k, ranked) if score > 0]
+    
+    def related(self, wid: int, k: int = RELATED_TOP_K) -> List[Tuple[float, int]]:
+        """(cosine, word ID) of the k modules most related to word ID wid, best first."""
+        matrix = self._matrix
+        if matrix is not None:
+            number = matrix.find(self.owner.lexicon.words[wid])
+            intern = self.owner.lexicon.intern
+            return [(score, intern(matrix.word(other)))
+                    for other, score in matrix.related(number)[:k]] if number is not None else []
+        if self._vectors is None:
+            self._build()
+        return self._nearest(wid, k)
+    
+    def table(self, k: int = RELATED_TOP_K) -> Dict[str, List[Tuple[str, float]]]:
+        """The k nearest modules of every module, by word (for saving)."""
+        words = self.owner.lexicon.words
+        if self._matrix is None and self._vectors is None:
+            self._build()
+        wids = self._vectors if self._matrix is None else self.owner.beacons.ids()
+        table = {}
+        for wid in wids:
+            nearest = self.related(wid, k)
+            if nearest:
+                table[words[wid]] = [(words[other], score) for score, other in nearest]
+        return table
+
+
+# ============================================================================
+# REQUIREMENTS FILES
+# ============================================================================
+
+# "name[extras] specifiers ; markers" (specifiers may be empty)
+REQUIREMENT_RE = LazyRegex(r'([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*([^;]*)')
+# One specifier clause: "op version"
+SPECIFIER_RE = LazyRegex(r'(===|~=|==|!=|<=|>=|<|>)\s*([\w.*+!-]+)')
+# Leading release segment of a version ("1.24.3rc1" -> "1.24.3")
+RELEASE_RE = LazyRegex(r'\d+(?:\.\d+)*')
+# A URL, VCS or local path requirement ("git+https://...", "./pkg")
+URL_REQUIREMENT_RE = LazyRegex(r'(?:-e\s+|--editable[\s=]+)?((?:[a-z][\w+.-]*:|\.{0,2}/)[^\s;]*)', re.I)
+# "name-version" at the start of a wheel or sdist file name
+ARCHIVE_NAME_RE = LazyRegex(r'([A-Za-z0-9][A-Za-z0-9._]*?)-(\d[\w.!+]*?)(?:-|\.tar\.gz$|\.tar\.bz2$|\.zip$|\.whl$)')
+
+
+def module_name(name: str) -> str:
+    """
+    A package name the way the matrix spells it: PEP 503 normalized,
+    without trailing punctuation ("Scikit_Learn." -> "scikit-learn").
+    """
+    return distribution_name(name).strip('-')
+
+
+def _url_requirement(url: str) -> Optional[Tuple[str, List[Tuple[str, str]]]]:
+    """
+    The package a URL, VCS or path requirement installs: the #egg= name,
+    or the name (and pinned version) of a wheel or sdist file; None if
+    the URL does not say.
+    """
+    url, _, fragment = url.partition('#')
+    egg = re.search(r'(?:^|&)egg=([A-Za-z0-9][A-Za-z0-9._-]*)', fragment)
+    if egg:
+        return egg.group(1), []
+    from urllib.parse import unquote
+    filename = unquote(url.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1])
+    match = ARCHIVE_NAME_RE.match(filename)
+    if match:
+        return match.group(1), [('==', match.group(2))]
+    return None
+
+
+def parse_requirement(line: str) -> Optional[Tuple[str, List[Tuple[str, str]]]]:
+    """
+    Parses one requirement line into (name, [(op, version)]), or None.
+    URL and VCS lines name their package with #egg= or a wheel/sdist file
+    name; those that do not are skipped.
+    """
+    line = line.split(' #', 1)[0].split(' --', 1)[0].strip()
+    url = URL_REQUIREMENT_RE.match(line)
+    if url:
+        return _url_requirement(url.group(1))
+    if not line or line.startswith(('#', '-')):
+        return None
+    match = REQUIREMENT_RE.match(line)
+    if not match:
+        return None
+    spec = match.group(2)
+    if spec.lstrip().startswith('@'):
+        spec = ''
+    return match.group(1), SPECIFIER_RE.findall(spec)
+
+
+# One Poetry constraint clause: "^1.2", "~1.2", ">= 1.2", "1.2.3", "1.*"
+POETRY_CLAUSE_RE = LazyRegex(r'(\^|~=?|===|==|!=|<=|>=|<|>)?\s*([\w.*+!-]+)')
+
+
+def _poetry_bounds(op: str, version: str) -> List[Tuple[str, str]]:
+    """One Poetry clause as specifiers: "^1.2" is >=1.2,<2.0, "~1.2" >=1.2,<1.3."""
+    if op not in ('^', '~'):
+        if version == '*':
+            return []
+        return [(op or '==', version)]
+    match = RELEASE_RE.match(version)
+    if not match:
+        return [('>=', version)]
+    parts = [int(p) for p in match.group(0).split('.')]
+    if op == '^':
+        # The leftmost non-zero part goes up (the last one if all are zero)
+        bump = next((i for i, p in enumerate(parts) if p), len(parts) - 1)
+    else:
+        # The minor version goes up, the major one if it is all there is
+        bump = min(1, len(parts) - 1)
+    upper = parts[:bump] + [parts[bump] + 1] + [0] * (len(parts) - bump - 1)
+    return [('>=', version), ('<', '.'.join(map(str, upper)))]
+
+
+def _poetry_specifiers(spec) -> List[Tuple[str, str]]:
+    """
+    Poetry constraints as specifiers, with Poetry's bounds (see
+    _poetry_bounds); "1.2.3" is ==1.2.3 and clauses separated by commas
+    or spaces all apply. A {version = ...} table reads its version.
+    Alternatives ("^1.2 || ^2.0", or a list of tables for different
+    Pythons or platforms) are read as the range spanning them all, here
+    >=1.2,<3: specifiers cannot say "or".
+    """
+    if isinstance(spec, list):
+        alternatives = [_poetry_specifiers(item) for item in spec]
+    elif isinstance(spec, dict):
+        return _poetry_specifiers(spec.get('version', ''))
+    elif isinstance(spec, str):
+        alternatives = [[clause for op, version in POETRY_CLAUSE_RE.findall(part)
+                         for clause in _poetry_bounds(op, version)]
+                        for part in spec.split('||')]
+    else:
+        return []
+    if len(alternatives) == 1:
+        return alternatives[0]
+    ranges = [VersionRange.from_specifiers(specifiers) for specifiers in alternatives]
+    return VersionRange(min(r.low for r in ranges), max(r.high for r in ranges)).specifiers()
+
+
+def parse_requirements(filepath: str, _seen=None) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """
+    Reads (name, specifiers) requirements from a requirements/constraints
+    file (following -r / -c includes, joining backslash continuations) or
+    from a pyproject.toml (PEP 621 and Poetry dependencies).
+    """
+    if os.path.basename(filepath).lower() == 'pyproject.toml':
+        return _parse_pyproject(filepath)
+    
+    seen = _seen if _seen is not None else set()
+    seen.add(os.path.abspath(filepath))
+    with open_text(filepath) as f:
+        text = re.sub(r'\\\r?\n', ' ', f.read())
+    
+    requirements = []
+    for line in text.splitlines():
+        include = re.match(r'\s*(?:-r|-c|--requirement|--constraint)[\s=]+(\S+)', line)
+        if include:
+            path = os.path.join(os.path.dirname(filepath), include.group(1))
+            if os.path.abspath(path) not in seen and os.path.exists(path):
+                requirements.extend(parse_requirements(path, seen))
+            continue
+        requirement = parse_requirement(line)
+        if requirement:
+            requirements.append(requirement)
+    return requirements
+
+
+def _parse_pyproject(filepath: str) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Requirements of a pyproject.toml (tomllib, or a regex scan before 3.11)."""
+    try:
+        import tomllib
+    except ImportError:
+        tomllib = None
+    
+    if tomllib is None:
+        # No TOML parser: take the quoted strings of every dependencies array
+        with open(filepath, 'r', encoding='utf-8') as f:
+            text = f.read()
+        lines = []
+        for array_text in re.findall(r'(?m)^\s*[\w-]*dependencies\s*=\s*\[(.*?)\]', text, re.S):
+            lines.extend(re.findall(r'["\']([^"\']+)["\']', array_text))
+        return [r for r in map(parse_requirement, lines) if r]
+    
+    with open(filepath, 'rb') as f:
+        data = tomllib.load(f)
+    project = data.get('project', {})
+    lines = list(project.get('dependencies', []))
+    for group in project.get('optional-dependencies', {}).values():
+        lines.extend(group)
+    requirements = [r for r in map(parse_requirement, lines) if r]
+    
+    poetry = data.get('tool', {}).get('poetry', {})
+    tables = [poetry.get('dependencies', {}), poetry.get('dev-dependencies', {})]
+    tables += [g.get('dependencies', {}) for g in poetry.get('group', {}).values()]
+    for table in tables:
+        for name, spec in table.items():
+            if name.lower() != 'python':
+                requirements.append((name, _poetry_specifiers(spec)))
+    return requirements
+
+
+def release_tuple(version: str) -> Tuple[int, ...]:
+    """(1, 24, 3) for "1.24.3rc1"; () if there is no release number."""
+    match = RELEASE_RE.match(version.strip().lstrip('vV'))
+    return tuple(int(part) for part in match.group().split('.')) if match else ()
+
+
+def version_satisfies(version: str, op: str, spec: str) -> bool:
+    """
+    Whether a STABLE-VERSION (a release series such as "1.24") meets one
+    specifier. Only release numbers are compared; == accepts any release
+    of the series ("1.24" matches "==1.24.3" and "==1.*").
+    """
+    have = release_tuple(version)
+    want = release_tuple(spec)
+    if not have or not want:
+        return True
+    if op in ('==', '===') or (op == '!=' and spec.endswith('.*')):
+        common = min(len(have), len(want)) if not spec.endswith('.*') else len(want)
+        same = have[:common] == want[:common]
+        return same if op != '!=' else not same
+    if op == '!=':
+        return have[:len(want)] != want
+    width = max(len(have), len(want))
+    have += (0,) * (width - len(have))
+    padded = want + (0,) * (width - len(want))
+    if op == '~=':
+        return have >= padded and have[:len(want) - 1] == want[:len(want) - 1]
+    return {'>=': have >= padded, '<=': have <= padded,
+            '>': have > padded, '<': have < padded}[op]
+
+
+def _release_key(release: Tuple[int, ...]) -> Tuple[int, ...]:
+    """release without trailing zeros, so that 2 == 2.0 == 2.0.0 compare equal."""
+    while release and not release[-1]:
+        release = release[:-1]
+    return release
+
+
+def _next_series(release: Tuple[int, ...]) -> Tuple[int, ...]:
+    """The first release after the series of release: (1, 24) -> (1, 25)."""
+    return _release_key(release[:-1] + (release[-1] + 1,))
+
+
+class VersionRange:
+    """
+    The versions between two release bounds, from PEP 440 specifiers:
+    ">=2,<3", "<1.5", "~=1.4.2", "==1.4" or a bare "1.4" (the 1.4 series,
+    as in version_satisfies), "2.x" or "2.*". != clauses are ignored.
+    
+    Bounds are (release, n) keys: a low key is (release, 0) when the
+    bound is included and (release, 1) when not, a high key the other
+    way round, so two ranges overlap exactly when the highest low key is
+    below the lowest high key.
+    """
+    
+    __slots__ = ('low', 'high')
+    
+    LOWEST = ((), 0)
+    HIGHEST = ((math.inf,), 1)
+    
+    def __init__(self, low=LOWEST, high=HIGHEST):
+        self.low = low
+        self.high = high
+    
+    @classmethod
+    def from_specifiers(cls, specifiers: List[Tuple[str, str]]) -> 'VersionRange':
+        """The range of (op, version) clauses, as parse_requirement gives them."""
+        low, high = cls.LOWEST, cls.HIGHEST
+        for op, version in specifiers:
+            release = release_tuple(version)
+            if not release or op == '!=':
+                continue
+            key = _release_key(release)
+            if op in ('==', '===', '~='):
+                # A series: "==1.4" is 1.4 up to 1.5, "~=1.4.2" 1.4.2 up to 1.5
+                low = max(low, (key, 0))
+                if op != '~=':
+                    high = min(high, (_next_series(release), 0))
+                elif len(release) > 1:
+                    high = min(high, (_next_series(release[:-1]), 0))
+            elif op in ('>=', '>'):
+                low = max(low, (key, 0 if op == '>=' else 1))
+            else:
+                high = min(high, (key, 1 if op == '<=' else 0))
+        return cls(low, high)
+    
+    @classmethod
+    def parse(cls, text: str) -> 'VersionRange':
+        """The range of a specifier string, "2.x" / "2.*" or bare series ("*" = any)."""
+        text = text.strip()
+        specifiers = SPECIFIER_RE.findall(text)
+        if not specifiers and text not in ('', '*'):
+            specifiers = [('==', text.rstrip('x*').rstrip('.'))]
+        return cls.from_specifiers(specifiers)
+    
+    def specifiers(self) -> List[Tuple[str, str]]:
+        """The bounds as (op, version) clauses, as parse_requirement gives them."""
+        text = lambda release: '.'.join(map(str, release)) or '0'
+        clauses = []
+        if self.low != self.LOWEST:
+            clauses.append(('>' if self.low[1] else '>=', text(self.low[0])))
+        if self.high != self.HIGHEST:
+            clauses.append(('<=' if self.high[1] else '<', text(self.high[0])))
+        return clauses
+    
+    def overlaps(self, other: 'VersionRange') -> bool:
+        return max(self.low, other.low) < min(self.high, other.high)
+    
+    def is_any(self) -> bool:
+        return self.low == self.LOWEST and self.high == self.HIGHEST
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, VersionRange) and (self.low, self.high) == (other.low, other.high)
+    
+    def __hash__(self) -> int:
+        return hash((self.low, self.high))
+    
+    def __str__(self) -> str:
+        """Specifier form: "*" for any version, "2.*" for a series, else ">=1.2,<1.5"."""
+        if self.is_any():
+            return '*'
+        (low, low_open), (high, high_closed) = self.low, self.high
+        text = lambda release: '.'.join(map(str, release)) or '0'
+        if not low_open and not high_closed and high != self.HIGHEST[0]:
+            padded = low + (0,) * (len(high) - len(low))
+            if len(padded) == len(high) and _next_series(padded) == high:
+                return text(padded) + '.*'
+        clauses = []
+        if self.low != self.LOWEST:
+            clauses.append(('>' if low_open else '>=') + text(low))
+        if self.high != self.HIGHEST:
+            clauses.append(('<=' if high_closed else '<') + text(high))
+        return ','.join(clauses)
+    
+    def __repr__(self) -> str:
+        return f"VersionRange({str(self)!r})"
+
+
+# "name SPECIFIERS" or "name 2.x" in a sentence or question
+_SCOPE_VERSION = r'\d+(?:\.\d+)*(?:[a-z]+\d*)?(?:\.\*)?'
+_SCOPE_CLAUSE = r'(?:===|~=|==|!=|<=|>=|<|>)\s*' + _SCOPE_VERSION
+VERSION_SCOPE_RE = LazyRegex(r'([\w.-]+)(?:\s*(%s(?:\s*,\s*%s)*)|\s+(\d+(?:\.\d+)*\.[x*])(?![\w.]))'
+                              % (_SCOPE_CLAUSE, _SCOPE_CLAUSE))
+# Questions also pin with a bare version: "install numpy 1.24"
+VERSION_PIN_RE = LazyRegex(r'([\w.-]+)(?:\s*(%s(?:\s*,\s*%s)*)|\s+(\d+(?:\.\d+)*(?:\.[x*])?)(?![\w.]))'
+                            % (_SCOPE_CLAUSE, _SCOPE_CLAUSE))
+
+
+def split_version_scopes(text: str, bare: bool = False) -> Tuple[str, Dict[str, VersionRange]]:
+    """
+    text without its version scopes, and the scopes by name:
+    "tensorflow 2.x and pytorch<1.5" -> ("tensorflow and pytorch",
+    {"tensorflow": 2.*, "pytorch": <1.5}). With bare, a version alone
+    after a name is a scope too ("pytorch 1.4" -> 1.4.*).
+    """
+    if bare:
+        if not any(c.isdigit() for c in text):
+            return text, {}
+    elif not any(c in text for c in '<>=~') and '.x' not in text and '.*' not in text:
+        return text, {}
+    scopes = {}
+    
+    def strip(match) -> str:
+        scopes[match.group(1)] = VersionRange.parse(match.group(2) or match.group(3))
+        return match.group(1)
+    
+    return (VERSION_PIN_RE if bare else VERSION_SCOPE_RE).sub(strip, text), scopes
+
+
+# ============================================================================
+# INSTALLED ENVIRONMENT
+# ============================================================================
+
+# An installed distribution, as scanned: (name, version, Requires-Dist lines)
+if TYPE_CHECKING:
+    Distribution = Tuple[str, str, List[str]]
+
+
+def distribution_name(name: str) -> str:
+    """PEP 503 normalized distribution name ("Typing_Extensions" -> "typing-extensions")."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def distribution_dirs(paths: Optional[List[str]] = None) -> List[str]:
+    """The .dist-info and .egg-info directories on paths (default: sys.path), in path order."""
+    found = []
+    for path in sys.path if paths is None else paths:
+        try:
+            entries = list(os.scandir(path or '.'))
+        except OSError:
+            continue
+        found.extend(sorted(entry.path for entry in entries
+                            if entry.name.endswith(('.dist-info', '.egg-info')) and entry.is_dir()))
+    return found
+
+
+def _read_distribution(path: str) -> Optional[Distribution]:
+    """(name, version, requirements) of one metadata directory, or None if unreadable."""
+    import importlib.metadata
+    try:
+        dist = importlib.metadata.Distribution.at(path)
+        name = dist.metadata.get('Name')
+        return (name, dist.version or '', list(dist.requires or ())) if name else None
+    except (OSError, ValueError):
+        return None
+
+
+def scan_environment(paths: Optional[List[str]] = None, cache_file: Optional[str] = None,
+                     jobs: int = ENV_SCAN_JOBS) -> List[Distribution]:
+    """
+    The distributions installed on paths (default: sys.path), read with
+    importlib.metadata by a pool of jobs threads; the first one of a name
+    wins, as for imports. With cache_file, what was read is kept there by
+    metadata directory and mtime, so a rescan only reads the directories
+    that changed since.
+    """
+    stamps = {}
+    for path in distribution_dirs(paths):
+        try:
+            stamps[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+    
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    stale = [path for path, stamp in stamps.items() if cache.get(path, (None,))[0] != stamp]
+    if stale:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max(1, min(jobs, len(stale)))) as pool:
+            for path, dist in zip(stale, pool.map(_read_distribution, stale)):
+                cache[path] = [stamps[path], dist]
+    
+    if cache_file and (stale or len(cache) != len(stamps)):
+        cache = {path: cache[path] for path in stamps}
+        tmp_path = cache_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_file)
+    
+    distributions = {}
+    for path in stamps:
+        dist = cache[path][1]
+        if dist and distribution_name(dist[0]) not in distributions:
+            distributions[distribution_name(dist[0])] = (dist[0], dist[1], list(dist[2]))
+    return list(distributions.values())
+
+
+def distribution_requirements(requires: List[str]) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """The (name, specifiers) of Requires-Dist lines, without those only needed by extras."""
+    requirements = []
+    for line in requires:
+        if 'extra' in line.partition(';')[2]:
+            continue
+        requirement = parse_requirement(line)
+        if requirement:
+            requirements.append(requirement)
+    return requirements
+
+
+# ============================================================================
+# ANSWERS
+# ============================================================================
+
+class Answer:
+    """
+    A structured answer: the intent, the module(s) asked about and what
+    the matrix knows about them. Nothing is formatted until text() or
+    to_dict() is called; str() renders colored text on a terminal.
+    """
+    
+    # List fields, in to_dict order
+    FIELDS = ('is_a', 'aliases', 'deps', 'indirect', 'cycle', 'required_by',
+              'problems', 'solutions', 'conflicts', 'conflict_pairs', 'scopes',
+              'missing', 'mismatches', 'matches', 'related', 'resolved')
+    
+    def __init__(self, intent: str, modules: List[str] = (),
+                 unknown: List[str] = (), version: Optional[str] = None, **fields):
+        self.intent = intent
+        self.modules = list(modules)
+        self.unknown = list(unknown)
+        self.version = version
+        for name in self.FIELDS:
+            setattr(self, name, list(fields.pop(name, ())))
+        if fields:
+            raise TypeError(f"unknown Answer fields: {', '.join(fields)}")
+    
+    @property
+    def ok(self) -> bool:
+        """For requirement checks: no conflict and no version mismatch."""
+        return not self.conflict_pairs and not self.mismatches
+    
+    @property
+    def compatible(self) -> Optional[bool]:
+        """For compatibility answers: no conflict found (None otherwise)."""
+        if self.intent != 'compatibility' or self.unknown:
+            return None
+        return not self.conflicts and not self.conflict_pairs
+    
+    def to_dict(self) -> dict:
+        """JSON-ready form: intent, modules and the non-empty fields."""
+        data = {"intent": self.intent, "modules": self.modules}
+        if self.unknown:
+            data["unknown"] = self.unknown
+        if self.version:
+            data["version"] = self.version
+        for name in self.FIELDS:
+            values = getattr(self, name)
+            if values:
+                data[name] = [list(v) if isinstance(v, tuple) else v for v in values]
+        if self.compatible is not None:
+            data["compatible"] = self.compatible
+        return data
+    
+    def json(self) -> str:
+        """to_dict() as a JSON string."""
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Answer':
+        """Rebuilds an answer from its to_dict() form (other keys are ignored)."""
+        fields = {name: [tuple(v) if isinstance(v, list) else v for v in data[name]]
+                  for name in cls.FIELDS if name in data}
+        return cls(data['intent'], data.get('modules', ()), data.get('unknown', ()),
+                   data.get('version'), **fields)
+    
+    def text(self, color: Optional[bool] = None) -> str:
+        """Renders the answer, with ANSI colors if color (default: use_color())."""
+        if color is None:
+            color = use_color()
+        if color:
+            paint = lambda text, code: f"{code}{text}{Colors.END}"
+        else:
+            paint = lambda text, code: text
+        text = getattr(self, '_text_' + self.intent.replace('-', '_'))(paint)
+        if self.resolved:
+            guesses = ', '.join(f"{asked} → {word}" for asked, word in self.resolved)
+            text = f"🔎 {paint('Assuming', Colors.YELLOW)} {guesses}\n{text}"
+        return text
+    
+    def __str__(self) -> str:
+        return self.text()
+    
+    def __repr__(self) -> str:
+        return f"Answer({self.to_dict()!r})"
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Answer) and self.to_dict() == other.to_dict()
+    
+    # --- Renderers, one per intent ---
+    
+    def _text_unknown(self, paint) -> str:
+        return "❓ I don't understand the question. Try: what is numpy"
+    
+    def _text_what_is(self, paint) -> str:
+        module = self.modules[0]
+        if self.unknown:
+            return f"❓ I don't know '{module}'. Use /learn file.txt to teach me."
+        
+        lines = [f"📦 {paint(module.upper(), Colors.BOLD)}"]
+        if self.is_a:
+            lines.append(f"   📖 It's a {', '.join(self.is_a)}")
+        if self.aliases:
+            lines.append(f"   🔗 Alias of: {', '.join(self.aliases)}")
+        if self.version:
+            lines.append(f"   🏷️ Stable version: {self.version}")
+        if self.deps:
+            lines.append(f"   📋 Depends on: {', '.join(self.deps)}")
+        if self.conflicts:
+            lines.append(f"   ⚠️ Conflicts with: {paint(', '.join(self.conflicts), Colors.YELLOW)}")
+        return '\n'.join(lines)
+    
+    def _text_related(self, paint) -> str:
+        module = self.modules[0]
+        if self.unknown:
+            return f"❓ I don't know '{module}'."
+        if not self.related:
+            return f"📦 Nothing is known to go with {module} yet."
+        
+        lines = [f"🧩 Modules related to {paint(module.upper(), Colors.BOLD)}:"]
+        for other, score in self.related:
+            lines.append(f"   └─ {other} ({score:.2f})")
+        return '\n'.join(lines)
+    
+    def _text_dependencies(self, paint) -> str:
+        module = self.modules[0]
+        if self.unknown:
+            return f"❓ I don't know '{module}'."
+        if not self.deps:
+            return f"📦 {module} has no known dependencies."
+        
+        lines = [f"📦 {paint(module.upper(), Colors.BOLD)} depends on:"]
+        for dep in self.deps:
+            lines.append(f"   └─ {dep}")
+        if self.indirect:
+            lines.append(f"   🔗 Indirectly: {', '.join(self.indirect)}")
+        if self.cycle:
+            loop = ' → '.join(self.cycle + self.cycle[:1])
+            lines.append(f"   🔁 {paint('Circular dependency', Colors.YELLOW)}: {loop}")
+        return '\n'.join(lines)
+    
+    def _text_required_by(self, paint) -> str:
+        module = self.modules[0]
+        if self.unknown:
+            return f"❓ I don't know '{module}'."
+        if not self.required_by:
+            return f"📦 No known module depends on {module}."
+        
+        lines = [f"📦 {paint(module.upper(), Colors.BOLD)} is used by:"]
+        for r in self.required_by:
+            lines.append(f"   └─ {r}")
+        return '\n'.join(lines)
+    
+    def _text_crash(self, paint) -> str:
+        module = self.modules[0]
+        if self.unknown:
+            return f"❓ I don't know '{module}'."
+        
+        lines = [f"🔧 {paint(module.upper(), Colors.BOLD)} - Possible issues:"]
+        for p in self.problems:
+            lines.append(f"   ❌ {p}")
+        if self.deps:
+            lines.append(f"\n   📋 Check dependencies: {', '.join(self.deps)}")
+        if self.solutions:
+            lines.append(f"\n   ✅ Solutions:")
+            for s in self.solutions:
+                lines.append(f"      → {s}")
+        if not self.problems and not self.solutions:
+            lines.append("   🤷 No crash info for this module.")
+        return '\n'.join(lines)
+    
+    def _scope_lines(self) -> List[str]:
+        """The version ranges the conflicts found only hold in, one line each."""
+        def side(module, versions):
+            return module if versions == '*' else f"{module} {versions}"
+        return [f"   📌 Only for {side(a, ra)} with {side(b, rb)}" for a, ra, b, rb in self.scopes]
+    
+    def _text_compatibility(self, paint) -> str:
+        mod1, mod2 = self.modules
+        if self.unknown:
+            unknown = 'both' if len(self.unknown) == 2 else self.unknown[0]
+            return f"❓ I don't know {unknown}."
+        tip = ''.join('\n' + line for line in self._scope_lines())
+        tip += "\n   💡 Tip: use separate environments (venv)"
+        if self.conflicts:
+            return f"⚠️ {paint('CONFLICT DETECTED', Colors.RED)} between {mod1} and {mod2}!{tip}"
+        if self.conflict_pairs:
+            pairs = ', '.join(f"{a} ↔ {b}" for a, b in self.conflict_pairs)
+            return f"⚠️ {paint('CONFLICT DETECTED', Colors.RED)} in the dependencies of {mod1} and {mod2}: {pairs}{tip}"
+        return f"✅ {paint('Compatible', Colors.GREEN)}: {mod1} and {mod2} can coexist."
+    
+    def _text_install(self, paint) -> str:
+        module = self.modules[0]
+        lines = [f"📥 Installing {paint(module, Colors.BOLD)}:"]
+        lines.append(f"   $ pip install {module}")
+        if self.deps:
+            lines.append(f"\n   📋 Will also install: {', '.join(self.deps)}")
+        if self.conflicts:
+            lines.append(f"\n   ⚠️ {paint('Warning', Colors.YELLOW)}: may conflict with {', '.join(self.conflicts)}")
+            lines.append("   💡 Tip: check with 'pip list' first")
+        if self.conflict_pairs:
+            pairs = ', '.join(f"{a} ↔ {b}" for a, b in self.conflict_pairs)
+            lines.append(f"\n   ⚠️ {paint('Conflict in its dependencies', Colors.RED)}: {pairs}")
+        lines.extend(self._scope_lines())
+        return '\n'.join(lines)
+    
+    def _text_search(self, paint) -> str:
+        lines = [f"🔎 {paint(self.modules[0], Colors.BOLD)}:"]
+        for match in self.matches:
+            lines.append(f"   • {match}")
+        if not self.matches:
+            lines.append("   🤷 Nothing found.")
+        return '\n'.join(lines)
+    
+    def _text_check(self, paint) -> str:
+        known = len(self.modules) - len(self.unknown)
+        lines = [f"📋 {paint(f'{len(self.modules)} requirements', Colors.BOLD)} checked ({known} known)"]
+        for a, b in self.conflict_pairs:
+            lines.append(f"   ⚠️ {paint('Conflict', Colors.RED)}: {a} ↔ {b}")
+        lines.extend(self._scope_lines())
+        for module, pinned, stable in self.mismatches:
+            lines.append(f"   🏷️ {paint('Version', Colors.YELLOW)}: {module} {pinned}, stable version is {stable}")
+        if self.missing:
+            needed = ', '.join(f"{dep} (for {by})" for dep, by in self.missing)
+            lines.append(f"   📋 Not listed but needed: {needed}")
+        if self.unknown:
+            lines.append(f"   ❓ Unknown: {', '.join(self.unknown)}")
+        if self.ok and not self.missing:
+            lines.append(f"   ✅ {paint('No problem found', Colors.GREEN)}")
+        return '\n'.join(lines)
+    
+    def _text_environment(self, paint) -> str:
+        known = len(self.modules) - len(self.unknown)
+        lines = [f"🐍 {paint(f'{len(self.modules)} distributions', Colors.BOLD)} installed ({known} known)"]
+        for a, b in self.conflict_pairs:
+            lines.append(f"   ⚠️ {paint('Conflict', Colors.RED)}: {a} ↔ {b}")
+        lines.extend(self._scope_lines())
+        for module, installed, stable in self.mismatches:
+            lines.append(f"   🏷️ {paint('Version', Colors.YELLOW)}: {module} {installed} installed, "
+                         f"stable version is {stable}")
+        if self.missing:
+            needed = ', '.join(f"{dep} (for {by})" for dep, by in self.missing)
+            lines.append(f"   📋 Required, but not known as dependencies: {needed}")
+        if self.ok and not self.missing:
+            lines.append(f"   ✅ {paint('No problem found', Colors.GREEN)}")
+        return '\n'.join(lines)
+
+
+# ============================================================================
+# ANSWER CACHE
+# ============================================================================
+
+def matrix_signature(matrix_file: str) -> tuple:
+    """(mtime_ns, size) of a matrix file and of its delta log (None if missing)."""
+    signature = []
+    for path in (matrix_file, matrix_file + '.delta'):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def answer_key(intent: Optional[str], slots: Optional[dict], question: str) -> tuple:
+    """
+    What an answer depends on: the routed intent and its slots, so that
+    "install numpy" and "  Install NumPy " share one entry. Questions no
+    intent matched are keyed on their (normalized) text.
+    """
+    if intent is None:
+        return (None, question)
+    return (intent,) + tuple((name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+                             for name, value in sorted(slots.items()))
+
+
+class AnswerCache:
+    """
+    Answers by answer_key, the least recently used dropped past size.
+    
+    Entries belong to one generation of the matrix (MarcoMini.generation,
+    bumped by anything that learns or loads): a lookup from another one
+    empties the cache. The most recent entries can be saved to a file and
+    loaded back by the next process, as long as the matrix on disk is
+    still the one they were answered from (matrix_signature). Loaded
+    entries stay keyed by their question's text, and as dicts, until
+    recalled: a process asking one question routes nothing else.
+    """
+    
+    def __init__(self, size: int = ANSWER_CACHE_SIZE):
+        self.size = size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[tuple, list]' = OrderedDict()   # key -> [question, Answer]
+        self._saved: Dict[str, dict] = {}      # question -> to_dict(), as loaded
+        self._changed = False
+    
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._saved)
+    
+    def clear(self):
+        self._entries.clear()
+        self._saved.clear()
+        self._changed = False
+    
+    def get(self, key: tuple, generation: int) -> Optional[Answer]:
+        """The cached answer for key, None if there is none for this generation."""
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def recall(self, question: str) -> Optional[Answer]:
+        """The loaded answer to question (exactly as asked), if any; a hit if so."""
+        saved = self._saved.pop(question, None)
+        if saved is None:
+            return None
+        self.misses -= 1
+        self.hits += 1
+        return Answer.from_dict(saved)
+    
+    def put(self, key: tuple, question: str, answer: Answer):
+        entries = self._entries
+        entries[key] = [question, answer]
+        entries.move_to_end(key)
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+        self._changed = True
+    
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+    
+    def save(self, filepath: str, signature: tuple, count: int = ANSWER_CACHE_HOT) -> bool:
+        """
+        Writes the count most recent entries, loaded ones not asked again
+        counting as older, if any changed; True if it did.
+        """
+        if not self._changed or count <= 0:
+            return False
+        recent = dict(self._saved)
+        for question, answer in self._entries.values():
+            recent.pop(question, None)
+            recent[question] = answer.to_dict()
+        data = {"signature": signature, "entries": list(recent.items())[-count:]}
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+        self._changed = False
+        return True
+    
+    def load(self, filepath: str, signature: tuple) -> int:
+        """
+        Reads the entries saved by save, if they were saved for signature.
+        Returns the number loaded.
+        """
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if [list(part) if part else None for part in signature] != data.get("signature"):
+            return 0
+        self._saved.update(data.get("entries", ()))
+        return len(data.get("entries", ()))
+
+
+def snapshot_answer(matrix_file: str, question: str) -> Optional[Answer]:
+    """
+    The answer saved for question next to matrix_file (MATRIX.answers),
+    if the matrix did not change since: what --query tries before mapping
+    the matrix, compiling any pattern or asking the daemon.
+    """
+    cache = AnswerCache()
+    if not cache.load(matrix_file + '.answers', matrix_signature(matrix_file)):
+        return None
+    return cache.recall(question.lower().strip())
+
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+
+class Profiler:
+    """
+    Where the time goes: seconds per stage of learning, and latency
+    histograms per question intent.
+    
+    A MarcoMini only measures while one is attached (marco.profiler); the
+    code paths check for it once per chunk, sentence or question, so
+    without it they cost nothing more. Latencies are counted in
+    power-of-two buckets of microseconds: bucket b holds those under 2**b.
+    """
+    
+    # Learning stages in pipeline order; "patterns/FAMILY" follow "patterns"
+    STAGES = ('read', 'split', 'tokenize', 'patterns', 'cooccurrences', 'merge')
+    
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}        # Stage -> [calls, seconds]
+        self.latencies: Dict[str, List[int]] = {}       # Intent -> count per bucket
+    
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        """Counts calls to stage, taking seconds in all."""
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [calls, seconds]
+        else:
+            entry[0] += calls
+            entry[1] += seconds
+    
+    def record(self, intent: str, seconds: float):
+        """Counts one answer of intent, taking seconds."""
+        bucket = int(seconds * 1e6).bit_length()
+        counts = self.latencies.get(intent)
+        if counts is None:
+            counts = self.latencies[intent] = []
+        if bucket >= len(counts):
+            counts.extend([0] * (bucket + 1 - len(counts)))
+        counts[bucket] += 1
+    
+    def merge(self, other: 'Profiler'):
+        """Adds the measures of another profiler (a worker's)."""
+        for stage, (calls, seconds) in other.stages.items():
+            self.add(stage, seconds, calls)
+        for intent, counts in other.latencies.items():
+            mine = self.latencies.setdefault(intent, [])
+            if len(counts) > len(mine):
+                mine.extend([0] * (len(counts) - len(mine)))
+            for bucket, n in enumerate(counts):
+                mine[bucket] += n
+    
+    @staticmethod
+    def percentile(counts: List[int], fraction: float) -> int:
+        """Upper bound in microseconds of the bucket holding fraction of counts."""
+        target = fraction * sum(counts)
+        seen = 0
+        for bucket, n in enumerate(counts):
+            seen += n
+            if n and seen >= target:
+                return 1 << bucket
+        return 0
+    
+    def to_dict(self) -> dict:
+        """JSON-ready form: stages with calls and seconds, answers with percentiles."""
+        answers = {}
+        for intent, counts in sorted(self.latencies.items()):
+            answers[intent] = {
+                "count": sum(counts),
+                "p50_us": self.percentile(counts, 0.5),
+                "p95_us": self.percentile(counts, 0.95),
+                "max_us": self.percentile(counts, 1.0),
+                "histogram": counts,
+            }
+        order = {stage: i for i, stage in enumerate(self.STAGES)}
+        stages = sorted(self.stages.items(),
+                        key=lambda item: (order.get(item[0].split('/')[0], len(order)), item[0]))
+        return {
+            "stages": {stage: {"calls": calls, "seconds": round(seconds, 6)}
+                       for stage, (calls, seconds) in stages},
+            "answers": answers,
+        }
+
+
+def _size_of_ints(values) -> int:
+    """Bytes of the int objects among values (small ones are shared)."""
+    return sum(sys.getsizeof(v) for v in values if v > 256)
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+# Run in a fresh interpreter: seconds to import, load the matrix and
+# answer one question the answer cache does not hold
+_STARTUP_STAGES = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import marco_deps
+imported = time.perf_counter()
+marco = marco_deps.MarcoMini()
+marco.load_matrix(sys.argv[2])
+loaded = time.perf_counter()
+marco.answers.clear()
+marco.answer(sys.argv[3])
+print(imported - start, loaded - imported, time.perf_counter() - loaded)
+"""
+
+
+def startup_bench(matrix_file: str, question: str, runs: int = STARTUP_RUNS) -> Dict[str, float]:
+    """
+    Milliseconds (median of runs fresh processes) for the interpreter to
+    start, to import this module, to load matrix_file, to answer question
+    uncached, and for a whole `--query question` run (which may answer
+    from the daemon or the saved answers), started as a script (compiled
+    every time) and with -m (from the bytecode cache).
+    """
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    matrix_file = os.path.abspath(matrix_file)
+    
+    def wall(command) -> float:
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, cwd=here)
+        return time.perf_counter() - start
+    
+    samples = defaultdict(list)
+    for _ in range(runs):
+        samples["interpreter"].append(wall([sys.executable, '-c', 'pass']))
+        result = subprocess.run([sys.executable, '-c', _STARTUP_STAGES, here, matrix_file, question],
+                                stdout=subprocess.PIPE, check=True)
+        for stage, seconds in zip(("import", "load_matrix", "first_answer"), result.stdout.split()):
+            samples[stage].append(float(seconds))
+        query = ['--matrix', matrix_file, '--query', question]
+        samples["query_script"].append(wall([sys.executable, 'marco_deps.py'] + query))
+        samples["query"].append(wall([sys.executable, '-m', 'marco_deps'] + query))
+    return {stage: round(sorted(values)[len(values) // 2] * 1e3, 2) for stage, values in samples.items()}
+
+
+def startup_report(times: Dict[str, float]) -> str:
+    """startup_bench() as text."""
+    labels = {"interpreter": "Python itself (-c pass)", "import": "import marco_deps",
+              "load_matrix": "load_matrix", "first_answer": "first answer (uncached)",
+              "query_script": "python marco_deps.py --query",
+              "query": "python -m marco_deps --query"}
+    lines = ["", "⏱️ MARCO STARTUP (ms, median)", "────────────────────────────"]
+    for stage, label in labels.items():
+        lines.append(f"{label:<28}{times[stage]:>9.1f}")
+    lines.append(f"{'--query minus Python':<28}{times['query'] - times['interpreter']:>9.1f}")
+    return '\n'.join(lines) + '\n'
+
+
+# ============================================================================
+# MARCO MINI - Lightweight version for demo
+# ============================================================================
+
+class MarcoMini:
+    """
+    Minimalist version of Marco for demo.
+    
+    No letter neurons, just:
+    - Beacons (concepts)
+    - Links (cooccurrences)
+    - Tags (IS-A, DEPENDS-ON, etc.)
+    - Sequences (word order)
+    """
+    
+    # Question intents (see LANGUAGE_PACKS) and the method answering each
+    INTENT_HANDLERS = {
+        "related": "_answer_related",
+        "what-is": "_answer_what_is",
+        "dependencies": "_answer_dependencies",
+        "required-by": "_answer_required_by",
+        "crash": "_answer_why_crash",
+        "crash-search": "_answer_crash_search",
+        "search": "_answer_search",
+        "compatibility": "_answer_compatibility",
+        "install": "_answer_install",
+    }
+    
+    def __init__(self, max_contexts: Optional[int] = MAX_CONTEXTS,
+                 max_links: Optional[int] = MAX_LINKS):
+        self.max_contexts = max_contexts
+        self.max_links = max_links
+        self.lexicon = Lexicon()
+        # Cooccurrences are the beacons' links, there is no other copy
+        self.beacons: BeaconTable = BeaconTable(self.lexicon)
+        self._sequences: Dict[int, Dict[int, int]] = defaultdict(_count_dict)
+        
+        # Sequence tables still to be folded in (saved matrix, deltas), in order
+        self._pending_tables: list = []
+        
+        # Incremental saves: the binary matrix we extend, and what was
+        # learned since it was written (None = no incremental save possible)
+        self._base_file: Optional[str] = None
+        self._base_id: Optional[str] = None
+        self._journal: Optional['MarcoMini'] = None
+        self._untracked = False
+        
+        # Bumped by whatever changes what the matrix knows; answers are
+        # cached for one generation, and saved for the next process only
+        # while it is the one last loaded from or saved to _saved_file
+        self.generation = 0
+        self.answers = AnswerCache()
+        self._saved_file: Optional[str] = None
+        self._saved_generation: Optional[int] = None
+        self._signature: Optional[tuple] = None
+        
+        # Transitive dependencies, cached until an edge changes them
+        self.graph = DependencyGraph(self)
+        
+        # Searchable contexts and crash reasons
+        self.index = ContextIndex(self.lexicon)
+        
+        # Beacon words by their deletions, for names with typos
+        self.names = NameIndex(self)
+        
+        # Next words and names by prefix, for completion
+        self.completer = Completer(self)
+        
+        # Link vectors, for related modules
+        self.related = RelatedIndex(self)
+        
+        # Stage timers and answer latencies, when attached (see Profiler)
+        self.profiler: Optional[Profiler] = None
         
         # Specialized tags for dependencies
         self.TAGS = [
             "IS-A", "ALIAS-OF", "DEPENDS-ON", "CONFLICTS-WITH",
-            "STABLE-VERSION", "SOLUTION-FOR", "REQUIRED-BY"
+            "STABLE-VERSION", "SOLUTION-FOR", "REQUIRED-BY", "VERSION-CONFLICTS"
         ]
     
-    def _get_or_create_beacon(self, word: str) -> dict:
+    @property
+    def sequences(self) -> Dict[int, Dict[int, int]]:
+        """Next-word counts by word ID (loaded from the matrix on first use)."""
+        if self._pending_tables:
+            self._load_tables()
+        return self._sequences
+    
+    def _load_tables(self):
+        """
+        Folds pending sequence tables into sequences.
+        
+        Pending entries are ('rows', rows) with string (word, {other:
+        count}) rows, or ('ids', table, remap) with another MarcoMini's ID
+        table and the map from its IDs to ours.
+        """
+        pending, self._pending_tables = self._pending_tables, []
+        intern = self.lexicon.intern
+        table = self._sequences
+        for entry in pending:
+            if entry[0] == 'ids':
+                remap = entry[2]
+                for wid, row in entry[1].items():
+                    target = table[remap[wid]]
+                    for other, n in row.items():
+                        target[remap[other]] += n
+            else:
+                for word, row in entry[1]:
+                    target = table[intern(word)]
+                    for other, n in row.items():
+                        target[intern(other)] += n
+    
+    def _get_or_create_beacon(self, word: str) -> Beacon:
         """Gets or creates a beacon."""
         word_lower = word.lower().strip().rstrip('.,;:!?')
-        if word_lower not in self.beacons:
-            self.beacons[word_lower] = {
-                "word": word_lower,
-                "links": {},
-                "tags": {tag: [] for tag in self.TAGS},
-                "activations": 0,
-                "contexts": []
-            }
-        return self.beacons[word_lower]
+        return self.beacons.ensure(self.lexicon.intern(word_lower))
+    
+    def _word_id(self, word: str) -> Optional[int]:
+        """
+        The lexicon ID of a known word, or None. A mapped matrix interns
+        its words as they are decoded, so a saved one may not have an ID yet.
+        """
+        return self.lexicon.intern(word) if word in self.beacons else None
+    
+    def _tags(self, beacon: Beacon, tag: str) -> List[str]:
+        """Returns the values of a beacon's tag as strings."""
+        words = self.lexicon.words
+        return [words[v] for v in beacon.tag_ids(tag)]
+    
+    def _word_tags(self, word: str, tag: str) -> List[str]:
+        """
+        The values of a word's tag as strings, read straight from a mapped
+        matrix: answers only decode the tags they show, not whole beacons.
+        """
+        words = self.lexicon.words
+        return [words[v] for v in self.beacons.tag_ids(self.lexicon.intern(word), tag)]
+    
+    def all_dependencies(self, module: str) -> List[str]:
+        """Everything module depends on, directly or not (direct ones first)."""
+        wid = self._word_id(module.lower())
+        if wid is None:
+            return []
+        words = self.lexicon.words
+        return [words[d] for d in self.graph.closure(wid) if d != wid]
+    
+    def dependency_cycle(self, module: str) -> List[str]:
+        """The circular dependency module is part of (empty if none)."""
+        wid = self._word_id(module.lower())
+        cycle = self.graph.cycle(wid) if wid is not None else None
+        return [self.lexicon.words[c] for c in cycle or ()]
+    
+    def module_aliases(self, name: str, exact: bool = False) -> List[str]:
+        """
+        The matrix word for a package name ("Scikit_Learn", "PyYAML"...)
+        followed by its ALIAS-OF chain; empty if unknown. Unless exact, a
+        name's first word stands for it when nothing else matches.
+        """
+        name = name.lower()
+        # The normal form first: a relation's name, not a token of the same spelling
+        candidates = [module_name(name), name, re.sub(r'[-.]+', '_', name), re.sub(r'[-_.]+', '', name)]
+        if not exact:
+            candidates += WORD_RE.findall(name)[:1]
+        word = next((c for c in candidates if c in self.beacons), None)
+        chain = []
+        while word is not None and word not in chain:
+            chain.append(word)
+            aliases = self._word_tags(word, 'ALIAS-OF')
+            word = aliases[0] if aliases else None
+        return chain
+    
+    def related_modules(self, module: str, k: int = RELATED_TOP_K) -> List[Tuple[str, float]]:
+        """(module, cosine) of the k modules seen in the most similar company, best first."""
+        word = module.lower()
+        if word not in self.beacons:
+            return []
+        words = self.lexicon.words
+        return [(words[other], score)
+                for score, other in self.related.related(self.lexicon.intern(word), k)]
+    
+    def canonical_module(self, name: str) -> Optional[str]:
+        """The word at the end of name's ALIAS-OF chain, or None if unknown."""
+        chain = self.module_aliases(name)
+        return chain[-1] if chain else None
+    
+    def guess_module(self, name: str) -> Optional[str]:
+        """
+        The known word a misspelled name most likely means: fewest edits,
+        then words with tags (modules), then the most active; None if no
+        word is close enough.
+        """
+        best, best_key = None, None
+        for edits, word in self.names.lookup(name.lower()):
+            beacon = self.beacons[word]
+            key = (edits, not beacon.tag_count(), -beacon.activations, word)
+            if best_key is None or key < best_key:
+                best, best_key = word, key
+        return best
+    
+    def _lookup(self, module: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        The alias chain of a module a question names, with the typo
+        fixed if it took one: (chain, [(module, word guessed)]).
+        """
+        chain = self.module_aliases(module)
+        if chain:
+            return chain, []
+        word = self.guess_module(module)
+        if word is None:
+            return [], []
+        return self.module_aliases(word), [(module, word)]
+    
+    def _alias_tags(self, chain: List[str], tag: str, first: bool = False) -> List[str]:
+        """
+        tag values along an alias chain: those of every word, in order,
+        or with first only those of the first word having some.
+        """
+        values = []
+        for word in chain:
+            found = self._word_tags(word, tag)
+            if first and found:
+                return found
+            values.extend(v for v in found if v not in values)
+        return values
+    
+    def _alias_dependencies(self, chain: List[str]) -> List[str]:
+        """Everything the words of an alias chain depend on, directly or not."""
+        deps = {}
+        for word in chain:
+            deps.update(dict.fromkeys(self.all_dependencies(word)))
+        return [d for d in deps if d not in chain]
+    
+    def check_requirements(self, requirements: List[Tuple[str, List[Tuple[str, str]]]]) -> Answer:
+        """
+        Checks (name, [(op, version)]) requirements in one pass: conflicts
+        anywhere in what they pull in, dependencies they pull in without
+        listing them, and pins that exclude the STABLE-VERSION.
+        """
+        names, unknown, mismatches = [], [], []
+        listed: Dict[str, List[int]] = {}     # canonical word -> IDs of its chain
+        pins: Dict[str, VersionRange] = {}
+        for name, specifiers in requirements:
+            names.append(name.lower())
+            chain = self.module_aliases(name)
+            if not chain:
+                unknown.append(name.lower())
+                continue
+            if specifiers:
+                pins[chain[-1]] = VersionRange.from_specifiers(specifiers)
+            ids = listed.setdefault(chain[-1], [])
+            ids.extend(self.lexicon.get(w) for w in chain if self.lexicon.get(w) not in ids)
+            
+            # The first STABLE-VERSION along the alias chain
+            version = next(iter(self._alias_tags(chain, 'STABLE-VERSION', first=True)), None)
+            if version and specifiers:
+                failed = [op + spec for op, spec in specifiers
+                          if not version_satisfies(version, op, spec)]
+                if failed:
+                    mismatches.append((name.lower(), ','.join(failed), version))
+        
+        graph, words = self.graph, self.lexicon.words
+        missing: Dict[str, str] = {}
+        pulled = set()
+        for word, ids in listed.items():
+            for wid in ids:
+                new = set(graph.closure(wid))
+                new -= pulled
+                pulled |= new
+                for dep in sorted(new, key=words.__getitem__):
+                    dep_word = self.canonical_module(words[dep]) or words[dep]
+                    if dep_word not in listed and dep_word not in missing:
+                        missing[dep_word] = word
+        wids = [wid for ids in listed.values() for wid in ids]
+        conflict_pairs, scopes = self._versioned_conflicts(
+            [(words[a], words[b]) for a, b in graph.conflicts(wids)], pins)
+        return Answer('check', names, unknown=unknown, conflict_pairs=conflict_pairs,
+                      scopes=scopes, missing=list(missing.items()), mismatches=mismatches)
+    
+    def check_environment(self, distributions: List[Distribution], learn: bool = False) -> Answer:
+        """
+        Cross-checks installed (name, version, requirements) distributions
+        against the matrix: versions outside the STABLE-VERSION series,
+        requirements the matrix does not know as DEPENDS-ON, and conflicts
+        among what is installed. With learn, every distribution's
+        requirements are then learned as DEPENDS-ON edges.
+        """
+        def word(name: str, chain: List[str]) -> str:
+            # Known words as they are, new ones normalized (as relations are)
+            return chain[0] if chain else name
+        
+        names, unknown, mismatches, missing = [], [], [], []
+        installed: List[int] = []
+        pins: Dict[str, VersionRange] = {}
+        edges = []
+        for name, version, requires in distributions:
+            name = distribution_name(name)
+            names.append(name)
+            deps = [distribution_name(dep) for dep, _specifiers in distribution_requirements(requires)]
+            chain = self.module_aliases(name, exact=True)
+            edges.extend((word(name, chain), word(dep, self.module_aliases(dep, exact=True)))
+                         for dep in deps)
+            if not chain:
+                unknown.append(name)
+                continue
+            installed.extend(self.lexicon.get(w) for w in chain)
+            if version:
+                pins[chain[-1]] = VersionRange.parse('==' + version)
+            
+            stable = next(iter(self._alias_tags(chain, 'STABLE-VERSION', first=True)), None)
+            if stable and version and not version_satisfies(stable, '==', version):
+                mismatches.append((name, version, stable))
+            known = {self.canonical_module(d) or d for d in self._alias_tags(chain, 'DEPENDS-ON')}
+            missing.extend((dep, name) for dep in deps
+                           if (self.canonical_module(dep) or dep) not in known)
+        
+        words = self.lexicon.words
+        conflict_pairs, scopes = self._versioned_conflicts(
+            [(words[a], words[b]) for a, b in self.graph.conflicts(installed)], pins)
+        if learn and edges:
+            for name, dep in edges:
+                self._apply_relation('DEPENDS-ON', 'tag', 'REQUIRED-BY', name, dep)
+            self._untracked = True
+            self.generation += 1
+        return Answer('environment', names, unknown=unknown, conflict_pairs=conflict_pairs,
+                      scopes=scopes, missing=missing, mismatches=mismatches)
+    
+    def install_conflicts(self, modules: List[str],
+                          pins: Optional[Dict[str, VersionRange]] = None) -> List[Tuple[str, str]]:
+        """
+        Conflicting pairs anywhere in what installing modules pulls in, at
+        the versions pinned by pins ({module: range}, see _version_range).
+        """
+        return self._versioned_conflicts(self._install_pairs(modules), self._pins(pins))[0]
+    
+    def _install_pairs(self, modules: List[str]) -> List[Tuple[str, str]]:
+        """Conflicting pairs in what installing modules pulls in, whatever the versions."""
+        wids = [wid for wid in (self._word_id(m.lower()) for m in modules) if wid is not None]
+        words = self.lexicon.words
+        return [(words[a], words[b]) for a, b in self.graph.conflicts(wids)]
+    
+    def _version_range(self, chain: List[str],
+                       pins: Optional[Dict[str, VersionRange]] = None) -> VersionRange:
+        """The versions to check a module at: its pin, else its STABLE-VERSION series, else any."""
+        if pins and chain[-1] in pins:
+            return pins[chain[-1]]
+        stable = next(iter(self._alias_tags(chain, 'STABLE-VERSION', first=True)), None)
+        return VersionRange.parse(stable) if stable else VersionRange()
+    
+    def _pins(self, pins: Optional[Dict[str, VersionRange]]) -> Optional[Dict[str, VersionRange]]:
+        """pins keyed by the canonical words of their modules."""
+        return {self.canonical_module(name) or name: r for name, r in pins.items()} if pins else None
+    
+    def _conflict_scopes(self, a: str, b: str, pins: Optional[Dict[str, VersionRange]] = None
+                         ) -> Optional[List[Tuple[str, str, str, str]]]:
+        """
+        None if the conflict of module a with b does not hold at the
+        versions to check (see _version_range), else the (a, range, b,
+        range) scopes it holds in; none if it holds for any version.
+        """
+        get = self.lexicon.get
+        found = self.graph.conflict_scopes(get(a), get(b),
+                                           self._version_range(self.module_aliases(a) or [a], pins),
+                                           self._version_range(self.module_aliases(b) or [b], pins))
+        if found is None:
+            return None
+        if any(x.is_any() and y.is_any() for x, y in found):
+            return []
+        return [(a, str(x), b, str(y)) for x, y in found]
+    
+    def _direct_conflicts(self, chain: List[str], pins: Optional[Dict[str, VersionRange]] = None
+                          ) -> Tuple[List[str], List[Tuple[str, str, str, str]]]:
+        """The CONFLICTS-WITH words of an alias chain that hold at the pinned versions, and their scopes."""
+        conflicts, scopes = [], []
+        for word in chain:
+            for other in self._word_tags(word, 'CONFLICTS-WITH'):
+                found = self._conflict_scopes(word, other, pins)
+                if found is not None and other not in conflicts:
+                    conflicts.append(other)
+                    scopes.extend(found)
+        return conflicts, scopes
+    
+    def _versioned_conflicts(self, pairs: List[Tuple[str, str]],
+                             pins: Optional[Dict[str, VersionRange]] = None
+                             ) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str, str, str]]]:
+        """The (a, b) conflicts of pairs that hold at the pinned versions, and their scopes."""
+        held, scopes = [], []
+        for a, b in pairs:
+            found = self._conflict_scopes(a, b, pins)
+            if found is not None:
+                held.append((a, b))
+                scopes.extend(s for s in found if s not in scopes)
+        return held, scopes
     
     def learn_sentence(self, sentence: str):
         """Learns from a sentence."""
@@ -109,388 +4024,793 @@ class MarcoMini:
         if not sentence or sentence.startswith('#'):
             return
         
-        # Tokenize
-        words = re.findall(r'\b\w+\b', sentence.lower())
+        profiler = self.profiler
+        if profiler is not None:
+            clock = time.perf_counter
+            start = clock()
+        
+        # Tokenize, the way the sentence's script needs
+        s = sentence.lower()
+        pack = pattern_pack(detect_script(s))
+        words = pack.tokenize(s)
         if len(words) < 2:
             return
         
+        self._untracked = True
+        self.generation += 1
+        if profiler is not None:
+            now = clock()
+            profiler.add('tokenize', now - start)
+            start = now
+        
         # Detect patterns
-        self._detect_patterns(sentence)
+        self._detect_patterns(sentence, pack)
+        if profiler is not None:
+            now = clock()
+            profiler.add('patterns', now - start)
+            start = now
         
-        # Cooccurrences (words that appear together)
-        for i, word in enumerate(words):
-            beacon = self._get_or_create_beacon(word)
-            beacon['activations'] += 1
-            beacon['contexts'].append(sentence[:100])
-            
-            # Link with neighbors (window of 3)
-            for j in range(max(0, i-3), min(len(words), i+4)):
-                if i != j:
-                    other = words[j]
-                    self.cooccurrences[word][other] += 1
-                    beacon['links'][other] = beacon['links'].get(other, 0) + 1
+        # Cooccurrences (words that appear together): each word's
+        # neighbors are gathered for the whole sentence, then queued on
+        # its beacon, which merges them into its links in batches
+        intern = self.lexicon.intern
+        ensure = self.beacons.ensure
+        sequences = self.sequences
+        limit = self.max_contexts
+        context = sentence[:100]
+        self.index.add(context)
+        ids = [intern(word) for word in words]
+        windows: Dict[int, List[int]] = {}
+        for i, wid in enumerate(ids):
+            # Neighbors within 3 words
+            window = ids[max(0, i - 3):i] + ids[i + 1:i + 4]
+            if wid in windows:
+                windows[wid] += window
+            else:
+                windows[wid] = window
             
             # Sequences (next word)
-            if i < len(words) - 1:
-                next_word = words[i + 1]
-                self.sequences[word][next_word] += 1
+            if i:
+                sequences[ids[i - 1]][wid] += 1
+        repeats = len(windows) < len(ids)
+        keep = self.max_links
+        for wid, window in windows.items():
+            beacon = ensure(wid)
+            for _ in range(ids.count(wid) if repeats else 1):
+                beacon.activations += 1
+                beacon.add_context(context, limit)
+            beacon.queue_links(window, keep)
+        if limit is not None and self.index.crowded():
+            self._trim_index()
+        self.completer.learned(ids)
+        self.related.clear()
+        if profiler is not None:
+            profiler.add('cooccurrences', clock() - start)
     
-    def _detect_patterns(self, sentence: str):
-        """Detects semantic patterns in the sentence."""
-        s = sentence.lower()
+    def _detect_patterns(self, sentence: str, pack: Optional[PatternPack] = None):
+        """
+        Detects semantic patterns in the sentence (every match of every
+        rule). Version scopes ("tensorflow 2.x", "pytorch < 1.5") are cut
+        out first and kept for the relations of the words they follow.
+        """
+        s, scopes = split_version_scopes(sentence.lower())
+        if pack is None:
+            pack = pattern_pack(detect_script(s))
+        profiler = self.profiler
+        # Prefilter: no trigger keyword, no regex
+        for family, _triggers, action, inverse, patterns in pack.relations_in(s):
+            if profiler is not None:
+                start = time.perf_counter()
+            for pattern in patterns:
+                for match in pattern.finditer(s):
+                    subject, obj = match.groups()
+                    self._apply_relation(family, action, inverse, subject, obj, scopes)
+            if profiler is not None:
+                profiler.add('patterns/' + family, time.perf_counter() - start)
+    
+    def _apply_relation(self, family: str, action: str, inverse: Optional[str],
+                        subject: str, obj: str, scopes: Optional[Dict[str, VersionRange]] = None):
+        """Stores one extracted (subject, object) relation, with the version scopes of its words."""
+        # Scopes are keyed by the names as written, the relation by their normal form
+        mine = str(scopes[subject]) if scopes and subject in scopes else '*'
+        theirs = str(scopes[obj]) if scopes and obj in scopes else '*'
+        subject = module_name(subject)
+        if family in MODULE_RELATIONS:
+            obj = module_name(obj)
+        intern = self.lexicon.intern
+        wid = intern(subject)
+        beacon = self.beacons.ensure(wid)
+        
+        if action == 'context':
+            reason = f"crashes: {obj[:50]}"
+            beacon.add_context(reason, self.max_contexts)
+            self.index.add(reason, subject)
+            return
+        
+        vid = intern(obj)
+        if action == 'replace':
+            beacon.set_tag(family, [vid])
+            return
+        
+        beacon.add_tag(family, vid)
+        if family == 'DEPENDS-ON':
+            self.graph.invalidate(wid)
+        
+        # Reverse link (REQUIRED-BY) or symmetric relation (CONFLICTS-WITH)
+        if inverse:
+            self.beacons.ensure(vid).add_tag(inverse, wid)
+        if family == 'CONFLICTS-WITH':
+            # The versions it holds for, on both sides ("*" = any)
+            beacon.add_tag('VERSION-CONFLICTS', intern(f"{obj} {mine} {theirs}"))
+            self.beacons.ensure(vid).add_tag('VERSION-CONFLICTS', intern(f"{subject} {theirs} {mine}"))
+            self.graph.add_conflict(wid, vid)
+            self.graph.add_conflict(vid, wid)
+    
+    def learn_file(self, filepath: str, chunk_size: int = CHUNK_SIZE) -> int:
+        """
+        Learns from a file. Returns number of sentences learned.
+        
+        The file is streamed in chunks, so its size does not count, only
+        what is kept: with max_contexts (and max_links on big
+        vocabularies), memory stays flat once the vocabulary is known.
+        '-' reads stdin; .gz, .bz2 and .xz files are decompressed.
+        """
+        if self._journal is not None:
+            # Learn apart so the next save_matrix only appends this delta
+            partial = MarcoMini(max_contexts=self.max_contexts, max_links=self.max_links)
+            partial.profiler = self.profiler
+            count = partial.learn_file(filepath, chunk_size)
+            self._absorb(partial)
+            return count
         
-        # IS-A: "X is a Y", "X is a Y"
-        patterns_is_a = [
-            r"(\w+)\s+is\s+(?:a|an)\s+(\w+)",
-            r"(\w+)\s+are\s+(\w+)s?",
-        ]
-        for pattern in patterns_is_a:
-            match = re.search(pattern, s)
-            if match:
-                subject, category = match.groups()
-                beacon = self._get_or_create_beacon(subject)
-                if category not in beacon['tags']['IS-A']:
-                    beacon['tags']['IS-A'].append(category)
-        
-        # ALIAS: "X is an alias of Y", "X = Y"
-        patterns_alias = [
-            r"(\w+)\s+is\s+(?:an\s+)?alias\s+(?:of|for)\s+(\w+)",
-            r"(\w+)\s*=\s*(\w+)",
-        ]
-        for pattern in patterns_alias:
-            match = re.search(pattern, s)
-            if match:
-                alias, original = match.groups()
-                beacon = self._get_or_create_beacon(alias)
-                if original not in beacon['tags']['ALIAS-OF']:
-                    beacon['tags']['ALIAS-OF'].append(original)
-        
-        # DEPENDS-ON: "X depends on Y", "X requires Y"
-        patterns_depends = [
-            r"(\w+)\s+depends?\s+on\s+(\w+)",
-            r"(\w+)\s+requires?\s+(\w+)",
-            r"(\w+)\s+needs?\s+(\w+)",
-        ]
-        for pattern in patterns_depends:
-            match = re.search(pattern, s)
-            if match:
-                dependent, dependency = match.groups()
-                beacon = self._get_or_create_beacon(dependent)
-                if dependency not in beacon['tags']['DEPENDS-ON']:
-                    beacon['tags']['DEPENDS-ON'].append(dependency)
-                # Reverse link
-                beacon_dep = self._get_or_create_beacon(dependency)
-                if dependent not in beacon_dep['tags']['REQUIRED-BY']:
-                    beacon_dep['tags']['REQUIRED-BY'].append(dependent)
-        
-        # CONFLICTS: "X and Y conflict", "X conflicts with Y"
-        patterns_conflict = [
-            r"(\w+)\s+and\s+(\w+)\s+(?:have\s+a\s+)?conflict",
-            r"(\w+)\s+conflicts?\s+with\s+(\w+)",
-            r"(\w+)\s+(?:is\s+)?incompatible\s+with\s+(\w+)",
-        ]
-        for pattern in patterns_conflict:
-            match = re.search(pattern, s)
-            if match:
-                mod1, mod2 = match.groups()
-                beacon1 = self._get_or_create_beacon(mod1)
-                beacon2 = self._get_or_create_beacon(mod2)
-                if mod2 not in beacon1['tags']['CONFLICTS-WITH']:
-                    beacon1['tags']['CONFLICTS-WITH'].append(mod2)
-                if mod1 not in beacon2['tags']['CONFLICTS-WITH']:
-                    beacon2['tags']['CONFLICTS-WITH'].append(mod1)
-        
-        # VERSION: "X stable version is Y"
-        patterns_version = [
-            r"(\w+)\s+stable\s+version\s+(?:is\s+)?(\d+[\d\.]*)",
-            r"(\w+)\s+version\s+(\d+[\d\.]*)\s+(?:is\s+)?stable",
-        ]
-        for pattern in patterns_version:
-            match = re.search(pattern, s)
-            if match:
-                module, version = match.groups()
-                beacon = self._get_or_create_beacon(module)
-                beacon['tags']['STABLE-VERSION'] = [version]
-        
-        # SOLUTION: "to fix X you need Y", "solution for X is Y"
-        patterns_solution = [
-            r"to\s+fix\s+(\w+).*?(?:you\s+need|install|use)\s+(\w+)",
-            r"solution\s+for\s+(\w+).*?(?:is|:)\s+(\w+)",
-            r"if\s+(\w+)\s+crashes?.*?(?:upgrade|update|install)\s+(\w+)",
-        ]
-        for pattern in patterns_solution:
-            match = re.search(pattern, s)
-            if match:
-                problem, solution = match.groups()
-                beacon = self._get_or_create_beacon(problem)
-                if solution not in beacon['tags']['SOLUTION-FOR']:
-                    beacon['tags']['SOLUTION-FOR'].append(solution)
-        
-        # CRASH: "X crashes if Y"
-        patterns_crash = [
-            r"(\w+)\s+crashes?\s+(?:if|when|because)\s+(.+)",
-        ]
-        for pattern in patterns_crash:
-            match = re.search(pattern, s)
-            if match:
-                module, reason = match.groups()
-                beacon = self._get_or_create_beacon(module)
-                beacon['contexts'].append(f"crashes: {reason[:50]}")
-    
-    def learn_file(self, filepath: str) -> int:
-        """Learns from a file. Returns number of sentences learned."""
         count = 0
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                # Split on periods for multiple sentences
-                for sentence in re.split(r'[.!?\n]', line):
-                    sentence = sentence.strip()
-                    if sentence:
-                        self.learn_sentence(sentence)
-                        count += 1
+        with open_text(filepath) as f:
+            if self.profiler is not None:
+                return self._learn_profiled(f, chunk_size)
+            for sentence in iter_sentences(f, chunk_size):
+                self.learn_sentence(sentence)
+                count += 1
+        return count
+    
+    def _learn_profiled(self, stream, chunk_size: int) -> int:
+        """learn_file's loop, timing reads and sentence splitting apart."""
+        profiler = self.profiler
+        clock = time.perf_counter
+        read = [0.0]
+        
+        class TimedStream:
+            def read(self, size):
+                start = clock()
+                chunk = stream.read(size)
+                seconds = clock() - start
+                read[0] += seconds
+                profiler.add('read', seconds)
+                return chunk
+        
+        sentences = iter_sentences(TimedStream(), chunk_size)
+        count = 0
+        while True:
+            start, before = clock(), read[0]
+            sentence = next(sentences, None)
+            profiler.add('split', clock() - start - (read[0] - before))
+            if sentence is None:
+                return count
+            self.learn_sentence(sentence)
+            count += 1
+    
+    def learn_files(self, paths: List[str], jobs: Optional[int] = None) -> int:
+        """
+        Learns from many files and/or directories. Returns sentences learned.
+        
+        With more than one file, contiguous groups of files are learned by a
+        process pool and the partial matrices are merged back in file order,
+        so the result is identical to a serial run. Except with max_links:
+        links are pruned as they stream in, and which ones survive depends
+        on how the files were split between workers.
+        """
+        files = collect_files(paths)
+        jobs = jobs or os.cpu_count() or 1
+        if jobs <= 1 or len(files) <= 1:
+            return sum(self.learn_file(f) for f in files)
+        
+        import multiprocessing
+        per_task = max(1, len(files) // (jobs * 4))
+        profiler = self.profiler
+        tasks = [(files[i:i + per_task], self.max_contexts, self.max_links, profiler is not None)
+                 for i in range(0, len(files), per_task)]
+        
+        count = 0
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            for learned, partial in pool.imap(_learn_worker, tasks):
+                if profiler is not None:
+                    # Workers' stages add up their time, across processes
+                    profiler.merge(partial.profiler)
+                    start = time.perf_counter()
+                    self._absorb(partial)
+                    profiler.add('merge', time.perf_counter() - start)
+                else:
+                    self._absorb(partial)
+                count += learned
         return count
     
-    def save_matrix(self, filepath: str = None):
-        """Saves the matrix to JSON."""
+    def merge(self, other: 'MarcoMini'):
+        """
+        Merges another MarcoMini into this one, as if its text had been
+        learned after ours: counts are summed, tag lists unioned in order,
+        the latest stable version wins and contexts are capped.
+        """
+        self._merge_state(other)
+        self._untracked = True
+    
+    def _absorb(self, partial: 'MarcoMini'):
+        """Merges a freshly learned partial, journaling it for save_matrix."""
+        self._merge_state(partial)
+        if self._journal is not None:
+            self._journal._merge_state(partial)
+    
+    def _merge_state(self, other: 'MarcoMini'):
+        """Merges other's beacons and count tables (see merge)."""
+        self.generation += 1
+        # Interning other's words in its ID order gives them the IDs a
+        # serial run would have given them
+        intern = self.lexicon.intern
+        remap = [intern(word) for word in other.lexicon.words]
+        
+        for oid in other.beacons.ids():
+            src = other.beacons.by_id(oid)
+            beacon = self.beacons.ensure(remap[oid])
+            beacon.activations += src.activations
+            if src.links is not None:
+                beacon.add_links({remap[wid]: n for wid, n in src.link_items()})
+                if self.max_links is not None and beacon.link_count() > self.max_links:
+                    beacon.prune_links(self.max_links * 3 // 4)
+            
+            for tag, values in (src.tags or {}).items():
+                if tag == 'STABLE-VERSION':
+                    if values:
+                        beacon.set_tag(tag, [remap[v] for v in values])
+                    continue
+                for v in values:
+                    beacon.add_tag(tag, remap[v])
+                if tag == 'DEPENDS-ON' and values:
+                    self.graph.invalidate(remap[oid])
+                elif tag == 'CONFLICTS-WITH':
+                    # Also drops the cached version scopes of the beacon
+                    for v in values:
+                        self.graph.add_conflict(remap[oid], remap[v])
+            
+            for context in src.context_list():
+                beacon.add_context(context, self.max_contexts)
+        
+        for text, owner in other.index.docs():
+            self.index.add(text, owner)
+        if self.max_contexts is not None and self.index.crowded():
+            self._trim_index()
+        
+        # Sequences stay pending while ours are not loaded yet
+        self._pending_tables.append(('ids', other.sequences, remap))
+        if len(self._pending_tables) == 1:
+            self._load_tables()
+        self.completer.merged(other, remap)
+        self.related.clear()
+    
+    def _trim_index(self):
+        """
+        Drops the in-memory index documents that no beacon holds any more
+        (beacons only keep their max_contexts latest contexts).
+        """
+        held = set()
+        for beacon in self.beacons.loaded():
+            held.update(beacon.context_list())
+        self.index.retain(held)
+    
+    def _context_docs(self):
+        """Index documents rebuilt from beacon contexts (matrices saved without an index)."""
+        for word, beacon in self.beacons.items():
+            for context in beacon.context_list():
+                yield context, word if context.startswith('crashes: ') else None
+    
+    def _beacon_dicts(self):
+        """Yields every beacon in its dict form."""
+        for word, beacon in self.beacons.items():
+            yield beacon_to_dict(word, beacon, self.lexicon, self.TAGS)
+    
+    def _table_rows(self, table: Dict[int, Dict[int, int]]):
+        """Yields the (word, {other: count}) string rows of a count table."""
+        words = self.lexicon.words
+        for wid, row in table.items():
+            yield words[wid], {words[other]: n for other, n in row.items()}
+    
+    def _state(self) -> dict:
+        """Returns beacons and count tables as plain JSON-ready dicts."""
+        return {
+            "beacons": {b['word']: b for b in self._beacon_dicts()},
+            "sequences": dict(self._table_rows(self.sequences)),
+            "index": [[text, owner] for text, owner in self.index.docs()]
+        }
+    
+    def _set_state(self, data: dict):
+        """Replaces beacons and count tables with those of a _state() dict."""
+        self.generation += 1
+        self.lexicon = Lexicon()
+        self.beacons = BeaconTable(self.lexicon)
+        self.graph.clear()
+        self.names.clear()
+        self.completer.clear()
+        self.related.clear()
+        for word, beacon in data.get('beacons', {}).items():
+            wid = self.lexicon.intern(word)
+            self.beacons.add(wid, beacon_from_dict(beacon, self.lexicon))
+        self.index = ContextIndex(self.lexicon)
+        if 'index' in data:
+            for text, owner in data['index']:
+                self.index.add(text, owner)
+        else:
+            self.index.pending = self._context_docs
+        self._sequences = defaultdict(_count_dict)
+        self._pending_tables = [('rows', data.get('sequences', {}).items())]
+    
+    @staticmethod
+    def _from_state(data: dict, max_contexts: Optional[int] = None) -> 'MarcoMini':
+        """Builds a MarcoMini from a _state() dict."""
+        marco = MarcoMini(max_contexts=max_contexts)
+        marco._set_state(data)
+        return marco
+    
+    def compact(self, stopwords=COMPACT_STOPWORDS, min_activations: int = COMPACT_MIN_ACTIVATIONS,
+                max_links: Optional[int] = COMPACT_MAX_LINKS) -> Dict[str, Tuple[int, int]]:
+        """
+        Prunes what a long-lived matrix piles up; save with full=True after.
+        
+        Beacons of stopwords and of words seen fewer than min_activations
+        times are dropped unless they hold tags or crash reasons, and so
+        are links towards them. The others keep their max_links most
+        frequent links (None = all) and one copy of each context (see
+        Beacon.compact). Word order (sequences) and the context index are
+        kept: completion and search need them. Returns {what: (before,
+        after)} for beacons, links, contexts and tag values.
+        """
+        # Everything in memory, sequences before the mapped file goes away
+        if self._pending_tables:
+            self._load_tables()
+        if isinstance(self.beacons, MappedBeacons):
+            self.index = self.index.materialize()
+            self.beacons = self.beacons.materialize()
+        
+        def counts() -> Dict[str, int]:
+            beacons = list(self.beacons.values())
+            return {"beacons": len(beacons),
+                    "links": sum(b.link_count() for b in beacons),
+                    "contexts": sum(len(b.context_list()) for b in beacons),
+                    "tags": sum(b.tag_count() for b in beacons)}
+        
+        before = counts()
+        stopwords = set(stopwords)
+        words = self.lexicon.words
+        beacons = self.beacons
+        dropped = set()
+        for wid in beacons.ids():
+            beacon = beacons.by_id(wid)
+            if ((words[wid] in stopwords or beacon.activations < min_activations)
+                    and not beacon.tag_count()
+                    and not any(c.startswith('crashes: ') for c in beacon.context_list())):
+                dropped.add(wid)
+        
+        table = BeaconTable(self.lexicon)
+        for wid in beacons.ids():
+            if wid not in dropped:
+                table.add(wid, beacons.by_id(wid)).compact(dropped, max_links)
+        self.beacons = table
+        
+        self.generation += 1
+        self._untracked = True
+        self.graph.clear()
+        self.names.clear()
+        self.completer.clear()
+        self.related.clear()
+        after = counts()
+        return {what: (before[what], after[what]) for what in before}
+    
+    def save_matrix(self, filepath: str = None, full: bool = False):
+        """
+        Saves the matrix: JSON if filepath ends in .json, binary otherwise.
+        
+        When saving back to the binary matrix it was loaded from (or last
+        saved to), only what learn_file learned since is appended to the
+        delta log. The matrix is rewritten in full (compacted) when full is
+        set, when the log outgrows DELTA_COMPACT_RATIO of the matrix, or
+        when the state changed in ways the journal did not record.
+        """
         filepath = filepath or MATRIX_FILE
-        data = {
-            "version": VERSION,
-            "beacons": self.beacons,
-            "stats": {
-                "beacons": len(self.beacons),
-                "cooccurrences": sum(len(v) for v in self.cooccurrences.values())
-            }
+        delta_file = filepath + '.delta'
+        
+        if (not full and self._journal is not None and not self._untracked
+                and filepath == self._base_file and os.path.exists(filepath)):
+            if self._journal.beacons:
+                append_delta(delta_file, self._base_id, self._journal._state())
+                self._journal = MarcoMini(max_contexts=self.max_contexts, max_links=self.max_links)
+            log_size = os.path.getsize(delta_file) if os.path.exists(delta_file) else 0
+            if log_size <= DELTA_COMPACT_RATIO * os.path.getsize(filepath):
+                self._mark_saved(filepath)
+                return
+        
+        # Full save: load the sequences before the mapped file goes away
+        sequences = self.sequences
+        binary = not filepath.lower().endswith('.json')
+        related = self.related.table() if binary else None
+        if isinstance(self.beacons, MappedBeacons):
+            self.index = self.index.materialize()
+            self.beacons = self.beacons.materialize()
+            self.related.clear()
+        if self.max_contexts is not None:
+            # Everything is in memory now, saved documents included
+            self._trim_index()
+        stats = {
+            "beacons": len(self.beacons),
+            "contexts": len(self.index),
+            "cooccurrences": sum(beacon.link_count() for beacon in self.beacons.loaded()),
+            "sequences": sum(len(v) for v in sequences.values())
         }
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        
+        if not binary:
+            data = dict(self._state(), version=VERSION, stats=stats)
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self._base_file = self._base_id = self._journal = None
+            self._untracked = False
+            self._mark_saved(filepath)
+            return
+        
+        base_id = os.urandom(8).hex()
+        write_binary_matrix(filepath, self._beacon_dicts(), self.TAGS,
+                            {"version": VERSION, "id": base_id, "stats": stats},
+                            {b'SEQS': self._table_rows(sequences)},
+                            self.index.docs(), related)
+        if os.path.exists(delta_file):
+            os.remove(delta_file)
+        self._base_file, self._base_id = filepath, base_id
+        self._journal = MarcoMini(max_contexts=self.max_contexts, max_links=self.max_links)
+        self._untracked = False
+        self._mark_saved(filepath)
     
     def load_matrix(self, filepath: str = None) -> bool:
-        """Loads a saved matrix."""
-        filepath = filepath or MATRIX_FILE
+        """
+        Loads a saved matrix (binary or JSON, detected from the file).
+        
+        Binary matrices are memory-mapped: beacons are only decoded when
+        looked up, count tables when learning first needs them, and the
+        delta log is replayed on top. Without filepath, falls back to the
+        legacy JSON matrix.
+        """
+        filepath = matrix_path(filepath)
         if not os.path.exists(filepath):
             return False
+        
+        if is_binary_matrix(filepath):
+            matrix = MatrixFile(filepath)
+            self.lexicon = Lexicon()
+            self.beacons = MappedBeacons(matrix, self.lexicon)
+            self.graph.clear()
+            self.names.clear()
+            self.completer.clear()
+            self.related.clear(matrix)
+            if 'CIDX' in matrix.sections:
+                self.index = ContextIndex(self.lexicon, matrix)
+            else:
+                self.index = ContextIndex(self.lexicon)
+                self.index.pending = self._context_docs
+            self._sequences = defaultdict(_count_dict)
+            self._pending_tables = [('rows', matrix.table('SEQS'))]
+            base_id = matrix.meta.get('id')
+            for state in read_deltas(filepath + '.delta', base_id):
+                self._merge_state(MarcoMini._from_state(state))
+            self._base_file, self._base_id = filepath, base_id
+            self._journal = MarcoMini(max_contexts=self.max_contexts, max_links=self.max_links)
+            self._untracked = False
+            self._load_answers(filepath)
+            return True
+        
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
-        self.beacons = data.get('beacons', {})
+        self._set_state(data)
+        self._base_file = self._base_id = self._journal = None
+        self._untracked = False
+        self._load_answers(filepath)
         return True
     
-    def answer(self, question: str) -> str:
-        """Answers a question."""
+    def _mark_saved(self, filepath: str):
+        """Records that filepath now holds what the matrix knows."""
+        self._saved_file = filepath
+        self._saved_generation = self.generation
+        self._signature = matrix_signature(filepath)
+    
+    def _load_answers(self, filepath: str):
+        """Starts a new answer cache, warm with what was saved for this matrix."""
+        self._mark_saved(filepath)
+        self.answers.clear()
+        self.answers.generation = self.generation
+        self.answers.load(filepath + '.answers', self._signature)
+    
+    def save_answers(self) -> bool:
+        """
+        Saves the most recent answers next to the matrix (MATRIX.answers),
+        for the next process that loads it. Only done while the matrix on
+        disk is the one they were answered from; True if anything was saved.
+        """
+        filepath = self._saved_file
+        if (filepath is None or self.generation != self._saved_generation
+                or self.answers.generation != self.generation):
+            return False
+        signature = matrix_signature(filepath)
+        if signature != self._signature:
+            return False
+        try:
+            return self.answers.save(filepath + '.answers', signature)
+        except OSError:
+            return False
+    
+    def answer(self, question: str) -> Answer:
+        """Answers a question, from the answer cache if it was asked before."""
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
         q = question.lower().strip()
+        intent, slots, pack = self._route(q)
+        key = answer_key(intent, slots, q)
+        answer = self.answers.get(key, self.generation)
+        if answer is None:
+            answer = self.answers.recall(q) or self._answer(q, intent, slots, pack)
+            self.answers.put(key, q, answer)
+        if profiler is not None:
+            profiler.record(answer.intent, time.perf_counter() - start)
+        return answer
+    
+    def _route(self, q: str) -> Tuple[Optional[str], Optional[dict], PatternPack]:
+        """The intent and slots of a (lowercased) question, and its pattern pack."""
+        pack = pattern_pack(detect_script(q))
+        # Version pins ("numpy>=1.20", "pytorch 1.4") are only for the questions taking them
+        pinned, pins = split_version_scopes(q, bare=True)
+        intent, slots = pack.route(pinned) if pins else (None, None)
+        if intent in ('compatibility', 'install'):
+            return intent, dict(slots, pins=pins), pack
+        intent, slots = pack.route(q)
+        return intent, slots, pack
+    
+    def _answer(self, q: str, intent: Optional[str], slots: Optional[dict],
+                pack: PatternPack) -> Answer:
+        """Answers a routed question (see _route)."""
+        if intent is not None:
+            return getattr(self, self.INTENT_HANDLERS[intent])(**slots)
         
-        # WHAT IS X
-        patterns_what = [
-            r"what\s+is\s+(\w+)",
-            r"what'?s\s+(\w+)",
-            r"tell\s+me\s+about\s+(\w+)",
-        ]
-        for pattern in patterns_what:
-            match = re.search(pattern, q)
-            if match:
-                return self._answer_what_is(match.group(1))
-        
-        # X DEPENDS ON WHAT
-        patterns_depends = [
-            r"what\s+does\s+(\w+)\s+depend\s+on",
-            r"(\w+)\s+depends?\s+on\s+what",
-            r"dependencies\s+(?:of|for)\s+(\w+)",
-        ]
-        for pattern in patterns_depends:
-            match = re.search(pattern, q)
-            if match:
-                return self._answer_dependencies(match.group(1))
-        
-        # WHO USES X
-        patterns_uses = [
-            r"who\s+uses?\s+(\w+)",
-            r"what\s+uses?\s+(\w+)",
-            r"what\s+requires?\s+(\w+)",
-        ]
-        for pattern in patterns_uses:
-            match = re.search(pattern, q)
-            if match:
-                return self._answer_required_by(match.group(1))
-        
-        # WHY DOES X CRASH
-        patterns_crash = [
-            r"why\s+(?:does\s+)?(\w+)\s+crash",
-            r"(\w+)\s+(?:is\s+)?crashing",
-            r"(\w+)\s+doesn'?t?\s+work",
-        ]
-        for pattern in patterns_crash:
-            match = re.search(pattern, q)
-            if match:
-                return self._answer_why_crash(match.group(1))
-        
-        # X AND Y COMPATIBLE?
-        patterns_compat = [
-            r"(?:are\s+)?(\w+)\s+and\s+(\w+)\s+compatible",
-            r"can\s+(?:i\s+)?use\s+(\w+)\s+with\s+(\w+)",
-            r"(\w+)\s+(?:works?\s+)?with\s+(\w+)\s*\?",
-        ]
-        for pattern in patterns_compat:
-            match = re.search(pattern, q)
-            if match:
-                return self._answer_compatibility(match.group(1), match.group(2))
-        
-        # INSTALL X
-        patterns_install = [
-            r"(?:how\s+(?:do\s+i\s+)?)?install\s+(\w+)",
-            r"i\s+want\s+(?:to\s+)?install\s+(\w+)",
-        ]
-        for pattern in patterns_install:
-            match = re.search(pattern, q)
-            if match:
-                return self._answer_install(match.group(1))
-        
-        # Default: search for relevant beacon
-        words = re.findall(r'\b\w+\b', q)
+        # Default: search for relevant beacon, then for contexts
+        words = pack.tokenize(q)
         for word in words:
             if word in self.beacons:
                 return self._answer_what_is(word)
         
-        return "❓ I don't understand the question. Try: what is numpy"
+        if self.index.search(words, limit=1):
+            return self._answer_search(q)
+        return Answer('unknown')
     
-    def _answer_what_is(self, module: str) -> str:
-        """Answers 'what is X'."""
-        beacon = self.beacons.get(module.lower())
-        if not beacon:
-            return f"❓ I don't know '{module}'. Use /learn file.txt to teach me."
+    def answer_many(self, questions, jobs: Optional[int] = None) -> List[dict]:
+        """
+        Answers many questions, in order, as dicts: the question, the
+        Answer's to_dict() fields and its plain-text (uncolored) "answer".
         
-        lines = [f"📦 {colored(module.upper(), Colors.BOLD)}"]
+        With jobs > 1, when the matrix is unchanged since it was loaded or
+        saved, questions are spread over worker processes that each map
+        the matrix file once.
+        """
+        questions = [q.strip() for q in questions]
+        unchanged = (self._base_file is not None and not self._untracked
+                     and not (self._journal and self._journal.beacons))
+        if not jobs or jobs <= 1 or len(questions) <= 1 or not unchanged:
+            return [_answer_result(self, q) for q in questions]
         
-        # IS-A
-        is_a = beacon['tags'].get('IS-A', [])
-        if is_a:
-            lines.append(f"   📖 It's a {', '.join(is_a)}")
-        
-        # ALIAS
-        aliases = beacon['tags'].get('ALIAS-OF', [])
-        if aliases:
-            lines.append(f"   🔗 Alias of: {', '.join(aliases)}")
-        
-        # VERSION
-        version = beacon['tags'].get('STABLE-VERSION', [])
-        if version:
-            lines.append(f"   🏷️ Stable version: {version[0]}")
-        
-        # DEPENDS-ON
-        deps = beacon['tags'].get('DEPENDS-ON', [])
-        if deps:
-            lines.append(f"   📋 Depends on: {', '.join(deps)}")
-        
-        # CONFLICTS
-        conflicts = beacon['tags'].get('CONFLICTS-WITH', [])
-        if conflicts:
-            lines.append(f"   ⚠️ Conflicts with: {colored(', '.join(conflicts), Colors.YELLOW)}")
-        
-        return '\n'.join(lines)
+        import multiprocessing
+        per_task = max(1, len(questions) // (jobs * 4))
+        tasks = [questions[i:i + per_task] for i in range(0, len(questions), per_task)]
+        results = []
+        with multiprocessing.Pool(min(jobs, len(tasks)), _query_init,
+                                  (self._base_file,)) as pool:
+            for answered in pool.imap(_query_worker, tasks):
+                results.extend(answered)
+        return results
+    
+    def complete(self, text: str, k: int = COMPLETE_TOP_K) -> List[str]:
+        """Up to k words to finish or continue text with (see Completer)."""
+        return self.completer.complete(text, k)
+    
+    def _answer_what_is(self, module: str) -> Answer:
+        """Answers 'what is X'."""
+        chain, resolved = self._lookup(module)
+        if not chain:
+            return Answer('what-is', [module], unknown=[module])
+        version = self._alias_tags(chain, 'STABLE-VERSION', first=True)
+        return Answer('what-is', chain[:1], resolved=resolved,
+                      is_a=self._word_tags(chain[0], 'IS-A'),
+                      aliases=chain[1:],
+                      version=version[0] if version else None,
+                      deps=self._alias_tags(chain, 'DEPENDS-ON', first=True),
+                      conflicts=self._alias_tags(chain, 'CONFLICTS-WITH'))
+    
+    def _answer_related(self, module: str) -> Answer:
+        """Answers 'what is similar to X'."""
+        chain, resolved = self._lookup(module)
+        if not chain:
+            return Answer('related', [module], unknown=[module])
+        related = []
+        for word in chain:
+            related = [(other, round(score, 3)) for other, score in self.related_modules(word)
+                       if other not in chain]
+            if related:
+                break
+        return Answer('related', chain[:1], resolved=resolved, related=related)
     
-    def _answer_dependencies(self, module: str) -> str:
+    def _answer_dependencies(self, module: str) -> Answer:
         """Answers 'what does X depend on'."""
-        beacon = self.beacons.get(module.lower())
-        if not beacon:
-            return f"❓ I don't know '{module}'."
-        
-        deps = beacon['tags'].get('DEPENDS-ON', [])
+        chain, resolved = self._lookup(module)
+        if not chain:
+            return Answer('dependencies', [module], unknown=[module])
+        deps = self._alias_tags(chain, 'DEPENDS-ON', first=True)
         if not deps:
-            return f"📦 {module} has no known dependencies."
-        
-        lines = [f"📦 {colored(module.upper(), Colors.BOLD)} depends on:"]
-        for dep in deps:
-            lines.append(f"   └─ {dep}")
-        
-        return '\n'.join(lines)
+            return Answer('dependencies', chain[:1], resolved=resolved)
+        owner = next(w for w in chain if self._word_tags(w, 'DEPENDS-ON'))
+        return Answer('dependencies', chain[:1], resolved=resolved, deps=deps,
+                      indirect=[d for d in self._alias_dependencies(chain) if d not in deps],
+                      cycle=self.dependency_cycle(owner))
     
-    def _answer_required_by(self, module: str) -> str:
+    def _answer_required_by(self, module: str) -> Answer:
         """Answers 'who uses X'."""
-        beacon = self.beacons.get(module.lower())
-        if not beacon:
-            return f"❓ I don't know '{module}'."
-        
-        required = beacon['tags'].get('REQUIRED-BY', [])
-        if not required:
-            return f"📦 No known module depends on {module}."
-        
-        lines = [f"📦 {colored(module.upper(), Colors.BOLD)} is used by:"]
-        for r in required:
-            lines.append(f"   └─ {r}")
-        
-        return '\n'.join(lines)
+        chain, resolved = self._lookup(module)
+        if not chain:
+            return Answer('required-by', [module], unknown=[module])
+        return Answer('required-by', chain[:1], resolved=resolved,
+                      required_by=self._alias_tags(chain, 'REQUIRED-BY'))
     
-    def _answer_why_crash(self, module: str) -> str:
+    def _answer_why_crash(self, module: str) -> Answer:
         """Answers 'why does X crash'."""
-        beacon = self.beacons.get(module.lower())
-        if not beacon:
-            return f"❓ I don't know '{module}'."
-        
-        # Search in contexts
-        problems = [c for c in beacon.get('contexts', []) if 'crash' in c]
-        solutions = beacon['tags'].get('SOLUTION-FOR', [])
-        deps = beacon['tags'].get('DEPENDS-ON', [])
-        
-        lines = [f"🔧 {colored(module.upper(), Colors.BOLD)} - Possible issues:"]
-        
-        if problems:
-            for p in problems:
-                lines.append(f"   ❌ {p}")
-        
-        if deps:
-            lines.append(f"\n   📋 Check dependencies: {', '.join(deps)}")
-        
-        if solutions:
-            lines.append(f"\n   ✅ Solutions:")
-            for s in solutions:
-                lines.append(f"      → {s}")
-        
-        if not problems and not solutions:
-            lines.append("   🤷 No crash info for this module.")
+        chain, resolved = self._lookup(module)
+        if not chain:
+            return Answer('crash', [module], unknown=[module])
         
-        return '\n'.join(lines)
+        # Best contexts mentioning both the module (any of its names) and a crash
+        problems = self.index.search([*chain, *CRASH_TERMS], require=[chain, CRASH_TERMS])
+        return Answer('crash', chain[:1], resolved=resolved, problems=problems,
+                      solutions=self._alias_tags(chain, 'SOLUTION-FOR'),
+                      deps=self._alias_tags(chain, 'DEPENDS-ON', first=True))
     
-    def _answer_compatibility(self, mod1: str, mod2: str) -> str:
-        """Answers 'are X and Y compatible?'."""
-        beacon1 = self.beacons.get(mod1.lower())
-        beacon2 = self.beacons.get(mod2.lower())
+    def _answer_search(self, text: str, crash: bool = False) -> Answer:
+        """Answers 'what crashes when ...' / 'search ...' from the context index."""
+        terms = tokenize(text)
+        if crash:
+            matches = self.index.search(terms + list(CRASH_TERMS), require=[CRASH_TERMS])
+        else:
+            matches = self.index.search(terms)
+        return Answer('search', [text.strip()], matches=matches)
+    
+    def _answer_crash_search(self, text: str) -> Answer:
+        """Answers 'what crashes when ...'."""
+        return self._answer_search(text, crash=True)
+    
+    def _answer_compatibility(self, mod1: str, mod2: str,
+                              pins: Optional[Dict[str, VersionRange]] = None) -> Answer:
+        """Answers 'are X and Y compatible?', at the versions pinned if any."""
+        chain1, resolved1 = self._lookup(mod1)
+        chain2, resolved2 = self._lookup(mod2)
         
-        if not beacon1 or not beacon2:
-            unknown = 'both' if not beacon1 and not beacon2 else mod1 if not beacon1 else mod2
-            return f"❓ I don't know {unknown}."
+        if not chain1 or not chain2:
+            unknown = [m for m, c in ((mod1, chain1), (mod2, chain2)) if not c]
+            return Answer('compatibility', [mod1, mod2], unknown=unknown)
         
-        conflicts1 = beacon1['tags'].get('CONFLICTS-WITH', [])
-        conflicts2 = beacon2['tags'].get('CONFLICTS-WITH', [])
+        modules = [chain1[0], chain2[0]]
+        resolved = resolved1 + resolved2
+        pins = self._pins(pins)
+        conflicts1, scopes1 = self._direct_conflicts(chain1, pins)
+        conflicts2, scopes2 = self._direct_conflicts(chain2, pins)
         
-        if mod2.lower() in conflicts1 or mod1.lower() in conflicts2:
-            return f"⚠️ {colored('CONFLICT DETECTED', Colors.RED)} between {mod1} and {mod2}!\n   💡 Tip: use separate environments (venv)"
+        if any(w in conflicts1 for w in chain2) or any(w in conflicts2 for w in chain1):
+            # Both sides carry the scopes, mirrored
+            scopes = ([s for s in scopes1 if s[2] in chain2] or
+                      [(b, rb, a, ra) for a, ra, b, rb in scopes2 if b in chain1])
+            return Answer('compatibility', modules, resolved=resolved, conflicts=modules[1:],
+                          scopes=scopes)
         
-        return f"✅ {colored('Compatible', Colors.GREEN)}: {mod1} and {mod2} can coexist."
+        # Conflicts between what each of them pulls in
+        side1 = {*chain1, *self._alias_dependencies(chain1)}
+        side2 = {*chain2, *self._alias_dependencies(chain2)}
+        crossing, scopes = self._versioned_conflicts(
+            [(a, b) for a, b in self._install_pairs(chain1 + chain2)
+             if (a in side1 and b in side2) or (a in side2 and b in side1)], pins)
+        return Answer('compatibility', modules, resolved=resolved, conflict_pairs=crossing,
+                      scopes=scopes)
     
-    def _answer_install(self, module: str) -> str:
-        """Answers 'install X'."""
-        beacon = self.beacons.get(module.lower())
-        
-        lines = [f"📥 Installing {colored(module, Colors.BOLD)}:"]
-        lines.append(f"   $ pip install {module}")
-        
-        if beacon:
-            deps = beacon['tags'].get('DEPENDS-ON', [])
-            if deps:
-                lines.append(f"\n   📋 Will also install: {', '.join(deps)}")
-            
-            conflicts = beacon['tags'].get('CONFLICTS-WITH', [])
-            if conflicts:
-                lines.append(f"\n   ⚠️ {colored('Warning', Colors.YELLOW)}: may conflict with {', '.join(conflicts)}")
-                lines.append("   💡 Tip: check with 'pip list' first")
+    def _answer_install(self, module: str, pins: Optional[Dict[str, VersionRange]] = None) -> Answer:
+        """Answers 'install X', at the version pinned if any."""
+        chain, resolved = self._lookup(module)
+        if not chain:
+            return Answer('install', [module], unknown=[module])
+        pins = self._pins(pins)
+        conflicts, scopes = self._direct_conflicts(chain, pins)
+        conflict_pairs, pair_scopes = self._versioned_conflicts(self._install_pairs(chain), pins)
+        return Answer('install', chain[:1], resolved=resolved,
+                      deps=self._alias_dependencies(chain), conflicts=conflicts,
+                      conflict_pairs=conflict_pairs,
+                      scopes=scopes + [s for s in pair_scopes if s not in scopes])
+    
+    def memory_usage(self) -> Dict[str, Optional[int]]:
+        """
+        Approximate bytes (sys.getsizeof) held in memory per structure;
+        None for sequences still on disk. Beacons of a mapped matrix only
+        count once decoded; cooccurrences are their link arrays.
+        """
+        size = sys.getsizeof
+        beacons = size(self.beacons._beacons) + size(self.beacons._order)
+        contexts = links = 0
+        seen = set()
+        for beacon in self.beacons.loaded():
+            beacons += size(beacon)
+            if beacon.links is not None:
+                links += size(beacon.links)
+            if beacon.tags:
+                beacons += size(beacon.tags) + sum(size(v) for v in beacon.tags.values())
+            held = beacon.contexts
+            if held is not None:
+                if held.__class__ is not str:
+                    contexts += size(held)
+                for text in ([held] if held.__class__ is str else held):
+                    if id(text) not in seen:
+                        seen.add(id(text))
+                        contexts += size(text)
         
-        return '\n'.join(lines)
+        usage = {"beacons": beacons, "contexts": contexts, "cooccurrences": links}
+        if self._pending_tables:
+            usage["sequences"] = None
+        else:
+            table = self._sequences
+            total = size(table)
+            for wid, row in table.items():
+                total += size(row) + _size_of_ints(row) + _size_of_ints(row.values())
+            usage["sequences"] = total + _size_of_ints(table)
+        lexicon = self.lexicon
+        usage["lexicon"] = (size(lexicon.ids) + size(lexicon.words)
+                            + sum(size(word) for word in lexicon.words))
+        return usage
+    
+    def perf_stats(self) -> dict:
+        """Profiler measures (empty without one) and memory_usage(), JSON-ready."""
+        data = self.profiler.to_dict() if self.profiler else {"stages": {}, "answers": {}}
+        return dict(data, memory=self.memory_usage())
+    
+    def perf_report(self) -> str:
+        """perf_stats() as text."""
+        data = self.perf_stats()
+        lines = ["", "⏱️ MARCO PERF", "────────────────────────────"]
+        if data["stages"]:
+            lines.append(f"{'Stage':<28}{'calls':>9}{'total ms':>11}{'µs/call':>9}")
+            for stage, entry in data["stages"].items():
+                calls, seconds = entry["calls"], entry["seconds"]
+                lines.append(f"{stage:<28}{calls:>9}{seconds * 1e3:>11.1f}"
+                             f"{seconds * 1e6 / max(calls, 1):>9.1f}")
+        if data["answers"]:
+            lines.append(f"{'Answers (µs)':<28}{'count':>9}{'p50':>8}{'p95':>8}{'max':>8}")
+            for intent, entry in data["answers"].items():
+                lines.append(f"{intent:<28}{entry['count']:>9}{entry['p50_us']:>8}"
+                             f"{entry['p95_us']:>8}{entry['max_us']:>8}")
+        if not self.profiler:
+            lines.append("No timings: run with --profile to measure learning and answers.")
+        lines.append("Memory (approx.)")
+        for name, n in data["memory"].items():
+            lines.append(f"  {name:<26}{'on disk' if n is None else _format_bytes(n):>11}")
+        return '\n'.join(lines) + '\n'
     
     def stats(self) -> str:
         """Returns statistics."""
-        total_links = sum(len(b.get('links', {})) for b in self.beacons.values())
-        total_tags = sum(
-            sum(len(v) for v in b.get('tags', {}).values())
-            for b in self.beacons.values()
-        )
+        total_links = sum(b.link_count() for b in self.beacons.values())
+        total_tags = sum(b.tag_count() for b in self.beacons.values())
+        cache = self.answers
+        rate = cache.hit_rate()
+        hits = "-" if rate is None else f"{rate:.0%} of {cache.hits + cache.misses}"
         
         return f"""
 📊 MARCO STATS
@@ -498,9 +4818,209 @@ class MarcoMini:
 Beacons (concepts):  {len(self.beacons):>6}
 Links:               {total_links:>6}
 Tags:                {total_tags:>6}
+Contexts indexed:    {len(self.index):>6}
+Answer cache hits:   {hits:>6}
 """
 
 
+def collect_files(paths: List[str]) -> List[str]:
+    """Expands directories (recursively, sorted) into LEARN_EXTENSIONS files."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(names):
+                if not name.startswith('.') and name.lower().endswith(LEARN_EXTENSIONS):
+                    files.append(os.path.join(root, name))
+    return files
+
+
+def _learn_worker(task: Tuple[List[str], Optional[int], Optional[int], bool]) -> Tuple[int, MarcoMini]:
+    """Process-pool worker: learns a group of files into a partial matrix."""
+    files, max_contexts, max_links, profiled = task
+    partial = MarcoMini(max_contexts=max_contexts, max_links=max_links)
+    if profiled:
+        partial.profiler = Profiler()
+    count = sum(partial.learn_file(f) for f in files)
+    return count, partial
+
+
+def _answer_result(marco: MarcoMini, question: str) -> dict:
+    """One answer_many result."""
+    answer = marco.answer(question)
+    return dict({"question": question}, **answer.to_dict(), answer=answer.text(color=False))
+
+
+# Matrix of a query worker process, loaded once by _query_init
+_query_marco: Optional[MarcoMini] = None
+
+
+def _query_init(matrix_file: str):
+    """Process-pool initializer: maps the matrix once per worker."""
+    global _query_marco
+    _query_marco = MarcoMini()
+    _query_marco.load_matrix(matrix_file)
+
+
+def _query_worker(questions: List[str]) -> List[dict]:
+    """Process-pool worker: answers a group of questions."""
+    return [_answer_result(_query_marco, q) for q in questions]
+
+
+# ============================================================================
+# QUERY SERVER
+# ============================================================================
+
+# Protocol: one question per line in, one answer_many result per line out
+# (JSON), for as many questions as the client sends on its connection. A
+# line {"complete": TEXT} asks for completions instead: {"completions": [...]}.
+
+def server_address(matrix_file: Optional[str] = None, address: Optional[str] = None):
+    """
+    Where the query daemon of a matrix listens: address if given
+    ('HOST:PORT', ':PORT' or a socket path), else the Unix socket
+    MATRIX.sock, or localhost:SERVE_PORT without Unix sockets.
+    """
+    if address is None:
+        if sys.platform == 'win32':
+            return ('127.0.0.1', SERVE_PORT)
+        return matrix_path(matrix_file) + '.sock'
+    match = re.fullmatch(r'([\w.-]*):(\d+)', address)
+    if match:
+        return (match.group(1) or '127.0.0.1', int(match.group(2)))
+    return address
+
+
+def _connect(address, timeout: float = SERVE_TIMEOUT) -> socket.socket:
+    import socket
+    family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def ask_server(question: str, address, complete: bool = False) -> Optional[dict]:
+    """
+    The daemon's answer_many result for question (with complete, its
+    completions), or None if no daemon answers.
+    """
+    if isinstance(address, str) and not os.path.exists(address):
+        return None
+    line = json.dumps({"complete": question}) if complete else question.replace('\n', ' ')
+    try:
+        with _connect(address) as sock:
+            sock.sendall(line.encode('utf-8') + b'\n')
+            with sock.makefile('rb') as f:
+                return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+class QueryServer:
+    """
+    Answers questions over a socket from a matrix loaded once (--serve).
+    
+    Clients are served concurrently by asyncio and may send any number of
+    questions per connection. Answers are computed on one worker thread,
+    so the event loop keeps accepting and reading while a question is
+    being answered, but questions are answered one at a time (MarcoMini
+    is not thread-safe). Before each answer the matrix and its delta log
+    are stat()ed, and the matrix is reloaded when either changed.
+    """
+    
+    def __init__(self, matrix_file: Optional[str] = None, address=None):
+        self.matrix_file = matrix_path(matrix_file)
+        self.address = address or server_address(self.matrix_file)
+        if not isinstance(self.address, tuple) and os.path.exists(self.address):
+            try:
+                _connect(self.address, timeout=1).close()
+            except OSError:
+                os.remove(self.address)     # Left behind by a dead daemon
+            else:
+                raise OSError(f"a daemon is already listening on {self.address}")
+        self.marco = MarcoMini()
+        self._signature = None
+        self._worker = None
+        self.reload()
+    
+    def reload(self) -> bool:
+        """Loads the matrix again if it changed on disk; True if it did."""
+        signature = matrix_signature(self.matrix_file)
+        if signature == self._signature:
+            return False
+        marco = MarcoMini()
+        try:
+            marco.load_matrix(self.matrix_file)
+        except (OSError, ValueError, struct.error) as e:
+            # Caught mid-write: keep answering from the previous one
+            print(f"⚠️ Could not reload {self.matrix_file}: {e}", file=sys.stderr)
+            return False
+        marco.profiler = self.marco.profiler
+        self.marco, self._signature = marco, signature
+        return True
+    
+    def _result(self, line: str) -> dict:
+        self.reload()
+        if line.startswith('{'):
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            if isinstance(request, dict) and 'complete' in request:
+                return {"completions": self.marco.complete(str(request['complete']))}
+        return _answer_result(self.marco, line)
+    
+    async def _handle(self, reader, writer):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                question = line.decode('utf-8', 'replace').strip()
+                result = await loop.run_in_executor(self._worker, self._result, question)
+                writer.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _serve(self):
+        import asyncio
+        if isinstance(self.address, tuple):
+            server = await asyncio.start_server(self._handle, *self.address)
+        else:
+            server = await asyncio.start_unix_server(self._handle, self.address)
+        async with server:
+            await server.serve_forever()
+    
+    def serve_forever(self):
+        """Listens until interrupted, then removes its Unix socket."""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        unix = not isinstance(self.address, tuple)
+        self._worker = ThreadPoolExecutor(max_workers=1)
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._worker.shutdown(wait=False)
+            self._worker = None
+            if unix and os.path.exists(self.address):
+                os.remove(self.address)
+
+
 # ============================================================================
 # INTERACTIVE CLI
 # ============================================================================
@@ -529,7 +5049,9 @@ def help_message():
 COMMANDS:
   /help              Show this help
   /stats             Show statistics
+  /stats --perf      Timings and memory (--json for JSON)
   /learn FILE        Learn from a text file
+  /complete TEXT     Suggest how to finish TEXT (or press Tab)
   /save              Save the matrix
   /quit              Quit
 
@@ -537,7 +5059,10 @@ QUESTIONS (in English):
   what is numpy
   what does pytorch depend on
   why does sklearn crash
+  what crashes when scipy is too old
+  search namespace conflict
   are tensorflow and pytorch compatible?
+  what is similar to flask
   install keras
 
 LEARNING (example content):
@@ -549,17 +5074,39 @@ LEARNING (example content):
 """)
 
 
-def interactive():
+def enable_tab_completion(marco: MarcoMini) -> bool:
+    """Completes words with Tab at the prompt, where readline exists."""
+    try:
+        import readline
+    except ImportError:
+        return False
+    matches = []
+    
+    def complete(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_endidx()]
+            found = [] if line.startswith('/') else marco.complete(line)
+            matches[:] = [m for m in found if m.startswith(text.lower())]
+        return matches[state] if state < len(matches) else None
+    
+    readline.set_completer(complete)
+    readline.parse_and_bind('tab: complete')
+    return True
+
+
+def interactive(matrix_file: str = None, profiler: Optional[Profiler] = None) -> MarcoMini:
     """Interactive mode."""
     banner()
     
     marco = MarcoMini()
+    marco.profiler = profiler
     
     # Try to load existing matrix
-    if marco.load_matrix():
+    if marco.load_matrix(matrix_file):
         print(f"📂 Matrix loaded: {len(marco.beacons)} beacons")
     else:
         print(colored("💡 Empty base. Use '/learn file.txt' to learn.", Colors.YELLOW))
+    enable_tab_completion(marco)
     
     while True:
         try:
@@ -584,10 +5131,20 @@ def interactive():
                 help_message()
             
             elif cmd == '/stats':
-                print(marco.stats())
+                options = parts[1].split() if len(parts) > 1 else []
+                if '--perf' not in options:
+                    print(marco.stats())
+                elif '--json' in options:
+                    print(json.dumps(marco.perf_stats(), ensure_ascii=False, indent=2))
+                else:
+                    print(marco.perf_report())
+            
+            elif cmd == '/complete':
+                suggestions = marco.complete(parts[1] if len(parts) > 1 else '')
+                print('   '.join(suggestions) if suggestions else "❓ No suggestion.")
             
             elif cmd == '/save':
-                marco.save_matrix()
+                marco.save_matrix(matrix_file)
                 print("✅ Matrix saved.")
             
             elif cmd == '/learn':
@@ -596,8 +5153,8 @@ def interactive():
                 else:
                     filepath = parts[1].strip('"\'')
                     if os.path.exists(filepath):
-                        count = marco.learn_file(filepath)
-                        marco.save_matrix()
+                        count = marco.learn_files([filepath])
+                        marco.save_matrix(matrix_file)
                         print(f"✅ {count} sentences learned. Matrix saved.")
                     else:
                         print(f"❌ File not found: {filepath}")
@@ -609,34 +5166,215 @@ def interactive():
             # Question
             response = marco.answer(query)
             print(response)
+    
+    marco.save_answers()
+    return marco
 
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
+def take_option(args: List[str], flag: str, default=None):
+    """Removes '--flag VALUE' from args and returns VALUE (or default)."""
+    if flag in args:
+        i = args.index(flag)
+        if i + 1 < len(args):
+            value = args[i + 1]
+            del args[i:i + 2]
+            return value
+        del args[i]
+    return default
+
+
 if __name__ == "__main__":
-    import sys
+    args = sys.argv[1:]
+    max_contexts = take_option(args, '--max-contexts')
+    max_contexts = int(max_contexts) if max_contexts else MAX_CONTEXTS
+    max_links = take_option(args, '--max-links')
+    max_links = int(max_links) if max_links else MAX_LINKS
+    jobs = take_option(args, '--jobs')
+    jobs = int(jobs) if jobs else None
+    matrix_file = take_option(args, '--matrix')
+    address = take_option(args, '--socket')
+    profile_json = take_option(args, '--profile-json')
+    profiler = None
+    if '--profile' in args or profile_json:
+        args = [a for a in args if a != '--profile']
+        profiler = Profiler()
+    marco = None
+    exit_code = 0
     
-    if len(sys.argv) > 1:
+    if args:
         # CLI mode
-        if sys.argv[1] == '--learn' and len(sys.argv) > 2:
-            marco = MarcoMini()
-            count = marco.learn_file(sys.argv[2])
-            marco.save_matrix()
+        if args[0] == '--learn' and len(args) > 1:
+            marco = MarcoMini(max_contexts=max_contexts, max_links=max_links)
+            marco.profiler = profiler
+            count = marco.learn_files(args[1:], jobs=jobs)
+            marco.save_matrix(matrix_file)
             print(f"✅ {count} sentences learned. Matrix saved.")
         
-        elif sys.argv[1] == '--query' and len(sys.argv) > 2:
+        elif args[0] == '--query' and len(args) > 1:
+            question = ' '.join(args[1:])
+            # Fastest first: the saved answers, the daemon, then mapping the matrix here
+            snapshot = snapshot_answer(matrix_path(matrix_file), question) if profiler is None else None
+            result = None if snapshot else ask_server(question, server_address(matrix_file, address))
+            if snapshot is not None:
+                print(snapshot)
+            elif result is not None:
+                print(Answer.from_dict(result))
+            else:
+                # No daemon: answer in-process
+                marco = MarcoMini()
+                marco.profiler = profiler
+                marco.load_matrix(matrix_file)
+                print(marco.answer(question))
+                marco.save_answers()
+        
+        elif args[0] == '--complete':
+            text = ' '.join(args[1:])
+            result = ask_server(text, server_address(matrix_file, address), complete=True)
+            if result is not None:
+                suggestions = result.get('completions', [])
+            else:
+                marco = MarcoMini()
+                marco.profiler = profiler
+                marco.load_matrix(matrix_file)
+                suggestions = marco.complete(text)
+            print('\n'.join(suggestions))
+        
+        elif args[0] == '--serve':
+            try:
+                server = QueryServer(matrix_file, server_address(matrix_file, address))
+                marco = server.marco
+                marco.profiler = profiler
+                where = server.address if isinstance(server.address, str) else '%s:%d' % server.address
+                print(f"🧠 {len(server.marco.beacons)} beacons, answering on {where} (Ctrl+C to stop)")
+                server.serve_forever()
+                marco = server.marco
+                marco.save_answers()
+            except OSError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+        
+        elif args[0] == '--query-file' and len(args) > 1:
+            marco = MarcoMini()
+            marco.profiler = profiler
+            marco.load_matrix(matrix_file)
+            with open_text(args[1]) as f:
+                questions = [line for line in f
+                             if line.strip() and not line.lstrip().startswith('#')]
+            for result in marco.answer_many(questions, jobs=jobs):
+                print(json.dumps(result, ensure_ascii=False))
+            marco.save_answers()
+        
+        elif args[0] == '--check' and len(args) > 1:
+            as_json = '--json' in args
+            marco = MarcoMini()
+            marco.profiler = profiler
+            marco.load_matrix(matrix_file)
+            requirements = []
+            for path in (a for a in args[1:] if a != '--json'):
+                requirements.extend(parse_requirements(path))
+            report = marco.check_requirements(requirements)
+            print(report.json() if as_json else report)
+            if not report.ok:
+                exit_code = 1
+        
+        elif args[0] == '--check-env':
+            marco = MarcoMini()
+            marco.profiler = profiler
+            marco.load_matrix(matrix_file)
+            distributions = scan_environment(cache_file=matrix_path(matrix_file) + '.env',
+                                             jobs=jobs or ENV_SCAN_JOBS)
+            learn = '--learn' in args
+            report = marco.check_environment(distributions, learn=learn)
+            print(report.json() if '--json' in args else report)
+            if learn:
+                marco.save_matrix(matrix_file)
+                if '--json' not in args:
+                    print(f"✅ Dependencies of {len(distributions)} distributions learned. Matrix saved.")
+            if not report.ok:
+                exit_code = 1
+        
+        elif args[0] == '--compact':
+            stopwords = take_option(args, '--stopwords')
+            min_activations = take_option(args, '--min-activations')
             marco = MarcoMini()
-            marco.load_matrix()
-            question = ' '.join(sys.argv[2:])
-            print(marco.answer(question))
+            marco.profiler = profiler
+            path = matrix_path(matrix_file)
+            if not marco.load_matrix(path):
+                print(f"❌ File not found: {path}")
+                sys.exit(1)
+            
+            def disk_size() -> int:
+                return sum(os.path.getsize(f) for f in (path, path + '.delta') if os.path.exists(f))
+            
+            size = disk_size()
+            if stopwords:
+                with open_text(stopwords) as f:
+                    stopwords = f.read().lower().split()
+            changes = marco.compact(COMPACT_STOPWORDS if stopwords is None else stopwords,
+                                    int(min_activations) if min_activations else COMPACT_MIN_ACTIVATIONS,
+                                    max_links if max_links is not None else COMPACT_MAX_LINKS)
+            marco.save_matrix(path, full=True)
+            changes["bytes"] = (size, disk_size())
+            if '--json' in args:
+                print(json.dumps(changes))
+            else:
+                print(f"🧹 {path} compacted")
+                for what, (before, after) in changes.items():
+                    print(f"   {what:<10}{before:>14,} → {after:>14,}  (-{before - after:,})")
+        
+        elif args[0] == '--startup-bench':
+            runs = take_option(args, '--runs')
+            question = ' '.join(a for a in args[1:] if a != '--json') or 'install numpy'
+            times = startup_bench(matrix_path(matrix_file), question,
+                                  int(runs) if runs else STARTUP_RUNS)
+            print(json.dumps(times) if '--json' in args else startup_report(times))
+        
+        elif args[0] == '--convert' and len(args) > 2:
+            marco = MarcoMini()
+            if not marco.load_matrix(args[1]):
+                print(f"❌ File not found: {args[1]}")
+            else:
+                marco.save_matrix(args[2])
+                print(f"✅ {len(marco.beacons)} beacons written to {args[2]}.")
         
         else:
             print("Usage:")
             print("  python marco_deps.py                    # Interactive")
-            print("  python marco_deps.py --learn FILE       # Learn")
-            print("  python marco_deps.py --query 'question' # Query")
+            print("  python marco_deps.py --learn FILE|DIR.. # Learn (.gz/.bz2/.xz, - = stdin)")
+            print("  python marco_deps.py --query 'question' # Query (through the daemon if one runs)")
+            print("  python marco_deps.py --serve            # Daemon: matrix loaded once, reloaded on change")
+            print("  python marco_deps.py --complete 'text'  # Words to finish or continue text with")
+            print("  python marco_deps.py --query-file FILE   # One question per line (- = stdin), JSON lines out")
+            print("  python marco_deps.py --check FILE [--json] # Check requirements.txt / pyproject.toml")
+            print("  python marco_deps.py --check-env [--learn] # Check installed packages (--learn: their deps)")
+            print("  python marco_deps.py --convert SRC DST  # Convert matrix (.json <-> binary)")
+            print("  python marco_deps.py --compact [--json] # Prune the matrix (see the options below)")
+            print("  python marco_deps.py --startup-bench [--runs N] [--json] [question]  # Startup times")
+            print()
+            print("Options:")
+            print("  --matrix PATH      Matrix file (default: marco_deps_matrix.mbin)")
+            print("  --socket ADDR      Daemon socket path or HOST:PORT (default: MATRIX.sock)")
+            print("  --max-contexts N   Keep only the N most recent contexts per beacon")
+            print("  --max-links N      Keep only about the N most frequent links per beacon")
+            print("                     (--learn: which ones may differ with --jobs)")
+            print(f"                     (--compact: exactly N, default {COMPACT_MAX_LINKS})")
+            print("  --stopwords FILE   Words whose beacons --compact drops (default: built in)")
+            print(f"  --min-activations N  --compact drops words seen fewer times (default {COMPACT_MIN_ACTIVATIONS})")
+            print("  --jobs N           Worker processes for --learn (default: all cores)")
+            print("                     and --query-file (default: none), threads for --check-env")
+            print("  --profile          Print stage timings, answer latencies and memory (stderr)")
+            print("  --profile-json F   Write them to F as JSON")
     else:
         # Interactive mode
-        interactive()
+        marco = interactive(matrix_file, profiler)
+    
+    if profiler is not None and marco is not None:
+        print(marco.perf_report(), file=sys.stderr)
+        if profile_json:
+            with open(profile_json, 'w', encoding='utf-8') as f:
+                json.dump(marco.perf_stats(), f, ensure_ascii=False, indent=2)
+    sys.exit(exit_code)
@@ -0,0 +1,992 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Behavior tests for marco_deps, one section per feature. Standard
+library only; learning tests run on the bundled knowledge files.
+
+USAGE:
+    python -m unittest discover tests
+    python -m pytest tests
+"""
+
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from marco_deps import (Answer, ContextIndex, FR_INTENT_RULES, INTENT_RULES,  # noqa: E402
+                        IntentRouter, is_binary_matrix, iter_sentences, Lexicon, MarcoMini,
+                        open_text, parse_requirement, parse_requirements, pattern_pack,
+                        _poetry_specifiers, scan_environment, SentenceSplitter,
+                        snapshot_answer, split_version_scopes, VersionRange)
+
+KNOWLEDGE = [os.path.join(ROOT, 'knowledge', name)
+             for name in ('DEPS_EN.txt', 'DEPS_FR.txt', 'DEPS_MULTI.txt')]
+
+
+def state(marco: MarcoMini) -> str:
+    """Everything marco knows, comparable across save formats."""
+    return json.dumps(marco._state(), ensure_ascii=False, sort_keys=True)
+
+
+def learned(paths, **options) -> MarcoMini:
+    marco = MarcoMini(**options)
+    for path in paths:
+        marco.learn_file(path)
+    return marco
+
+
+def taught(*sentences, **options) -> MarcoMini:
+    """A MarcoMini that learned sentences."""
+    marco = MarcoMini(**options)
+    for sentence in sentences:
+        marco.learn_sentence(sentence)
+    return marco
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='marco-test-')
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+    
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+
+# ============================================================================
+# STREAMING INPUT
+# ============================================================================
+
+TEXT = """numpy stable version is 1.24. pandas
+depends on numpy! Does scipy crash?
+
+a sentence cut by a blank line
+# a comment. It is dropped
+scikit-learn is a module for machine learning.
+numpy的稳定版本是1.24。完成
+"""
+
+SENTENCES = [
+    "numpy stable version is 1.24", "pandas depends on numpy", "Does scipy crash",
+    "a sentence cut by a blank line", "scikit-learn is a module for machine learning",
+    "numpy的稳定版本是1.24", "完成",
+]
+
+
+class StreamingInputTest(TempDirTestCase):
+
+    def test_sentences(self):
+        self.assertEqual(list(iter_sentences(io.StringIO(TEXT))), SENTENCES)
+    
+    def test_chunk_boundaries(self):
+        for chunk_size in range(1, 40):
+            self.assertEqual(list(iter_sentences(io.StringIO(TEXT), chunk_size)), SENTENCES,
+                             chunk_size)
+    
+    def test_long_lines(self):
+        # A line longer than a chunk stays whole...
+        line = "x" * 500 + " tail. next"
+        self.assertEqual(list(iter_sentences(io.StringIO(line), 16)), ["x" * 500 + " tail", "next"])
+        # ...up to max_length
+        splitter = SentenceSplitter(max_length=20)
+        sentences = splitter.feed("word " * 20) + splitter.flush()
+        self.assertEqual([len(s) for s in sentences], [20])
+    
+    def test_compressed_files(self):
+        for name, opener in (('t.txt', open), ('t.txt.gz', gzip.open),
+                             ('t.txt.bz2', bz2.open), ('t.txt.xz', lzma.open)):
+            with opener(self.path(name), 'wt', encoding='utf-8') as f:
+                f.write(TEXT)
+            with open_text(self.path(name)) as f:
+                self.assertEqual(list(iter_sentences(f)), SENTENCES, name)
+    
+    def test_learn_file_is_chunk_independent(self):
+        with open(self.path('t.txt'), 'w', encoding='utf-8') as f:
+            f.write(TEXT * 3)
+        whole = MarcoMini()
+        self.assertEqual(whole.learn_file(self.path('t.txt')),
+                         len(list(iter_sentences(io.StringIO(TEXT * 3)))))
+        small = MarcoMini()
+        small.learn_file(self.path('t.txt'), chunk_size=7)
+        self.assertEqual(state(small), state(whole))
+
+
+# ============================================================================
+# PARALLEL LEARNING
+# ============================================================================
+
+class ParallelLearningTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The knowledge files cut into many small ones, in learning order
+        lines = []
+        for path in KNOWLEDGE:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines.extend(f)
+        self.corpus = self.path('corpus')
+        os.mkdir(self.corpus)
+        for i in range(0, len(lines), 7):
+            with open(os.path.join(self.corpus, f'{i:05d}.txt'), 'w', encoding='utf-8') as f:
+                f.writelines(lines[i:i + 7])
+    
+    def learn(self, jobs: int, **options) -> MarcoMini:
+        marco = MarcoMini(**options)
+        marco.learn_files([self.corpus], jobs=jobs)
+        return marco
+    
+    def test_same_as_serial(self):
+        serial = self.learn(1)
+        self.assertEqual(state(self.learn(3)), state(serial))
+        self.assertEqual(state(serial), state(learned(KNOWLEDGE)))
+    
+    def test_same_as_serial_with_max_contexts(self):
+        serial = self.learn(1, max_contexts=2)
+        parallel = self.learn(3, max_contexts=2)
+        self.assertEqual(state(parallel), state(serial))
+        self.assertEqual(parallel.index.search(["numpy"]), serial.index.search(["numpy"]))
+    
+    def test_merge(self):
+        first, second = learned(KNOWLEDGE[:1]), learned(KNOWLEDGE[1:])
+        first.merge(second)
+        self.assertEqual(state(first), state(learned(KNOWLEDGE)))
+
+
+# ============================================================================
+# SAVING AND LOADING
+# ============================================================================
+
+QUESTIONS = [
+    "what is numpy", "what does pandas depend on", "who uses numpy",
+    "why does sklearn crash", "what is scikitlearn", "search gpu conflict",
+    "are tensorflow and pytorch compatible?", "what is similar to flask",
+    "install keras", "c'est quoi numpy", "hello there",
+]
+
+
+def answers(marco: MarcoMini) -> list:
+    return [str(marco.answer(q)) for q in QUESTIONS]
+
+
+class MatrixRoundTripTest(TempDirTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = learned(KNOWLEDGE)
+    
+    def reload(self, name: str) -> MarcoMini:
+        self.reference.save_matrix(self.path(name))
+        marco = MarcoMini()
+        self.assertTrue(marco.load_matrix(self.path(name)))
+        return marco
+    
+    def test_binary_round_trip(self):
+        marco = self.reload('m.mbin')
+        self.assertTrue(is_binary_matrix(self.path('m.mbin')))
+        self.assertEqual(state(marco), state(self.reference))
+        self.assertEqual(answers(marco), answers(self.reference))
+    
+    def test_json_round_trip(self):
+        marco = self.reload('m.json')
+        self.assertFalse(is_binary_matrix(self.path('m.json')))
+        self.assertEqual(state(marco), state(self.reference))
+        self.assertEqual(answers(marco), answers(self.reference))
+    
+    def test_binary_to_json(self):
+        binary = self.reload('m.mbin')
+        binary.save_matrix(self.path('m.json'))
+        marco = MarcoMini()
+        marco.load_matrix(self.path('m.json'))
+        self.assertEqual(state(marco), state(self.reference))
+    
+    def test_missing_matrix(self):
+        self.assertFalse(MarcoMini().load_matrix(self.path('none.mbin')))
+
+
+# Small enough to be appended to the delta log rather than rewrite the matrix
+EXTRA = [
+    "attrs is a module for classes. cattrs depends on attrs.",
+    "zope.interface is a module for interfaces. twisted depends on zope.interface.",
+]
+
+
+class DeltaLogTest(TempDirTestCase):
+
+    def test_appended_and_replayed(self):
+        matrix = self.path('m.mbin')
+        learned(KNOWLEDGE).save_matrix(matrix)
+        extra = []
+        for i, text in enumerate(EXTRA):
+            extra.append(self.path(f'extra{i}.txt'))
+            with open(extra[-1], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            marco = MarcoMini()
+            marco.load_matrix(matrix)
+            marco.learn_files(extra[-1:])
+            size = os.path.getsize(matrix)
+            marco.save_matrix(matrix)
+            self.assertEqual(os.path.getsize(matrix), size)
+            self.assertTrue(os.path.exists(matrix + '.delta'))
+        marco = MarcoMini()
+        marco.load_matrix(matrix)
+        expected = learned(KNOWLEDGE + extra)
+        self.assertEqual(state(marco), state(expected))
+        self.assertEqual(answers(marco), answers(expected))
+    
+    def test_full_save_drops_delta_log(self):
+        matrix = self.path('m.mbin')
+        learned(KNOWLEDGE[:1]).save_matrix(matrix)
+        marco = MarcoMini()
+        marco.load_matrix(matrix)
+        marco.learn_files(KNOWLEDGE[1:])
+        marco.save_matrix(matrix, full=True)
+        self.assertFalse(os.path.exists(matrix + '.delta'))
+        marco = MarcoMini()
+        marco.load_matrix(matrix)
+        self.assertEqual(state(marco), state(learned(KNOWLEDGE)))
+    
+    def test_log_of_another_matrix_is_ignored(self):
+        matrix = self.path('m.mbin')
+        learned(KNOWLEDGE[:1]).save_matrix(matrix)
+        marco = MarcoMini()
+        marco.load_matrix(matrix)
+        with open(self.path('extra.txt'), 'w', encoding='utf-8') as f:
+            f.write(EXTRA[0] + '\n')
+        marco.learn_files([self.path('extra.txt')])
+        marco.save_matrix(matrix)
+        with open(matrix + '.delta', 'rb') as f:
+            log = f.read()
+        # A full rewrite gives the matrix a new id: the old log no longer applies
+        learned(KNOWLEDGE[:1]).save_matrix(matrix)
+        with open(matrix + '.delta', 'wb') as f:
+            f.write(log)
+        marco = MarcoMini()
+        marco.load_matrix(matrix)
+        self.assertEqual(state(marco), state(learned(KNOWLEDGE[:1])))
+
+
+# ============================================================================
+# DEPENDENCIES
+# ============================================================================
+
+class DependencyGraphTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.marco = taught("flask depends on werkzeug", "flask depends on jinja2",
+                            "jinja2 depends on markupsafe", "werkzeug depends on markupsafe",
+                            "alpha depends on beta", "beta depends on gamma",
+                            "gamma depends on alpha", "gamma depends on delta",
+                            "myapp depends on flask", "myapp depends on django",
+                            "django and jinja2 have a conflict")
+    
+    def test_closure(self):
+        # Direct dependencies first, each one once
+        self.assertEqual(self.marco.all_dependencies("flask"), ["werkzeug", "jinja2", "markupsafe"])
+        self.assertEqual(self.marco.all_dependencies("markupsafe"), [])
+        self.assertEqual(self.marco.all_dependencies("unknown"), [])
+    
+    def test_cycles(self):
+        self.assertEqual(set(self.marco.dependency_cycle("beta")), {"alpha", "beta", "gamma"})
+        self.assertEqual(set(self.marco.all_dependencies("alpha")), {"beta", "gamma", "delta"})
+        self.assertEqual(self.marco.dependency_cycle("flask"), [])
+        self.assertEqual(self.marco.dependency_cycle("delta"), [])
+    
+    def test_self_dependency_is_a_cycle(self):
+        marco = taught("ouroboros depends on ouroboros")
+        self.assertEqual(marco.dependency_cycle("ouroboros"), ["ouroboros"])
+    
+    def test_new_edges_invalidate_ancestors(self):
+        self.assertNotIn("six", self.marco.all_dependencies("myapp"))
+        self.marco.learn_sentence("markupsafe depends on six")
+        self.assertIn("six", self.marco.all_dependencies("flask"))
+        self.assertIn("six", self.marco.all_dependencies("myapp"))
+        # Closing the cycle through delta pulls its members into it
+        self.marco.learn_sentence("delta depends on beta")
+        self.assertEqual(set(self.marco.dependency_cycle("delta")), {"alpha", "beta", "gamma", "delta"})
+    
+    def test_install_conflicts(self):
+        # The conflict is between two things myapp pulls in
+        self.assertEqual(self.marco.install_conflicts(["myapp"]), [("django", "jinja2")])
+        self.assertEqual(self.marco.install_conflicts(["flask"]), [])
+        self.assertEqual(self.marco.install_conflicts(["flask", "django"]), [("django", "jinja2")])
+    
+    def test_conflicts_without_the_index(self):
+        # Small install sets in a big matrix are checked beacon by beacon
+        for i in range(100):
+            self.marco.learn_sentence(f"filler{i} and word{i} were seen together")
+        self.assertEqual(self.marco.install_conflicts(["flask", "django"]), [("django", "jinja2")])
+        self.assertIsNone(self.marco.graph._conflicts)
+    
+    def test_after_reload(self):
+        # A mapped matrix has not interned the saved words yet
+        self.marco.save_matrix(self.path('m.mbin'))
+        for check in (lambda m: m.all_dependencies("flask"), lambda m: m.dependency_cycle("beta"),
+                      lambda m: m.install_conflicts(["myapp"])):
+            marco = MarcoMini()
+            marco.load_matrix(self.path('m.mbin'))
+            self.assertEqual(check(marco), check(self.marco))
+
+
+# ============================================================================
+# BATCH QUERIES
+# ============================================================================
+
+class AnswerManyTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.matrix = self.path('m.mbin')
+        learned(KNOWLEDGE).save_matrix(self.matrix)
+    
+    def loaded(self) -> MarcoMini:
+        marco = MarcoMini()
+        marco.load_matrix(self.matrix)
+        return marco
+    
+    def test_results(self):
+        results = self.loaded().answer_many(["  what is numpy\n", "hello there"])
+        self.assertEqual([r["question"] for r in results], ["what is numpy", "hello there"])
+        self.assertEqual(results[0]["intent"], "what-is")
+        self.assertEqual(results[0]["answer"], self.loaded().answer("what is numpy").text(color=False))
+        self.assertNotIn("\033[", results[0]["answer"])
+    
+    def test_workers_answer_in_order(self):
+        questions = QUESTIONS * 3
+        serial = self.loaded().answer_many(questions)
+        self.assertEqual(self.loaded().answer_many(questions, jobs=2), serial)
+        self.assertEqual([r["question"] for r in serial], questions)
+    
+    def test_changed_matrix_answers_in_process(self):
+        # Workers would map the file, which no longer holds what marco knows
+        marco = self.loaded()
+        marco.learn_sentence("newmod is a module for tests")
+        results = marco.answer_many(["what is newmod", "what is numpy"], jobs=2)
+        self.assertEqual(results[0]["modules"], ["newmod"])
+        self.assertNotIn("unknown", results[0])
+    
+    def test_query_file(self):
+        with open(self.path('questions.txt'), 'w', encoding='utf-8') as f:
+            f.write("# a comment\nwhat is numpy\n\nwho uses numpy\n")
+        output = subprocess.run([sys.executable, os.path.join(ROOT, 'marco_deps.py'),
+                                 '--matrix', self.matrix, '--query-file', self.path('questions.txt')],
+                                capture_output=True, text=True, check=True).stdout
+        results = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(results, self.loaded().answer_many(["what is numpy", "who uses numpy"]))
+
+
+# ============================================================================
+# ANSWERS
+# ============================================================================
+
+class AnswerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.marco = learned(KNOWLEDGE)
+    
+    def test_dict_round_trip(self):
+        for question in QUESTIONS + ["what crashes when scipy is too old", "install pandas"]:
+            answer = self.marco.answer(question)
+            data = json.loads(answer.json())
+            self.assertEqual(data, answer.to_dict(), question)
+            again = Answer.from_dict(data)
+            self.assertEqual(again, answer, question)
+            self.assertEqual(again.text(color=False), answer.text(color=False), question)
+            self.assertEqual(again.text(color=True), answer.text(color=True), question)
+    
+    def test_fields(self):
+        answer = Answer('what-is', ['numpy'], is_a=['module'], deps=[])
+        self.assertEqual(answer.to_dict(), {"intent": "what-is", "modules": ["numpy"], "is_a": ["module"]})
+        self.assertIn("NUMPY", answer.text(color=False))
+        with self.assertRaises(TypeError):
+            Answer('what-is', ['numpy'], color='red')
+    
+    def test_colors(self):
+        answer = Answer('what-is', ['numpy'], conflicts=['tensorflow'])
+        self.assertIn("\033[", answer.text(color=True))
+        self.assertNotIn("\033[", answer.text(color=False))
+    
+    def test_compatibility(self):
+        conflict = Answer('compatibility', ['tensorflow', 'pytorch'], conflicts=['pytorch'])
+        self.assertFalse(conflict.compatible)
+        self.assertIs(conflict.to_dict()["compatible"], False)
+        self.assertTrue(Answer('compatibility', ['flask', 'numpy']).compatible)
+        self.assertIsNone(Answer('what-is', ['numpy']).compatible)
+
+
+# ============================================================================
+# REQUIREMENTS FILES
+# ============================================================================
+
+class RequirementsTest(TempDirTestCase):
+
+    def write(self, name: str, text: str) -> str:
+        with open(self.path(name), 'w', encoding='utf-8') as f:
+            f.write(text)
+        return self.path(name)
+    
+    def test_requirement_lines(self):
+        self.assertEqual(parse_requirement("numpy>=1.20,<2"), ("numpy", [(">=", "1.20"), ("<", "2")]))
+        self.assertEqual(parse_requirement("requests[security] == 2.31 ; python_version > '3'"),
+                         ("requests", [("==", "2.31")]))
+        self.assertEqual(parse_requirement("flask @ https://example.com/flask.tar.gz"), ("flask", []))
+        self.assertEqual(parse_requirement("zope.interface  # pinned below"), ("zope.interface", []))
+        for line in ("", "# comment", "--index-url https://example.com", "-r other.txt"):
+            self.assertIsNone(parse_requirement(line), line)
+    
+    def test_url_and_vcs_lines(self):
+        self.assertEqual(parse_requirement("git+https://github.com/psf/requests.git#egg=requests"),
+                         ("requests", []))
+        editable = "-e git+https://github.com/a/b.git@v1#egg=flask_login&subdirectory=x"
+        self.assertEqual(parse_requirement(editable), ("flask_login", []))
+        wheel = "https://example.com/whl/torch-2.0.1%2Bcu118-cp311-cp311-linux_x86_64.whl"
+        self.assertEqual(parse_requirement(wheel), ("torch", [("==", "2.0.1+cu118")]))
+        self.assertEqual(parse_requirement("./dist/my_pkg-1.2.3.tar.gz"), ("my_pkg", [("==", "1.2.3")]))
+        # Nothing says which package these install
+        for line in ("https://example.com/thing.git", "git+ssh://git@host/repo.git", "--editable=./pkg"):
+            self.assertIsNone(parse_requirement(line), line)
+    
+    def test_requirements_file(self):
+        self.write('base.txt', "numpy>=1.20\n")
+        path = self.write('requirements.txt', "-r base.txt\n"
+                                              "pandas \\\n    >=1.5\n"
+                                              "git+https://github.com/psf/requests.git#egg=requests\n"
+                                              "https://example.com/thing.git\n")
+        self.assertEqual(parse_requirements(path),
+                         [("numpy", [(">=", "1.20")]), ("pandas", [(">=", "1.5")]), ("requests", [])])
+    
+    def test_url_lines_are_not_unknown_packages(self):
+        marco = taught("requests is a module for http", "git is a tool")
+        path = self.write('requirements.txt', "git+https://github.com/psf/requests.git#egg=requests\n"
+                                              "https://example.com/whl/torch-2.0-cp311-none-any.whl\n")
+        answer = marco.check_requirements(parse_requirements(path))
+        self.assertEqual(answer.modules, ["requests", "torch"])
+        self.assertEqual(answer.unknown, ["torch"])
+    
+    def test_poetry_caret_and_tilde(self):
+        self.assertEqual(_poetry_specifiers("^1.2"), [(">=", "1.2"), ("<", "2.0")])
+        self.assertEqual(_poetry_specifiers("^0.2.3"), [(">=", "0.2.3"), ("<", "0.3.0")])
+        self.assertEqual(_poetry_specifiers("^0.0"), [(">=", "0.0"), ("<", "0.1")])
+        self.assertEqual(_poetry_specifiers("~1.2.3"), [(">=", "1.2.3"), ("<", "1.3.0")])
+        self.assertEqual(_poetry_specifiers("~1"), [(">=", "1"), ("<", "2")])
+        self.assertEqual(_poetry_specifiers("~=1.4.2"), [("~=", "1.4.2")])
+    
+    def test_poetry_plain_constraints(self):
+        self.assertEqual(_poetry_specifiers("1.2.3"), [("==", "1.2.3")])
+        self.assertEqual(_poetry_specifiers(">= 1.2, < 1.5"), [(">=", "1.2"), ("<", "1.5")])
+        self.assertEqual(_poetry_specifiers(">=1.2 <1.5"), [(">=", "1.2"), ("<", "1.5")])
+        self.assertEqual(_poetry_specifiers("*"), [])
+    
+    def test_poetry_alternatives(self):
+        # The range spanning them: 2.x is not out of range
+        self.assertEqual(_poetry_specifiers("^1.2 || ^2.0"), [(">=", "1.2"), ("<", "3")])
+        self.assertEqual(_poetry_specifiers("^1.2 || >=3"), [(">=", "1.2")])
+    
+    def test_poetry_tables_and_lists(self):
+        self.assertEqual(_poetry_specifiers({"version": "^2.0", "optional": True}),
+                         [(">=", "2.0"), ("<", "3.0")])
+        self.assertEqual(_poetry_specifiers([{"version": "^1.2", "python": "<3.8"},
+                                             {"version": "^2.0", "python": ">=3.8"}]),
+                         [(">=", "1.2"), ("<", "3")])
+        self.assertEqual(_poetry_specifiers({"git": "https://github.com/psf/requests.git"}), [])
+    
+    def test_pyproject(self):
+        path = self.write('pyproject.toml', '[project]\n'
+                                            'dependencies = ["numpy>=1.20"]\n'
+                                            '[tool.poetry.dependencies]\n'
+                                            'python = "^3.9"\n'
+                                            'pandas = "^1.5 || ^2.0"\n'
+                                            'scipy = [{version = "^1.9", python = "<3.12"},'
+                                            ' {version = "^1.11", python = ">=3.12"}]\n')
+        self.assertEqual(parse_requirements(path),
+                         [("numpy", [(">=", "1.20")]), ("pandas", [(">=", "1.5"), ("<", "3")]),
+                          ("scipy", [(">=", "1.9"), ("<", "2")])])
+
+
+# ============================================================================
+# CONTEXT SEARCH
+# ============================================================================
+
+class ContextIndexTest(TempDirTestCase):
+
+    def index(self, *docs) -> ContextIndex:
+        index = ContextIndex(Lexicon())
+        for doc in docs:
+            index.add(*doc) if isinstance(doc, tuple) else index.add(doc)
+        return index
+    
+    def test_ranking(self):
+        index = self.index("numpy crashes on gpu", "numpy is fast", "numpy numpy numpy",
+                           "pandas reads csv")
+        # The rarer term decides; then term frequency, shorter documents, earlier ones
+        self.assertEqual(index.search(["numpy", "gpu"])[0], "numpy crashes on gpu")
+        self.assertEqual(index.search(["numpy"])[0], "numpy numpy numpy")
+        self.assertEqual(index.search(["csv"]), ["pandas reads csv"])
+        self.assertEqual(index.search(["missing"]), [])
+        self.assertEqual(len(index.search(["numpy"], limit=2)), 2)
+    
+    def test_required_terms(self):
+        index = self.index("numpy crashes on gpu", "numpy is fast on gpu", "scipy fails on gpu")
+        self.assertEqual(index.search(["gpu"], require=[("crashes", "fails")]),
+                         ["numpy crashes on gpu", "scipy fails on gpu"])
+        self.assertEqual(index.search(["gpu"], require=[("crashes",), ("scipy",)]), [])
+    
+    def test_documents_are_indexed_once(self):
+        index = self.index("numpy is fast", "numpy is fast", ("crashes: no blas", "scipy"),
+                           ("crashes: no blas", "numpy"))
+        self.assertEqual(len(index), 3)
+        # One text owned by two modules is one result
+        self.assertEqual(index.search(["blas"]), ["crashes: no blas"])
+    
+    def test_search_after_reload(self):
+        reference = learned(KNOWLEDGE)
+        reference.save_matrix(self.path('m.mbin'))
+        marco = MarcoMini()
+        marco.load_matrix(self.path('m.mbin'))
+        self.assertIn('CIDX', marco.index.matrix.sections)
+        for terms in (["gpu"], ["numpy", "version"], ["crash", "scipy"], ["conflit"]):
+            self.assertEqual(marco.index.search(terms), reference.index.search(terms), terms)
+        # Saved and new documents are searched together
+        marco.learn_sentence("numpy crashes on a quantum gpu")
+        reference.learn_sentence("numpy crashes on a quantum gpu")
+        self.assertEqual(marco.index.search(["quantum", "gpu"]), reference.index.search(["quantum", "gpu"]))
+    
+    def test_capped_with_max_contexts(self):
+        with unittest.mock.patch('marco_deps.INDEX_TRIM_MIN', 8):
+            marco = MarcoMini(max_contexts=1)
+            for i in range(300):
+                marco.learn_sentence(f"alpha beta gamma sentence{i % 3} number {i}")
+            held = {c for b in marco.beacons.loaded() for c in b.context_list()}
+            self.assertLess(len(marco.index), 2 * max(len(held), 8) + 1)
+            # What the beacons still hold can still be found
+            self.assertLessEqual(held, set(marco.index.search(["alpha"], limit=len(marco.index))))
+
+
+# ============================================================================
+# INTENT ROUTING
+# ============================================================================
+
+def cascade_route(rules, question):
+    """Every pattern of every rule in order, first match wins (re.search)."""
+    for intent, _triggers, patterns in rules:
+        for pattern in patterns:
+            match = re.search(pattern, question)
+            if match:
+                return intent, match.groupdict()
+    return None, {}
+
+
+class IntentRouterTest(unittest.TestCase):
+
+    MODULES = ["numpy", "pandas", "scikit-learn", "torch", "zope.interface", "flask"]
+    
+    TEMPLATES = ["what is {a}", "tell me about {a}", "what does {a} depend on",
+                 "dependencies of {a}", "who uses {a}", "why does {a} crash",
+                 "{a} doesn't work", "what crashes when {a} is too old", "search {a} gpu",
+                 "are {a} and {b} compatible?", "can i use {a} with {b}", "{a} works with {b}?",
+                 "install {a}", "i want to install {a}", "what is similar to {a}",
+                 "hello there", "{a} {b}", "what is {a} and does it work with {b}?",
+                 "why does {a} crash with {b}?"]
+    
+    def check(self, rules, templates):
+        router = IntentRouter(rules)
+        rng = random.Random(7)
+        for _ in range(2000):
+            q = rng.choice(templates).format(a=rng.choice(self.MODULES), b=rng.choice(self.MODULES))
+            self.assertEqual(router.route(q), cascade_route(rules, q), q)
+    
+    def test_same_as_cascade(self):
+        self.check(INTENT_RULES, self.TEMPLATES)
+    
+    def test_slots(self):
+        router = IntentRouter(INTENT_RULES)
+        self.assertEqual(router.route("what is numpy"), ("what-is", {"module": "numpy"}))
+        self.assertEqual(router.route("are numpy and torch compatible?"),
+                         ("compatibility", {"mod1": "numpy", "mod2": "torch"}))
+        self.assertEqual(router.route("hello there"), (None, {}))
+
+
+# ============================================================================
+# TYPO-TOLERANT NAMES
+# ============================================================================
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.marco = taught("flask depends on werkzeug",
+                            "scikit-learn is a module for machine learning")
+    
+    def test_lookup(self):
+        names = self.marco.names
+        self.assertEqual(names.lookup("flsk"), [(1, "flask")])
+        self.assertEqual(names.lookup("flask"), [(0, "flask")])
+        # Short names are not guessed at
+        self.assertEqual(names.lookup("fl"), [])
+        self.assertEqual(names.lookup("zzzzzz"), [])
+    
+    def test_joined_names(self):
+        names = self.marco.names
+        self.assertEqual(names.lookup("scikitlearn"), [(0, "scikit-learn")])
+        self.assertEqual(names.lookup("scikitlaern"), [(1, "scikit-learn")])
+        answer = self.marco.answer("what is scikitlearn")
+        self.assertEqual(answer.modules, ["scikit-learn"])
+    
+    def test_guess_module(self):
+        self.assertEqual(self.marco.guess_module("werkzueg"), "werkzeug")
+        self.assertIsNone(self.marco.guess_module("zzzzzz"))
+        # Same edits: the module wins over a plain word
+        self.marco.learn_sentence("pandaa were seen here")
+        self.marco.learn_sentence("pandas is a module")
+        self.assertEqual(self.marco.guess_module("panda"), "pandas")
+    
+    def test_new_words_are_found(self):
+        self.assertIsNone(self.marco.guess_module("newthng"))
+        self.marco.learn_sentence("newthing is a module")
+        self.assertEqual(self.marco.guess_module("newthng"), "newthing")
+
+
+# ============================================================================
+# FRENCH QUESTIONS
+# ============================================================================
+
+class FrenchIntentRouterTest(unittest.TestCase):
+
+    TEMPLATES = ["c'est quoi {a}", "qu'est-ce que {a}", "{a} dépend de quoi",
+                 "qui utilise {a}", "pourquoi {a} plante", "{a} ne marche pas",
+                 "similaire à {a}", "bonjour", "pourquoi {a} plante avec {b} ?"]
+    
+    def test_same_as_cascade(self):
+        router = IntentRouter(FR_INTENT_RULES)
+        modules = IntentRouterTest.MODULES
+        rng = random.Random(7)
+        for _ in range(2000):
+            q = rng.choice(self.TEMPLATES).format(a=rng.choice(modules), b=rng.choice(modules))
+            self.assertEqual(router.route(q), cascade_route(FR_INTENT_RULES, q), q)
+    
+    def test_pattern_pack_routes_latin_questions(self):
+        route = pattern_pack("latin").route
+        self.assertEqual(route("what is numpy"), ("what-is", {"module": "numpy"}))
+        self.assertEqual(route("c'est quoi numpy"), ("what-is", {"module": "numpy"}))
+
+
+# ============================================================================
+# COMPLETION
+# ============================================================================
+
+class CompleterTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.marco = taught("flask depends on werkzeug", "flask depends on jinja2")
+    
+    def test_prefixes_and_next_words(self):
+        self.assertEqual(self.marco.complete("fl"), ["flask"])
+        self.assertEqual(self.marco.complete("FL"), ["flask"])
+        self.assertEqual(self.marco.complete("flask depends "), ["on"])
+        self.assertEqual(self.marco.complete("flask depends on "), ["jinja2", "werkzeug"])
+        self.assertEqual(self.marco.complete("flask depends on w"), ["werkzeug"])
+        self.assertEqual(self.marco.complete("zz"), [])
+    
+    def test_ranking_follows_learning(self):
+        self.marco.learn_sentence("flask depends on werkzeug")
+        self.assertEqual(self.marco.complete("flask depends on "), ["werkzeug", "jinja2"])
+        self.assertEqual(self.marco.complete("flask depends on ", k=1), ["werkzeug"])
+        # New words are completed too, the module first
+        self.marco.learn_sentence("fluffy words fly")
+        self.assertEqual(self.marco.complete("fl")[0], "flask")
+        self.assertEqual(set(self.marco.complete("fl")), {"flask", "fluffy", "fly"})
+    
+    def test_after_reload(self):
+        self.marco.learn_sentence("flask depends on werkzeug")
+        self.marco.save_matrix(self.path('m.mbin'))
+        marco = MarcoMini()
+        marco.load_matrix(self.path('m.mbin'))
+        for text in ("fl", "flask depends ", "flask depends on "):
+            self.assertEqual(marco.complete(text), self.marco.complete(text), text)
+
+
+# ============================================================================
+# RELATED MODULES
+# ============================================================================
+
+class RelatedModulesTest(TempDirTestCase):
+
+    MODULES = ("numpy", "flask", "tensorflow", "pandas")
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = learned(KNOWLEDGE)
+    
+    def reload(self) -> MarcoMini:
+        self.reference.save_matrix(self.path('m.mbin'))
+        marco = MarcoMini()
+        marco.load_matrix(self.path('m.mbin'))
+        return marco
+    
+    def assertSameRelated(self, marco: MarcoMini, reference: MarcoMini):
+        for module in self.MODULES:
+            saved, computed = marco.related_modules(module), reference.related_modules(module)
+            self.assertEqual([m for m, _ in saved], [m for m, _ in computed], module)
+            for (_, a), (_, b) in zip(saved, computed):
+                self.assertAlmostEqual(a, b, places=6)     # Saved as 32-bit floats
+    
+    def test_after_reload(self):
+        marco = self.reload()
+        self.assertIn('RELS', marco.related._matrix.sections)
+        self.assertSameRelated(marco, self.reference)
+    
+    def test_learning_after_reload(self):
+        marco = self.reload()
+        reference = learned(KNOWLEDGE)
+        for m in (marco, reference):
+            m.learn_sentence("newlib depends on numpy")
+            m.learn_sentence("numpy and newlib were seen together")
+        self.assertSameRelated(marco, reference)
+
+
+# ============================================================================
+# ENVIRONMENT SCAN
+# ============================================================================
+
+class EnvironmentScanCacheTest(TempDirTestCase):
+
+    def add_distribution(self, name: str, version: str, requires=(), where: str = None):
+        info = os.path.join(where or self.dir, f'{name}-{version}.dist-info')
+        os.mkdir(info)
+        self.write_metadata(info, name, version, requires)
+        return info
+    
+    def write_metadata(self, info: str, name: str, version: str, requires=()):
+        lines = ["Metadata-Version: 2.1", f"Name: {name}", f"Version: {version}"]
+        lines += [f"Requires-Dist: {r}" for r in requires]
+        with open(os.path.join(info, 'METADATA'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+    
+    def test_scan(self):
+        self.add_distribution('alpha', '1.0', ['beta>=2'])
+        self.add_distribution('beta', '2.1')
+        found = scan_environment([self.dir], jobs=2)
+        self.assertEqual(sorted(found), [('alpha', '1.0', ['beta>=2']), ('beta', '2.1', [])])
+    
+    def test_first_path_wins(self):
+        first, second = self.path('first'), self.path('second')
+        os.mkdir(first)
+        os.mkdir(second)
+        self.add_distribution('alpha', '2.0', where=first)
+        self.add_distribution('alpha', '1.0', where=second)
+        self.assertEqual(scan_environment([first, second]), [('alpha', '2.0', [])])
+        self.assertEqual(scan_environment([second, first]), [('alpha', '1.0', [])])
+    
+    def test_cache_only_rereads_changed_directories(self):
+        cache = self.path('env.json')
+        info = self.add_distribution('alpha', '1.0')
+        self.assertEqual(scan_environment([self.dir], cache), [('alpha', '1.0', [])])
+        self.assertTrue(os.path.exists(cache))
+        
+        # Rewriting a file leaves its directory's mtime alone: still cached
+        self.write_metadata(info, 'alpha', '9.9')
+        stamp = os.stat(info).st_mtime_ns
+        os.utime(info, ns=(stamp, stamp))
+        self.assertEqual(scan_environment([self.dir], cache), [('alpha', '1.0', [])])
+        
+        # A new directory is read, and the same scan without cache sees everything
+        self.add_distribution('beta', '2.0')
+        self.assertEqual(sorted(scan_environment([self.dir], cache)),
+                         [('alpha', '1.0', []), ('beta', '2.0', [])])
+        self.assertEqual(sorted(scan_environment([self.dir])),
+                         [('alpha', '9.9', []), ('beta', '2.0', [])])
+    
+    def test_cache_forgets_removed_directories(self):
+        cache = self.path('env.json')
+        self.add_distribution('alpha', '1.0')
+        beta = self.add_distribution('beta', '2.0')
+        scan_environment([self.dir], cache)
+        shutil.rmtree(beta)
+        self.assertEqual(scan_environment([self.dir], cache), [('alpha', '1.0', [])])
+        with open(cache, encoding='utf-8') as f:
+            self.assertEqual(list(json.load(f)), [os.path.join(self.dir, 'alpha-1.0.dist-info')])
+    
+    def test_unreadable_cache_is_rebuilt(self):
+        cache = self.path('env.json')
+        self.add_distribution('alpha', '1.0')
+        with open(cache, 'w', encoding='utf-8') as f:
+            f.write('{not json')
+        self.assertEqual(scan_environment([self.dir], cache), [('alpha', '1.0', [])])
+        with open(cache, encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 1)
+
+
+# ============================================================================
+# VERSION RANGES
+# ============================================================================
+
+class VersionRangeTest(TempDirTestCase):
+
+    CONFLICT = "tensorflow 2.x and pytorch<1.5 have a conflict"
+    
+    def test_parse(self):
+        for text, expected in ((">=2,<3", "2.*"), ("~=1.4.2", ">=1.4.2,<1.5"), ("==1.4", "1.4.*"),
+                               ("1.4", "1.4.*"), ("2.x", "2.*"), ("*", "*"), ("<1.5", "<1.5")):
+            self.assertEqual(str(VersionRange.parse(text)), expected, text)
+        self.assertEqual(VersionRange.parse("~=1.4.2").specifiers(), [('>=', '1.4.2'), ('<', '1.5')])
+        self.assertEqual(VersionRange.parse("*").specifiers(), [])
+        self.assertEqual(str(VersionRange.from_specifiers([('>=', '1.2'), ('<', '2')])), ">=1.2,<2")
+    
+    def test_overlaps(self):
+        V = VersionRange.parse
+        self.assertFalse(V("<1.5").overlaps(V("1.5")))
+        self.assertTrue(V("<=1.5").overlaps(V("1.5")))
+        self.assertTrue(V("2.*").overlaps(V("2.4")))
+        self.assertFalse(V("2.*").overlaps(V("3.0")))
+    
+    def test_split_scopes(self):
+        text, scopes = split_version_scopes("tensorflow 2.x and pytorch<1.5")
+        self.assertEqual(text, "tensorflow and pytorch")
+        self.assertEqual({m: str(r) for m, r in scopes.items()}, {"tensorflow": "2.*", "pytorch": "<1.5"})
+        # Bare versions only count where asked for
+        self.assertEqual(split_version_scopes("install numpy 1.24"), ("install numpy 1.24", {}))
+        text, scopes = split_version_scopes("install numpy 1.24", bare=True)
+        self.assertEqual((text, str(scopes["numpy"])), ("install numpy", "1.24.*"))
+    
+    def check_scoped_conflict(self, marco: MarcoMini):
+        V = VersionRange.parse
+        modules = ["tensorflow", "pytorch"]
+        self.assertEqual(marco.install_conflicts(modules), [("pytorch", "tensorflow")])
+        self.assertEqual(marco.install_conflicts(modules, {"pytorch": V("1.6")}), [])
+        self.assertEqual(marco.install_conflicts(modules, {"pytorch": V("1.4"), "tensorflow": V("1.15")}), [])
+        self.assertEqual(marco.install_conflicts(modules, {"pytorch": V("1.4")}), [("pytorch", "tensorflow")])
+        self.assertTrue(marco.answer("are tensorflow 2.4 and pytorch 1.6 compatible?").compatible)
+        self.assertFalse(marco.answer("are tensorflow 2.4 and pytorch 1.4 compatible?").compatible)
+        self.assertFalse(marco.answer("are tensorflow and pytorch compatible?").compatible)
+    
+    def test_scoped_conflicts(self):
+        self.check_scoped_conflict(taught(self.CONFLICT))
+    
+    def test_scoped_conflicts_after_reload(self):
+        taught(self.CONFLICT).save_matrix(self.path('m.mbin'))
+        marco = MarcoMini()
+        marco.load_matrix(self.path('m.mbin'))
+        self.check_scoped_conflict(marco)
+
+
+# ============================================================================
+# SAVED ANSWERS
+# ============================================================================
+
+class AnswerSnapshotTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.matrix = self.path('m.mbin')
+    
+    def loaded(self) -> MarcoMini:
+        marco = MarcoMini()
+        marco.load_matrix(self.matrix)
+        return marco
+    
+    def test_saved_answers(self):
+        learned(KNOWLEDGE).save_matrix(self.matrix)
+        marco = self.loaded()
+        expected = answers(marco)
+        self.assertTrue(marco.save_answers())
+        for question, text in zip(QUESTIONS, expected):
+            if question == "c'est quoi numpy":
+                continue        # Same answer as "what is numpy", saved once under that
+            snapshot = snapshot_answer(self.matrix, question)
+            self.assertIsNotNone(snapshot, question)
+            self.assertEqual(str(snapshot), text)
+        self.assertEqual(str(snapshot_answer(self.matrix, "  What is numpy ")), expected[0])
+        self.assertIsNone(snapshot_answer(self.matrix, "what is never asked"))
+        
+        # A fresh process starts warm with them
+        self.assertEqual(answers(self.loaded()), expected)
+    
+    def test_stale_answers(self):
+        learned(KNOWLEDGE[:1]).save_matrix(self.matrix)
+        marco = self.loaded()
+        marco.answer("what is numpy")
+        marco.save_answers()
+        marco.learn_files(KNOWLEDGE[1:])
+        marco.save_matrix(self.matrix)
+        self.assertIsNone(snapshot_answer(self.matrix, "what is numpy"))
+        self.assertFalse(marco.save_answers())
+    
+    def test_unsaved_learning_is_not_snapshot(self):
+        taught("numpy is a module").save_matrix(self.matrix)
+        marco = self.loaded()
+        marco.answer("what is numpy")
+        marco.learn_sentence("scipy is a module")
+        self.assertFalse(marco.save_answers())
+        self.assertIsNone(snapshot_answer(self.matrix, "what is numpy"))
+        # Nor answers without a matrix file
+        self.assertFalse(taught("numpy is a module").save_answers())
+
+
+# ============================================================================
+# COMPACTION
+# ============================================================================
+
+class CompactTest(TempDirTestCase):
+
+    SENTENCES = ("numpy is a module", "numpy is a module", "the numpy module is fast",
+                 "oddlib crashes when lapack is missing", "flask depends on werkzeug")
+    
+    def test_dropped_and_kept(self):
+        marco = taught(*self.SENTENCES)
+        report = marco.compact(max_links=2)
+        # Stopwords and rare plain words go; tagged words and crash reasons stay
+        self.assertEqual(list(marco.beacons), ["numpy", "module", "oddlib", "flask", "werkzeug"])
+        self.assertEqual(set(report), {"beacons", "links", "contexts", "tags"})
+        self.assertEqual(report["beacons"], (15, 5))
+        self.assertEqual(report["tags"][0], report["tags"][1])
+        self.assertLess(report["links"][1], report["links"][0])
+        words = marco.lexicon.words
+        for word, beacon in marco.beacons.items():
+            self.assertLessEqual(beacon.link_count(), 2, word)
+            self.assertTrue(all(words[wid] in marco.beacons for wid, _ in beacon.link_items()), word)
+        # One copy of each context
+        self.assertEqual(marco.beacons["numpy"].context_list(), ["numpy is a module", "the numpy module is fast"])
+        self.assertIn("crashes: lapack is missing", marco.answer("why does oddlib crash").text(color=False))
+    
+    def test_answers_kept(self):
+        marco = learned(KNOWLEDGE)
+        # Similar modules are scored on links, which compaction prunes
+        questions = [q for q in QUESTIONS if "similar" not in q]
+        expected = [str(marco.answer(q)) for q in questions]
+        marco.compact()
+        self.assertEqual([str(marco.answer(q)) for q in questions], expected)
+    
+    def test_full_save(self):
+        learned(KNOWLEDGE).save_matrix(self.path('m.mbin'))
+        marco = MarcoMini()
+        marco.load_matrix(self.path('m.mbin'))
+        reference = learned(KNOWLEDGE)
+        self.assertEqual(marco.compact(), reference.compact())
+        marco.save_matrix(self.path('m.mbin'), full=True)
+        self.assertLess(os.path.getsize(self.path('m.mbin')), self.saved_size(learned(KNOWLEDGE)))
+        again = MarcoMini()
+        again.load_matrix(self.path('m.mbin'))
+        self.assertEqual(state(again), state(reference))
+    
+    def saved_size(self, marco: MarcoMini) -> int:
+        marco.save_matrix(self.path('uncompacted.mbin'))
+        return os.path.getsize(self.path('uncompacted.mbin'))
+
+
+if __name__ == "__main__":
+    unittest.main()